@@ -38,9 +38,15 @@ def create_app(test_config=None) -> Flask:
     with app.app_context():
         from api.routes import register_routes
         from api.db import init_database
+        from api.query_monitor import init_query_monitor
         from api.commands.server import register_commands
+        from api.config import init_config
+        from api.jobs import init_jobs
 
+        init_config(app)
+        init_query_monitor(app)
         init_database(app)
+        init_jobs(app)
         register_routes(app)
         register_commands(app)
 
@@ -0,0 +1,68 @@
+"""
+Commands for maintaining the English-to-SignGloss dictionary
+"""
+import click
+
+from flask.cli import with_appcontext
+from typing import List
+from models.models import Eng2Sign, SignGloss
+from rb_system.dictionary import invalidate_words
+
+
+def find_duplicated_words() -> List[dict]:
+    """Returns the `english` keys that have more than one entry, with their ids ordered by `_id`"""
+    pipeline = [
+        {'$sort': {'_id': 1}},
+        {'$group': {'_id': '$english', 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+    ]
+    return list(Eng2Sign.objects.aggregate(pipeline, allowDiskUse=True))
+
+
+def _has_gloss(glosses: List[SignGloss], gloss: SignGloss) -> bool:
+    gloss_data = gloss.to_mongo().to_dict()
+    return any(g.to_mongo().to_dict() == gloss_data for g in glosses)
+
+
+def merge_words(words: List[Eng2Sign]) -> Eng2Sign:
+    """
+    Merge the entries of the same English word into the first (oldest) one.
+    The glosses and contexts that the first entry doesn't have are appended in order.
+    """
+    merged = words[0]
+    for word in words[1:]:
+        for gloss in word.sign_glosses:
+            if not _has_gloss(merged.sign_glosses, gloss):
+                merged.sign_glosses.append(gloss)
+        for context in word.contexts:
+            if context not in merged.contexts:
+                merged.contexts.append(context)
+        if not merged.en_pos and word.en_pos:
+            merged.en_pos = word.en_pos
+    return merged
+
+
+@click.command('migrate-dictionary')
+@click.option('--dry-run', is_flag=True, help='Only report the duplicated words.')
+@with_appcontext
+def migrate_dictionary_command(dry_run: bool):
+    """Merge the duplicated words of the dictionary, then build the indexes of `eng2signs`."""
+    duplicates = find_duplicated_words()
+    click.echo(f'Found {len(duplicates)} duplicated word(s)')
+
+    for duplicate in duplicates:
+        words = list(Eng2Sign.objects(id__in=duplicate['ids']).order_by('id'))
+        click.echo(f"- '{duplicate['_id']}': {duplicate['count']} entries")
+        if dry_run:
+            continue
+
+        merged = merge_words(words)
+        merged.save()
+        Eng2Sign.objects(id__in=[word.id for word in words[1:]]).delete()
+        invalidate_words([merged.english])
+
+    if dry_run:
+        return
+
+    Eng2Sign.ensure_indexes()
+    click.echo(f'Built the indexes of `{Eng2Sign._get_collection_name()}`')
@@ -0,0 +1,39 @@
+"""
+Commands for profiling the translation
+"""
+import click
+import json
+
+from flask.cli import with_appcontext
+from models.models import TextData
+from rb_system.memory_profile import profile_translation, format_report
+from rb_system.warmup import warm_up, is_ready
+
+
+@click.command('profile-memory')
+@click.argument('text', required=False)
+@click.option('--file', 'path', type=click.Path(exists=True, dir_okay=False),
+              help='Translate the paragraphs of a text file, one per line.')
+@click.option('--top', default=10, show_default=True, help='The number of allocation sites per stage.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON.')
+@with_appcontext
+def profile_memory_command(text: str, path: str, top: int, as_json: bool):
+    """Translate TEXT with tracemalloc and report the memory retained by each stage of the translation."""
+    if path is not None:
+        with open(path, encoding='utf-8') as f:
+            paragraphs = [line.strip() for line in f if line.strip()]
+    elif text:
+        paragraphs = [text]
+    else:
+        raise click.UsageError('Give a TEXT or a --file to translate')
+
+    # the background services aren't started by the commands, warm up here so the profile doesn't wait for it
+    if not is_ready():
+        warm_up()
+    text_data = TextData(paragraphs)
+    report = profile_translation(text_data, top)
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+        return
+    click.echo(f'Translated {len(paragraphs)} paragraph(s): {text_data.thsl_translation}')
+    click.echo(format_report(report))
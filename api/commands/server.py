@@ -2,10 +2,14 @@
 import click
 from flask import Flask
 from flask.cli import with_appcontext
+from api.commands.dictionary import migrate_dictionary_command
+from api.commands.profiling import profile_memory_command
 
 
 def register_commands(app: Flask):
     app.cli.add_command(test_command)
+    app.cli.add_command(migrate_dictionary_command)
+    app.cli.add_command(profile_memory_command)
 
 
 @click.command('test-cmd')
@@ -0,0 +1,81 @@
+import os
+
+from flask import Flask
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from rb_system.settings import settings
+
+
+def _optional_int(value) -> Optional[int]:
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+def _positive_int(value) -> int:
+    number = int(value)
+    if number < 1:
+        raise ValueError(f'Expected a number of at least 1, got {value!r}')
+    return number
+
+
+def _optional_float(value) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def _bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _string_list(value) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [item.strip() for item in str(value).split(',') if item.strip()]
+
+
+# config key -> (attribute of `rb_system.settings.settings`, parser)
+RB_SYSTEM_CONFIG: Dict[str, Tuple[str, Callable[[Any], Any]]] = {
+    'PRELOAD_APP': ('preload_app', _bool),
+    'NLP_MODEL': ('nlp_model', str),
+    'NLP_EXCLUDE': ('nlp_exclude', _string_list),
+    'NLP_WARMUP': ('nlp_warmup', _bool),
+    'NLP_BATCH_SIZE': ('nlp_batch_size', int),
+    'NLP_MAX_BATCH_CHARS': ('nlp_max_batch_chars', _optional_int),
+    'NLP_MAX_BATCH_TOKENS': ('nlp_max_batch_tokens', _optional_int),
+    'NLP_PROCESSES': ('nlp_processes', int),
+    'NLP_PROCESS_THRESHOLD': ('nlp_process_threshold', int),
+    'NLP_STREAM_BATCH_SIZE': ('nlp_stream_batch_size', int),
+    'DICTIONARY_CACHE_SIZE': ('dictionary_cache_size', int),
+    'DICTIONARY_CACHE_TTL': ('dictionary_cache_ttl', _optional_float),
+    'DICTIONARY_REVISION_TTL': ('dictionary_revision_ttl', _optional_float),
+    'TRANSLATION_CACHE_SIZE': ('translation_cache_size', int),
+    'PARSE_CACHE_PATH': ('parse_cache_path', str),
+    'PARSE_CACHE_SIZE': ('parse_cache_size', int),
+    'TRANSLATION_JOB_WORKERS': ('translation_job_workers', int),
+    'TRANSLATION_JOB_LEASE': ('translation_job_lease', float),
+    'TRANSLATION_JOB_RETENTION': ('translation_job_retention', float),
+    'DICTIONARY_BULK_CHUNK_SIZE': ('dictionary_bulk_chunk_size', _positive_int),
+    'DICTIONARY_SNAPSHOT': ('dictionary_snapshot', _bool),
+    'DICTIONARY_SNAPSHOT_INTERVAL': ('dictionary_snapshot_interval', _optional_float),
+    'DB_QUERY_BUDGET': ('db_query_budget', _optional_int),
+    'MEMORY_PROFILING': ('memory_profiling', _bool),
+    'TRACE_SIZE': ('trace_size', int),
+}
+
+
+def init_config(app: Flask):
+    """
+    Apply the optional settings of the rule-based system from the app config
+    (or the environment variables on deployment), the defaults are kept otherwise.
+    """
+    for key, (attr, parse) in RB_SYSTEM_CONFIG.items():
+        value = app.config.get(key, os.environ.get(key))
+        if value is None:
+            continue
+        setattr(settings, attr, parse(value))
+
+    if settings.parse_cache_path is None:
+        settings.parse_cache_path = os.path.join(app.instance_path, 'parse_cache.sqlite3')
@@ -1,4 +1,7 @@
-from flask import Blueprint
+from flask import Blueprint, Response, jsonify
+from rb_system.metrics import metrics_text
+from rb_system.nlp_tools import is_nlp_loaded
+from rb_system.warmup import warmup_status
 
 entry_point = Blueprint('entry_point', __name__)
 
@@ -8,3 +11,26 @@ def index():
     return 'Welcome to ThSL Translator Application APIs. ' \
            'To access English-to-SignGloss dictionary and perform a translation, ' \
            'please go to `api/dict/` and `api/trans/` respectively.', 200
+
+
+@entry_point.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe, 503 until the model is loaded and the warm-up is done"""
+    status = warmup_status()
+    status['model_loaded'] = is_nlp_loaded()
+    if not status['ready']:
+        return jsonify({
+            'message': 'Warming up',
+            'data': status
+        }), 503
+    return jsonify({
+        'message': 'Ready',
+        'data': status
+    }), 200
+
+
+@entry_point.route('/metrics', methods=['GET'])
+def metrics():
+    """The metrics of all the worker processes in the Prometheus text format"""
+    data, content_type = metrics_text()
+    return Response(data, content_type=content_type)
@@ -1,8 +1,13 @@
+import gzip
+
 from flask import Blueprint, request
 from flask import jsonify
 from api.services import *
 from models.models import Eng2Sign
-from mongoengine import QuerySet
+from mongoengine import QuerySet, NotUniqueError
+from rb_system.dictionary import invalidate_words, dictionary_cache_stats, dictionary_snapshot_stats, \
+    request_snapshot_reload
+from rb_system.settings import settings
 
 dictionary = Blueprint('dictionary', __name__)
 
@@ -24,13 +29,46 @@ def add_words():
         }), 400
 
     eng2signs = request_body_to_eng2sign(request)
-    results = map(lambda e: e.save(), eng2signs)
+    results = []
+    try:
+        for eng2sign in eng2signs:
+            results.append(eng2sign.save())
+    except NotUniqueError:
+        return jsonify({
+            'message': f"Word '{eng2sign.english}' already exists, please update the existing word instead",
+            'ids': [str(result.id) for result in results]
+        }), 409
+    finally:
+        invalidate_words([eng2sign.english for eng2sign in eng2signs])
     return jsonify({
         'message': 'Success',
         'ids': [str(eng2sign.id) for eng2sign in results]
     }), 201
 
 
+@dictionary.route('/words/bulk', methods=['POST'])
+def import_words():
+    """
+    Insert or replace many words by their `english` key.
+    The body is NDJSON, one word per line, optionally gzip-compressed (`Content-Encoding: gzip`).
+    """
+    body = request.stream
+    if request.content_encoding == 'gzip' or request.mimetype in ('application/gzip', 'application/x-gzip'):
+        body = gzip.GzipFile(fileobj=request.stream, mode='rb')
+
+    summary, words = bulk_upsert_words(body, settings.dictionary_bulk_chunk_size)
+    invalidate_words(words)
+    if 'error' in summary:
+        return jsonify({
+            'message': summary.pop('error'),
+            'data': summary
+        }), 400
+    return jsonify({
+        'message': 'Success',
+        'data': summary
+    }), 200
+
+
 @dictionary.route('/words/word', methods=['GET'])
 def get_word():
     """Search sign glosses of the specified word"""
@@ -56,6 +94,7 @@ def update_word():
         }), 400
     result = request_to_existing_eng2sign(doc_id, request)
     result.save()
+    invalidate_words([result.english])
     return jsonify({
         'message': 'Success',
         'data': eng2sign_to_json(result)
@@ -71,7 +110,38 @@ def add_gloss_to_word():
 
     result = append_gloss_to_word(request)
     result.save()
+    invalidate_words([result.english])
     return jsonify({
         'message': 'Success',
         'data': eng2sign_to_json(result)
     }), 200
+
+
+@dictionary.route('/cache', methods=['GET'])
+def get_cache_stats():
+    """Hit and miss counters of the in-memory dictionary cache of this worker"""
+    return jsonify({
+        'message': 'Success',
+        'data': dictionary_cache_stats()
+    }), 200
+
+
+@dictionary.route('/snapshot', methods=['GET'])
+def get_snapshot_stats():
+    """Size, build time and memory footprint of the in-memory dictionary snapshot of this worker"""
+    return jsonify({
+        'message': 'Success',
+        'data': dictionary_snapshot_stats()
+    }), 200
+
+
+@dictionary.route('/snapshot', methods=['POST'])
+def reload_snapshot():
+    """Reload the in-memory dictionary snapshot of this worker in the background"""
+    if not request_snapshot_reload():
+        return jsonify({
+            'message': 'The dictionary snapshot is not enabled'
+        }), 409
+    return jsonify({
+        'message': 'Reloading'
+    }), 202
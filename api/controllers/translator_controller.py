@@ -1,8 +1,21 @@
-from flask import Blueprint, request
+from flask import Blueprint, Response, request, stream_with_context, url_for
 from flask import jsonify
-from models.models import SignGloss, Eng2Sign
-from api.services import validate_trans_request_body, request_body_to_text_data
-from rb_system.translation import translate_english_to_sign_gloss
+from models.models import SignGloss, Eng2Sign, TextData
+from api.services import validate_trans_request_body, request_body_to_text_data, \
+    validate_batch_trans_request_body, request_body_to_text_data_list
+from rb_system.translation import translate_english_to_sign_gloss, translate_paragraphs, translate_documents
+from rb_system.translation_cache import translation_cache_stats
+from rb_system.parse_cache import parse_cache_stats
+from rb_system.memory_profile import profile_translation
+from rb_system.settings import settings
+from rb_system.trace import get_trace_buffer, is_tracing, trace_events
+from rb_system.basic_sentence_rules import basic_rules
+from rb_system.warmup import is_ready
+from api.jobs import get_job_store, submit_job, DONE, FAILED
+from typing import Iterator
+
+import json
+import logging
 
 translator = Blueprint('translator', __name__)
 
@@ -23,6 +36,23 @@ def generate_translation():
         }), 400
 
     text_data = request_body_to_text_data(request)
+    if request.args.get('profile') == 'memory':
+        if not settings.memory_profiling:
+            return jsonify({
+                'message': 'Memory profiling is disabled, see MEMORY_PROFILING'
+            }), 403
+        if not is_ready():
+            # a profile during the warm-up would count the loading of the model and the caches
+            return jsonify({
+                'message': 'The process is warming up, see GET /ready'
+            }), 503
+        report = profile_translation(text_data)
+        return jsonify({
+            'message': 'Success',
+            'data': text_data.prepare_response_data(),
+            'memory_profile': report
+        }), 200
+
     translate_english_to_sign_gloss(text_data)
 
     return jsonify({
@@ -31,6 +61,214 @@ def generate_translation():
     }), 200
 
 
+@translator.route('/translate/batch', methods=['POST'])
+def generate_batch_translation():
+    """
+    Translate many documents in one request, the result of each document has the same shape as
+    the data of `generate_translation()`. A document that can't be translated has null data and an error.
+    """
+    if not validate_batch_trans_request_body(request):
+        return jsonify({
+            'message': 'Missing some field(s) in request body'
+        }), 400
+
+    documents = request_body_to_text_data_list(request)
+    results = translate_documents(documents)
+
+    data = []
+    errors = []
+    for idx, document in enumerate(documents):
+        if results[idx] is None:
+            data.append(None)
+            errors.append({'document': idx, 'message': 'Failed to translate the document'})
+        else:
+            data.append(document.prepare_response_data())
+    return jsonify({
+        'message': 'Success',
+        'data': data,
+        'errors': errors
+    }), 200
+
+
+@translator.route('/translate/stream', methods=['POST'])
+def stream_translation():
+    """
+    Same as `generate_translation()`, but each paragraph is sent as soon as it is translated.
+    The paragraphs are sent as newline-delimited JSON, or as server-sent events
+    if the request accepts `text/event-stream` or has `?format=sse`.
+    """
+    if not validate_trans_request_body(request):
+        return jsonify({
+            'message': 'Missing some field(s) in request body'
+        }), 400
+
+    paragraphs = request_body_to_text_data(request).original
+    use_sse = request.args.get('format') == 'sse' or \
+        request.accept_mimetypes.best_match(['application/x-ndjson', 'text/event-stream']) == 'text/event-stream'
+    if use_sse:
+        body = _to_server_sent_events(_stream_paragraphs(paragraphs))
+        mimetype = 'text/event-stream'
+    else:
+        # the end of the stream marks the success, a line without `p_number` is an error
+        body = (
+            json.dumps(data, ensure_ascii=False) + '\n'
+            for event, data in _stream_paragraphs(paragraphs) if event != 'done'
+        )
+        mimetype = 'application/x-ndjson'
+    # disable the buffering of reverse proxies, so the paragraphs aren't held back
+    return Response(stream_with_context(body), mimetype=mimetype, headers={'X-Accel-Buffering': 'no'})
+
+
+def _stream_paragraphs(paragraphs: list) -> Iterator[tuple]:
+    """Yield (event, data) of each translated paragraph, the stream ends with an `error` or a `done` event"""
+    try:
+        for idx, thsl_paragraph in enumerate(translate_paragraphs(paragraphs)):
+            yield 'paragraph', TextData.prepare_paragraph_data(idx + 1, paragraphs[idx], thsl_paragraph)
+    except Exception:
+        # the status code has already been sent
+        logging.exception('Failed to translate the streamed paragraphs')
+        yield 'error', {'message': 'Failed to translate the paragraphs'}
+        return
+    yield 'done', {'message': 'Success', 'paragraphs': len(paragraphs)}
+
+
+def _to_server_sent_events(events: Iterator[tuple]) -> Iterator[str]:
+    for event, data in events:
+        yield f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+@translator.route('/jobs', methods=['POST'])
+def create_translation_job():
+    """Queue the translation of a large document, the body is the same as `generate_translation()`"""
+    if not validate_trans_request_body(request):
+        return jsonify({
+            'message': 'Missing some field(s) in request body'
+        }), 400
+
+    paragraphs = request_body_to_text_data(request).original
+    job_id = submit_job(paragraphs)
+    return jsonify({
+        'message': 'Accepted',
+        'data': {
+            'job_id': job_id,
+            'total': len(paragraphs)
+        }
+    }), 202, {'Location': url_for('translator.get_translation_job', job_id=job_id)}
+
+
+@translator.route('/jobs/<job_id>', methods=['GET'])
+def get_translation_job(job_id: str):
+    """
+    The status and the progress of the job, with the translated paragraphs so far.
+    `?after=<p_number>` only returns the paragraphs after the given paragraph.
+    """
+    store = get_job_store()
+    job = store.get(job_id)
+    if job is None:
+        return jsonify({
+            'message': f'Job {job_id} is not found'
+        }), 404
+
+    after = request.args.get('after', default=0, type=int)
+    return jsonify({
+        'message': 'Success',
+        'data': {
+            **_job_to_json(job),
+            'paragraphs': _job_results_to_json(store.results(job_id, after))
+        }
+    }), 200
+
+
+@translator.route('/jobs/<job_id>/result', methods=['GET'])
+def get_translation_job_result(job_id: str):
+    """
+    The translation of a finished job, in the same shape as the data of `generate_translation()`.
+    A job that isn't done yet is a conflict (409) and a failed job is unprocessable (422), the error of the job
+    is in its data. Neither is an error of the request, which the clients would retry.
+    """
+    store = get_job_store()
+    job = store.get(job_id)
+    if job is None:
+        return jsonify({
+            'message': f'Job {job_id} is not found'
+        }), 404
+    if job['status'] != DONE:
+        return jsonify({
+            'message': f"Job {job_id} is {job['status']}",
+            'data': _job_to_json(job)
+        }), 422 if job['status'] == FAILED else 409
+
+    return jsonify({
+        'message': 'Success',
+        'data': _job_results_to_json(store.results(job_id))
+    }), 200
+
+
+def _job_to_json(job) -> dict:
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'total': job['total'],
+        'completed': job['completed'],
+        'progress': job['completed'] / job['total'] if job['total'] > 0 else 1,
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+    }
+
+
+def _job_results_to_json(rows) -> list:
+    return [
+        TextData.prepare_paragraph_data(row['p_number'], row['original'], json.loads(row['thsl_translation']))
+        for row in rows
+    ]
+
+
+@translator.route('/cache', methods=['GET'])
+def get_cache_stats():
+    """Hit and miss counters of the translation cache and the parse cache of this worker"""
+    return jsonify({
+        'message': 'Success',
+        'data': {
+            **translation_cache_stats(),
+            'parses': parse_cache_stats()
+        }
+    }), 200
+
+
+@translator.route('/trace', methods=['GET', 'DELETE'])
+def translation_trace():
+    """
+    The last rule decisions and gloss choices of this worker, oldest first, `?limit=` returns the last ones only.
+    DELETE clears the trace. Tracing is enabled by `TRACE_SIZE`.
+    """
+    if request.method == 'DELETE':
+        get_trace_buffer().clear()
+        return jsonify({
+            'message': 'Success',
+            'data': None
+        }), 200
+
+    limit = request.args.get('limit', type=int)
+    return jsonify({
+        'message': 'Success',
+        'data': {
+            'enabled': is_tracing(),
+            'events': trace_events(limit)
+        }
+    }), 200
+
+
+@translator.route('/rules', methods=['GET'])
+def get_rule_stats():
+    """The basic sentence rules in their dispatch order with their invocation counts and times in this worker"""
+    return jsonify({
+        'message': 'Success',
+        'data': basic_rules.stats()
+    }), 200
+
+
 @translator.route('/create', methods=['POST'])
 def test_db():
     gloss = SignGloss(gloss='TEST', lang='TH')
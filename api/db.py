@@ -1,6 +1,17 @@
 from flask import Flask
-from mongoengine import connect
+from mongoengine import connect, disconnect
+from rb_system.settings import settings
+from rb_system.dictionary import load_dictionary_snapshot
 
 
 def init_database(app: Flask):
-    connect(host=app.config['MONGO_URI'])
+    # the client connects on the first query, so a preloaded app doesn't fork an open connection
+    connect(host=app.config['MONGO_URI'], connect=False)
+    if settings.dictionary_snapshot:
+        load_dictionary_snapshot()
+
+
+def reconnect_database(app: Flask):
+    """pymongo clients aren't fork-safe, a forked worker must create its own client"""
+    disconnect()
+    connect(host=app.config['MONGO_URI'], connect=False)
@@ -0,0 +1,236 @@
+"""
+Asynchronous translation jobs for the documents that are too large for a request.
+The jobs are queued in SQLite (`app.config['DATABASE']`), so they survive a restart of the server.
+Each server process runs `settings.translation_job_workers` threads that claim the queued jobs with a lease,
+a job whose lease has expired (e.g. its process has been killed) is claimed again and resumed
+from its first untranslated paragraph.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from contextlib import contextmanager
+from flask import Flask
+from typing import Iterator, List, Optional
+from rb_system.settings import settings
+from rb_system.translation import translate_paragraphs
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS translation_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_owner TEXT,
+    lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS translation_jobs_status ON translation_jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS translation_job_paragraphs (
+    job_id TEXT NOT NULL REFERENCES translation_jobs (id) ON DELETE CASCADE,
+    p_number INTEGER NOT NULL,
+    original TEXT NOT NULL,
+    thsl_translation TEXT,
+    PRIMARY KEY (job_id, p_number)
+);
+'''
+
+
+class JobStore:
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute('PRAGMA foreign_keys=ON')
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def submit(self, paragraphs: List[str]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute(
+                'INSERT INTO translation_jobs (id, status, total, created_at) VALUES (?, ?, ?, ?)',
+                (job_id, QUEUED, len(paragraphs), time.time())
+            )
+            db.executemany(
+                'INSERT INTO translation_job_paragraphs (job_id, p_number, original) VALUES (?, ?, ?)',
+                [(job_id, idx + 1, paragraph) for idx, paragraph in enumerate(paragraphs)]
+            )
+            db.execute('COMMIT')
+        return job_id
+
+    def claim(self, owner: str, lease: float) -> Optional[str]:
+        """Take the oldest queued job, or a running job whose lease has expired, returns its id"""
+        now = time.time()
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            row = db.execute(
+                'SELECT id FROM translation_jobs WHERE status = ? OR (status = ? AND lease_expires_at < ?) '
+                'ORDER BY created_at LIMIT 1',
+                (QUEUED, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                db.execute('COMMIT')
+                return None
+            db.execute(
+                'UPDATE translation_jobs SET status = ?, started_at = COALESCE(started_at, ?), '
+                'lease_owner = ?, lease_expires_at = ? WHERE id = ?',
+                (RUNNING, now, owner, now + lease, row['id'])
+            )
+            db.execute('COMMIT')
+        return row['id']
+
+    def pending_paragraphs(self, job_id: str) -> List[sqlite3.Row]:
+        with self._connect() as db:
+            return db.execute(
+                'SELECT p_number, original FROM translation_job_paragraphs '
+                'WHERE job_id = ? AND thsl_translation IS NULL ORDER BY p_number',
+                (job_id,)
+            ).fetchall()
+
+    def complete_paragraph(self, job_id: str, p_number: int, thsl_paragraph: List[List[str]], lease: float):
+        """Save the result of a paragraph and renew the lease of the job"""
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            # the paragraph may have been completed by another runner that has taken over an expired lease
+            cursor = db.execute(
+                'UPDATE translation_job_paragraphs SET thsl_translation = ? '
+                'WHERE job_id = ? AND p_number = ? AND thsl_translation IS NULL',
+                (json.dumps(thsl_paragraph, ensure_ascii=False), job_id, p_number)
+            )
+            db.execute(
+                'UPDATE translation_jobs SET completed = completed + ?, lease_expires_at = ? WHERE id = ?',
+                (cursor.rowcount, time.time() + lease, job_id)
+            )
+            db.execute('COMMIT')
+
+    def finish(self, job_id: str, error: Optional[str] = None):
+        with self._connect() as db:
+            db.execute(
+                'UPDATE translation_jobs SET status = ?, error = ?, finished_at = ?, '
+                'lease_owner = NULL, lease_expires_at = NULL WHERE id = ?',
+                (FAILED if error is not None else DONE, error, time.time(), job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        with self._connect() as db:
+            return db.execute('SELECT * FROM translation_jobs WHERE id = ?', (job_id,)).fetchone()
+
+    def results(self, job_id: str, after: int = 0) -> List[sqlite3.Row]:
+        """The translated paragraphs of the job whose `p_number` is greater than `after`"""
+        with self._connect() as db:
+            return db.execute(
+                'SELECT p_number, original, thsl_translation FROM translation_job_paragraphs '
+                'WHERE job_id = ? AND p_number > ? AND thsl_translation IS NOT NULL ORDER BY p_number',
+                (job_id, after)
+            ).fetchall()
+
+    def delete_finished(self, older_than: float) -> int:
+        with self._connect() as db:
+            cursor = db.execute(
+                'DELETE FROM translation_jobs WHERE status IN (?, ?) AND finished_at < ?',
+                (DONE, FAILED, time.time() - older_than)
+            )
+            return cursor.rowcount
+
+
+class JobRunner(threading.Thread):
+    """
+    Claims and runs the jobs until the process exits, the jobs are polled every `poll_interval` seconds
+    and the old finished jobs are deleted every `cleanup_interval` seconds.
+    """
+
+    def __init__(self, store: JobStore, poll_interval: float = 1, cleanup_interval: float = 60 * 60):
+        super().__init__(name='translation-job-runner', daemon=True)
+        self.store = store
+        self.poll_interval = poll_interval
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = float('-inf')
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._wake = threading.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    def run(self):
+        while True:
+            try:
+                job_id = self.store.claim(self.owner, settings.translation_job_lease)
+                if job_id is None:
+                    if time.monotonic() - self._last_cleanup > self.cleanup_interval:
+                        self.store.delete_finished(settings.translation_job_retention)
+                        self._last_cleanup = time.monotonic()
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+                    continue
+                self.run_job(job_id)
+            except Exception:
+                logging.exception('Translation job runner failed, retrying')
+                time.sleep(self.poll_interval)
+
+    def run_job(self, job_id: str):
+        paragraphs = self.store.pending_paragraphs(job_id)
+        logging.info(f'Running translation job {job_id}, {len(paragraphs)} paragraph(s) left')
+        try:
+            results = translate_paragraphs([p['original'] for p in paragraphs])
+            for paragraph, thsl_paragraph in zip(paragraphs, results):
+                self.store.complete_paragraph(job_id, paragraph['p_number'], thsl_paragraph, settings.translation_job_lease)
+        except Exception as e:
+            logging.exception(f'Translation job {job_id} failed')
+            self.store.finish(job_id, repr(e))
+            return
+        self.store.finish(job_id)
+        logging.info(f'Finished translation job {job_id}')
+
+
+_store: Optional[JobStore] = None
+_runners: List[JobRunner] = []
+
+
+def init_jobs(app: Flask):
+    """Open the job queue, the runners are started by `start_job_runners()`"""
+    global _store
+    _store = JobStore(app.config['DATABASE'])
+
+
+def start_job_runners():
+    """Start the job runners of this process, a forked process must start its own (the threads aren't forked)"""
+    if len(_runners) == 0:
+        for _ in range(settings.translation_job_workers):
+            runner = JobRunner(get_job_store())
+            runner.start()
+            _runners.append(runner)
+
+
+def get_job_store() -> JobStore:
+    assert _store is not None, 'The job queue is not initialized, see `init_jobs()`'
+    return _store
+
+
+def submit_job(paragraphs: List[str]) -> str:
+    job_id = get_job_store().submit(paragraphs)
+    for runner in _runners:
+        runner.wake()
+    return job_id
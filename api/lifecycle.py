@@ -0,0 +1,54 @@
+"""
+Start the background services of a server process: the dictionary snapshot reloader, the translation job runners
+and the warm-up. In the preload mode (see `gunicorn.conf.py`), the master process only loads and warms up what
+the workers share, each forked worker reconnects to the database and starts its own threads.
+`create_app()` doesn't start them, the servers do (the hooks of `gunicorn.conf.py` and `app.py`),
+so the `flask` commands don't load the model or take the translation jobs.
+"""
+import logging
+
+from flask import Flask
+from mongoengine.connection import get_db
+from rb_system.settings import settings
+from rb_system.dictionary import start_snapshot_reloader
+from rb_system.warmup import warm_up, start_warm_up, mark_ready, is_ready
+from api.db import reconnect_database
+from api.jobs import start_job_runners
+
+
+def init_background_services(app: Flask):
+    """Called once the app is created in a server process, in the master process with the preload mode"""
+    if not settings.preload_app:
+        start_background_services()
+        return
+
+    # warm up in the master, so the model, the snapshot and the caches are shared by the workers
+    if settings.nlp_warmup:
+        try:
+            warm_up()
+        except Exception:
+            logging.exception('Failed to warm up the master process, the workers will warm up on their own')
+
+
+def init_worker(app: Flask):
+    """Called in each worker after it is forked from the master, see `post_fork` of `gunicorn.conf.py`"""
+    reconnect_database(app)
+    if is_ready():
+        # the model has been warmed up by the master, only the connection of this worker is cold
+        try:
+            get_db().command('ping')
+        except Exception:
+            logging.exception('Failed to connect to the database after the fork')
+    start_background_services()
+
+
+def start_background_services():
+    start_job_runners()
+    if settings.dictionary_snapshot:
+        start_snapshot_reloader()
+    if is_ready():
+        return
+    if settings.nlp_warmup:
+        start_warm_up()
+    else:
+        mark_ready()
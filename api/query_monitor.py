@@ -0,0 +1,118 @@
+"""
+Count the MongoDB commands of each request with a pymongo command listener.
+The number of commands, their total time and the slowest command are sent back as the `X-DB-*` response headers
+and recorded in the metrics, a request that runs more commands than `settings.db_query_budget` is logged
+with its commands grouped by collection, which shows the queries that are run once per word (N+1).
+The commands of the background threads (warm-up, jobs, snapshot) and of a streamed body aren't counted.
+"""
+import logging
+
+from collections import Counter
+from contextvars import ContextVar
+from typing import Counter as CounterType, Dict, Optional, Tuple
+from flask import Flask, Response, request
+from pymongo import monitoring
+from rb_system.metrics import DB_COMMAND_SECONDS, DB_REQUEST_QUERIES, DB_REQUEST_SECONDS
+from rb_system.settings import settings
+
+
+class QueryStats:
+    """The MongoDB commands of a request"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest: Optional[Tuple[str, float]] = None
+        # command and collection e.g. 'find eng2signs' -> number of commands
+        self.commands: CounterType[str] = Counter()
+        # request id of a started command -> its description
+        self._started: Dict[int, str] = {}
+
+    def start(self, request_id: int, description: str):
+        self._started[request_id] = description
+
+    def finish(self, request_id: int, duration: float):
+        description = self._started.pop(request_id, 'unknown')
+        self.count += 1
+        self.total_time += duration
+        self.commands[description] += 1
+        if self.slowest is None or duration > self.slowest[1]:
+            self.slowest = (description, duration)
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar('query_stats', default=None)
+
+
+def _describe(event: monitoring.CommandStartedEvent) -> str:
+    # the value of the command name is the collection for most commands e.g. {'find': 'eng2signs', ...}
+    target = event.command.get(event.command_name)
+    return f'{event.command_name} {target}' if isinstance(target, str) else event.command_name
+
+
+class QueryListener(monitoring.CommandListener):
+    """Adds the commands to the stats of the current request, pymongo calls it in the thread that runs the command"""
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.start(event.request_id, _describe(event))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event)
+
+    @staticmethod
+    def _finish(event):
+        duration = event.duration_micros / 1_000_000
+        DB_COMMAND_SECONDS.labels(event.command_name).observe(duration)
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.finish(event.request_id, duration)
+
+
+_listener: Optional[QueryListener] = None
+
+
+def init_query_monitor(app: Flask):
+    """Register the listener, before the database is connected since pymongo only notifies the clients created after"""
+    global _listener
+    if _listener is None:
+        _listener = QueryListener()
+        monitoring.register(_listener)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_reset_request)
+
+
+def _start_request():
+    _current_stats.set(QueryStats())
+
+
+def _finish_request(response: Response) -> Response:
+    stats = _current_stats.get()
+    if stats is None:
+        return response
+
+    endpoint = request.endpoint or 'none'
+    DB_REQUEST_QUERIES.labels(endpoint).observe(stats.count)
+    DB_REQUEST_SECONDS.labels(endpoint).observe(stats.total_time)
+
+    response.headers['X-DB-Query-Count'] = str(stats.count)
+    response.headers['X-DB-Time-Ms'] = f'{stats.total_time * 1000:.2f}'
+    if stats.slowest is not None:
+        response.headers['X-DB-Slowest'] = f'{stats.slowest[0]}; {stats.slowest[1] * 1000:.2f}ms'
+
+    if settings.db_query_budget is not None and stats.count > settings.db_query_budget:
+        commands = ', '.join(f'{description} x{count}' for description, count in stats.commands.most_common(5))
+        logging.warning(
+            f'{request.method} {request.path} ran {stats.count} database commands, '
+            f'over the budget of {settings.db_query_budget} ({stats.total_time * 1000:.1f}ms): {commands}'
+        )
+    return response
+
+
+def _reset_request(exc: Optional[BaseException]):
+    _current_stats.set(None)
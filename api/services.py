@@ -1,9 +1,15 @@
 from flask import Request
-from typing import List, Dict
+from typing import List, Dict, Iterable, Set, Tuple
 from models.models import Eng2Sign, SignGloss, TextData
+from mongoengine import ValidationError
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
 
 import json
 
+# the number of failed entries reported back by `bulk_upsert_words()`, the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
 
 def validate_dict_request_body(req: Request) -> bool:
     """Validate request from `add_words()` controller"""
@@ -56,6 +62,23 @@ def validate_trans_request_body(req: Request) -> bool:
     return True
 
 
+def validate_batch_trans_request_body(req: Request) -> bool:
+    """Validate the request body from `generate_batch_translation()` controller"""
+    try:
+        req_body = dict(req.json)
+        documents = req_body['data']['documents']
+        if not documents:
+            return False
+        for document in documents:
+            if not document['paragraphs']:
+                return False
+    except TypeError:
+        return False
+    except KeyError:
+        return False
+    return True
+
+
 def request_body_to_eng2sign(req: Request) -> List[Eng2Sign]:
     """
     Parse the request body from `add_words()` controller
@@ -82,40 +105,42 @@ def request_body_to_eng2sign(req: Request) -> List[Eng2Sign]:
         ]
     }
     """
-    eng2signs = []
     req_body = dict(req.json)
-    for wp in req_body['data']:
-        eng2sign = Eng2Sign(english=wp['word'])
-        glosses = []
-        for gloss in wp['glosses']:
-            sign_gloss = SignGloss(
-                gloss=gloss['gloss'],
-                lang=gloss['lang'],
-                contexts=gloss['contexts'],
-                pos=gloss['pos']
-            )
-
-            # optional fields
-            try:
-                sign_gloss.priority = gloss['priority']
-            except KeyError:
-                pass
+    return [word_pair_to_eng2sign(wp) for wp in req_body['data']]
 
-            glosses.append(sign_gloss)
-        eng2sign.sign_glosses = glosses
 
-        try:
-            eng2sign.en_pos = wp['en_pos']
-        except KeyError:
-            pass
+def word_pair_to_eng2sign(wp: dict) -> Eng2Sign:
+    """Parse a word of the `add_words()` or `bulk_upsert_words()` request body"""
+    eng2sign = Eng2Sign(english=wp['word'])
+    glosses = []
+    for gloss in wp['glosses']:
+        sign_gloss = SignGloss(
+            gloss=gloss['gloss'],
+            lang=gloss['lang'],
+            contexts=gloss['contexts'],
+            pos=gloss['pos']
+        )
 
+        # optional fields
         try:
-            eng2sign.contexts = wp['contexts']
+            sign_gloss.priority = gloss['priority']
         except KeyError:
             pass
 
-        eng2signs.append(eng2sign)
-    return eng2signs
+        glosses.append(sign_gloss)
+    eng2sign.sign_glosses = glosses
+
+    try:
+        eng2sign.en_pos = wp['en_pos']
+    except KeyError:
+        pass
+
+    try:
+        eng2sign.contexts = wp['contexts']
+    except KeyError:
+        pass
+
+    return eng2sign
 
 
 def request_to_existing_eng2sign(doc_id: str, req: Request) -> Eng2Sign:
@@ -182,6 +207,29 @@ def request_body_to_text_data(req: Request) -> TextData:
     return trans
 
 
+def request_body_to_text_data_list(req: Request) -> List[TextData]:
+    """
+    Parse the request body from `generate_batch_translation()` controller
+
+    Example request body:
+    {
+        "data": {
+            "documents": [
+                {
+                    "paragraphs": ["Hello. This is your friend, John."]
+                },
+                {
+                    "paragraphs": ["The chickens walk.", "My mother gives him 4 apples."]
+                }
+            ],
+            "lang": "US"
+        }
+    }
+    """
+    req_body = dict(req.json)
+    return [TextData(document['paragraphs']) for document in req_body['data']['documents']]
+
+
 def eng2sign_to_json(eng2sign: Eng2Sign) -> Dict:
     eng2sign_dict = json.loads(eng2sign.to_json())
     eng2sign_dict['id'] = eng2sign_dict['_id']['$oid']
@@ -216,7 +264,6 @@ def append_gloss_to_word(request: Request) -> Eng2Sign:
     req_body = dict(request.json)
     eng2sign: Eng2Sign = Eng2Sign.objects(english=req_body['word'])[0]
     glosses: List[SignGloss] = eng2sign.sign_glosses
-    print(req_body['glosses'])
 
     for gloss in req_body['glosses']:
         new_gloss = SignGloss(
@@ -239,3 +286,61 @@ def append_gloss_to_word(request: Request) -> Eng2Sign:
 
     eng2sign.sign_glosses = glosses
     return eng2sign
+
+
+def bulk_upsert_words(lines: Iterable[bytes], chunk_size: int) -> Tuple[Dict, Set[str]]:
+    """
+    Insert or replace the words of an NDJSON body by their `english` key,
+    with an unordered bulk write for every `chunk_size` words.
+    Each line is a word in the same format as a word of the `add_words()` request body.
+
+    :return: the counts of the inserted, updated and failed entries, and the English words that are written
+    """
+    summary = {'inserted': 0, 'updated': 0, 'failed': 0, 'errors': []}
+    words: Set[str] = set()
+    # english -> (line number, operation), a word is written once per chunk
+    chunk: Dict[str, Tuple[int, ReplaceOne]] = {}
+    try:
+        for line_no, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                eng2sign = word_pair_to_eng2sign(json.loads(line))
+                eng2sign.validate()
+            except (ValueError, KeyError, TypeError, ValidationError) as e:
+                _add_bulk_error(summary, line_no, repr(e))
+                continue
+
+            if len(chunk) > 0 and (eng2sign.english in chunk or len(chunk) >= chunk_size):
+                _write_chunk(list(chunk.values()), summary)
+                chunk = {}
+            son = eng2sign.to_mongo()
+            son.pop('_id', None)
+            chunk[eng2sign.english] = (line_no, ReplaceOne({'english': eng2sign.english}, son, upsert=True))
+            words.add(eng2sign.english)
+    except (OSError, EOFError) as e:
+        # a corrupted or truncated gzip body, the complete lines are still written
+        summary['error'] = f'Cannot read the request body: {e}'
+
+    if len(chunk) > 0:
+        _write_chunk(list(chunk.values()), summary)
+    return summary, words
+
+
+def _write_chunk(chunk: List[Tuple[int, ReplaceOne]], summary: Dict):
+    try:
+        result = Eng2Sign._get_collection().bulk_write([op for _, op in chunk], ordered=False)
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+
+    summary['inserted'] += details['nUpserted']
+    summary['updated'] += details['nMatched']
+    for error in details['writeErrors']:
+        _add_bulk_error(summary, chunk[error['index']][0], error['errmsg'])
+
+
+def _add_bulk_error(summary: Dict, line_no: int, message: str):
+    summary['failed'] += 1
+    if len(summary['errors']) < MAX_REPORTED_ERRORS:
+        summary['errors'].append({'line': line_no, 'message': message})
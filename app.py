@@ -1,8 +1,11 @@
 from api import create_app
+from api.lifecycle import init_background_services
 import logging
 
 app = create_app()
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.DEBUG)
+    with app.app_context():
+        init_background_services(app)
     app.run(debug=True)
@@ -0,0 +1,73 @@
+"""
+Latency statistics of the benchmarks and their comparison with a stored baseline.
+"""
+import json
+import math
+import os
+
+from typing import Dict, List, Optional, Sequence
+
+PERCENTILES = (50, 90, 99)
+# p99 is reported only, it is the slowest call or so of a run and too noisy to be compared
+COMPARED_PERCENTILES = (50, 90)
+# the stages faster than this (ms) are too noisy to be compared with the baseline
+MIN_COMPARED_MS = 0.1
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """The `p`-th percentile of the values with the nearest-rank method"""
+    assert len(values) > 0, 'No value to compute a percentile of'
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(latencies: Sequence[float]) -> Dict[str, float]:
+    """p50, p90, p99 and the mean of the latencies"""
+    summary = {f'p{p}': percentile(latencies, p) for p in PERCENTILES}
+    summary['mean'] = sum(latencies) / len(latencies)
+    return summary
+
+
+def load_baseline(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, result: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def compare_with_baseline(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Returns the regressions of the result, empty if there isn't any.
+    A translation that differs from the baseline is a regression, so are a p50 or p90 latency that is more than
+    `tolerance` (e.g. 0.2 = 20%) above the baseline and a throughput that is more than `tolerance` below it.
+    The latencies and the throughput are only compared when the baseline has them, they depend on the machine.
+    """
+    regressions = []
+    for text, expected in baseline.get('translations', {}).items():
+        actual = result['translations'].get(text)
+        if actual != expected:
+            regressions.append(f'translation of {text!r}: expected {expected}, got {actual}')
+
+    for stage, expected_summary in baseline.get('stages', {}).items():
+        actual_summary = result['stages'].get(stage)
+        if actual_summary is None:
+            regressions.append(f'stage {stage!r} is missing')
+            continue
+        for p in COMPARED_PERCENTILES:
+            key = f'p{p}'
+            expected_ms, actual_ms = expected_summary[key], actual_summary[key]
+            if expected_ms >= MIN_COMPARED_MS and actual_ms > expected_ms * (1 + tolerance):
+                regressions.append(f'{stage} {key}: {actual_ms:.2f} ms, baseline {expected_ms:.2f} ms')
+
+    expected_rate, actual_rate = baseline.get('sentences_per_second'), result['sentences_per_second']
+    if expected_rate is not None and actual_rate < expected_rate * (1 - tolerance):
+        regressions.append(f'throughput: {actual_rate:.1f} sentences/s, baseline {expected_rate:.1f} sentences/s')
+    return regressions
@@ -0,0 +1,98 @@
+"""
+Measure the latency of the `english=` lookups of the dictionary without and with the unique index on `english`,
+on collections of 10k, 100k and 1M entries.
+
+The benchmark uses a scratch collection (`eng2signs_benchmark` by default) and drops it afterwards,
+the real dictionary isn't touched.
+
+python -m benchmarks.dictionary_index_benchmark --mongo-uri mongodb://localhost:27017/thsltrans
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from typing import List
+from dotenv import dotenv_values
+from pymongo import MongoClient, ASCENDING
+from pymongo.collection import Collection
+from dirs import ROOT_DIR
+
+SIZES = [10_000, 100_000, 1_000_000]
+INSERT_CHUNK_SIZE = 10_000
+
+
+def _default_mongo_uri() -> str:
+    config = dotenv_values(f'{ROOT_DIR}/.env') if os.path.exists(f'{ROOT_DIR}/.env') else {}
+    return config.get('MONGO_URI') or os.environ.get('MONGO_URI')
+
+
+def _word(i: int) -> str:
+    return f'word{i:07d}'
+
+
+def _seed(collection: Collection, start: int, end: int):
+    """Insert the entries [start, end) shaped like the `Eng2Sign` documents"""
+    for chunk_start in range(start, end, INSERT_CHUNK_SIZE):
+        chunk_end = min(chunk_start + INSERT_CHUNK_SIZE, end)
+        collection.insert_many([
+            {
+                'english': _word(i),
+                'contexts': ['object'],
+                'sign_glosses': [{'_cls': 'SignGloss', 'gloss': _word(i).upper(), 'lang': 'en', 'pos': 'noun'}],
+            }
+            for i in range(chunk_start, chunk_end)
+        ], ordered=False)
+
+
+def _measure(collection: Collection, size: int, lookups: int) -> List[float]:
+    """Latencies (ms) of `find_one` for existing and missing words"""
+    rng = random.Random(size)
+    latencies = []
+    for n in range(lookups):
+        # every 4th lookup is a word that isn't in the dictionary, like most of the function words
+        word = _word(rng.randrange(size)) if n % 4 else f'missing{n}'
+        start = time.perf_counter()
+        collection.find_one({'english': word})
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def _summary(latencies: List[float]) -> str:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    return f'p50 {p50:>8.3f} ms  p95 {p95:>8.3f} ms'
+
+
+def main(mongo_uri: str, collection_name: str, sizes: List[int], lookups: int):
+    client = MongoClient(mongo_uri)
+    collection = client.get_default_database()[collection_name]
+    collection.drop()
+    try:
+        seeded = 0
+        print(f'{"entries":>10} | {"without index":^34} | {"with unique index":^34}')
+        for size in sizes:
+            _seed(collection, seeded, size)
+            seeded = size
+
+            without_index = _measure(collection, size, lookups)
+            collection.create_index([('english', ASCENDING)], unique=True, name='english_1')
+            with_index = _measure(collection, size, lookups)
+            collection.drop_index('english_1')
+
+            print(f'{size:>10} | {_summary(without_index)} | {_summary(with_index)}')
+    finally:
+        collection.drop()
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', default=_default_mongo_uri(), help='must include the database name')
+    parser.add_argument('--collection', default='eng2signs_benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+    main(args.mongo_uri, args.collection, args.sizes, args.lookups)
@@ -0,0 +1,82 @@
+"""
+Compare the throughput of parsing paragraph by paragraph with the batched `nlp.pipe()` parsing
+of `perform_nlp_process()` on multi-paragraph inputs.
+
+python -m benchmarks.nlp_pipe_benchmark --paragraphs 50 --repeat 3
+"""
+import argparse
+import time
+
+from typing import List, Optional, Tuple
+from models.models import TextData
+from rb_system.nlp_tools import perform_nlp_process
+
+SAMPLE_PARAGRAPHS = [
+    'Hello. This is your friend, John.',
+    'The chickens walk. My mother gives him 4 apples.',
+    'He works at Kasetsart University on Monday. The young mouse eats a big apple.',
+    'The cat that attacks us is scary. Where do you live?',
+    'There is a plate of rice on the table. I like drawing.',
+]
+
+
+def _make_paragraphs(count: int) -> List[str]:
+    return [SAMPLE_PARAGRAPHS[i % len(SAMPLE_PARAGRAPHS)] for i in range(count)]
+
+
+def _snapshot(text_data: TextData) -> list:
+    """Comparable view of `processed_data`"""
+    return [
+        [[(t.text, t.lemma_, t.pos_, t.tag_, t.dep_, t.ent_type_) for t in sentence] for sentence in paragraph]
+        for paragraph in text_data.processed_data
+    ]
+
+
+def _run(paragraphs: List[str], repeat: int, **kwargs) -> Tuple[float, list]:
+    best = float('inf')
+    result = []
+    for _ in range(repeat):
+        text_data = TextData(list(paragraphs))
+        start = time.perf_counter()
+        perform_nlp_process(text_data, **kwargs)
+        best = min(best, time.perf_counter() - start)
+        result = _snapshot(text_data)
+    return best, result
+
+
+def main(paragraph_count: int, repeat: int, batch_size: int,
+         max_batch_chars: Optional[int], max_batch_tokens: Optional[int]):
+    paragraphs = _make_paragraphs(paragraph_count)
+    # warm up the model so that the first measurement doesn't pay for lazy initialization
+    perform_nlp_process(TextData(paragraphs[:1]), batch_size=1)
+
+    modes = [
+        ('one by one', {'batch_size': 1}),
+        (f'nlp.pipe (batch_size={batch_size})', {'batch_size': batch_size}),
+    ]
+    if max_batch_chars is not None or max_batch_tokens is not None:
+        modes.append((
+            f'nlp.pipe (max_chars={max_batch_chars}, max_tokens={max_batch_tokens})',
+            {'batch_size': batch_size, 'max_batch_chars': max_batch_chars, 'max_batch_tokens': max_batch_tokens}
+        ))
+
+    baseline_time, baseline_result = None, None
+    print(f'{paragraph_count} paragraphs, best of {repeat} run(s)')
+    for name, kwargs in modes:
+        elapsed, result = _run(paragraphs, repeat, **kwargs)
+        if baseline_result is None:
+            baseline_time, baseline_result = elapsed, result
+        assert result == baseline_result, f'[{name}] processed data differs from parsing one by one'
+        print(f'{name:<50} {elapsed * 1000:>10.1f} ms {paragraph_count / elapsed:>10.1f} paragraphs/s '
+              f'{baseline_time / elapsed:>6.2f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paragraphs', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--max-batch-chars', type=int, default=None)
+    parser.add_argument('--max-batch-tokens', type=int, default=None)
+    args = parser.parse_args()
+    main(args.paragraphs, args.repeat, args.batch_size, args.max_batch_chars, args.max_batch_tokens)
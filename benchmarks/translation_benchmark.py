@@ -0,0 +1,217 @@
+"""
+End-to-end benchmark of `translate_english_to_sign_gloss()` on a corpus that goes through every rule of
+`rearrange_sentence()`, with a mongomock dictionary seeded from `benchmarks/fixtures/dictionary.json`
+(`pip install -r requirements-dev.txt`), so neither a MongoDB server nor the real dictionary is needed.
+
+It reports the latency percentiles of each stage (parse, rearrange, prefetch, map and the whole call),
+the throughput in sentences per second, and compares them and the translations with the stored baselines:
+the exit status is 1 when a translation differs or a number regresses by more than the tolerance.
+The translations don't depend on the machine, their baseline is committed (`benchmarks/baselines`), update it after
+an intended change of the translations. The timings do, their baseline is kept in the instance folder of each
+machine and they aren't compared until it is saved with `--update-timings`.
+
+python -m benchmarks.translation_benchmark --repeat 5
+python -m benchmarks.translation_benchmark --update-timings
+python -m benchmarks.translation_benchmark --update-baseline
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+from mongoengine import connect, disconnect
+from dirs import ROOT_DIR
+from api.services import word_pair_to_eng2sign
+from benchmarks.baseline import latency_summary, load_baseline, save_baseline, compare_with_baseline
+from models.models import Eng2Sign, TextData
+from rb_system import translation
+from rb_system.dictionary import load_dictionary_snapshot
+from rb_system.settings import settings
+
+FIXTURES_DIR = f'{ROOT_DIR}/benchmarks/fixtures'
+DEFAULT_CORPUS = f'{FIXTURES_DIR}/translation_corpus.json'
+DEFAULT_DICTIONARY = f'{FIXTURES_DIR}/dictionary.json'
+DEFAULT_BASELINE = f'{ROOT_DIR}/benchmarks/baselines/translation_benchmark.json'
+DEFAULT_TIMINGS = f'{ROOT_DIR}/instance/translation_benchmark_timings.json'
+
+# stage name -> the function of `rb_system.translation` that it measures
+STAGES = {
+    'parse': 'process_paragraphs',
+    'rearrange': 'rearrange_sentence',
+    'prefetch': 'prefetch_words',
+    'map': 'map_english_to_sign_gloss',
+}
+
+
+def _seed_dictionary(path: str, use_snapshot: bool):
+    disconnect()
+    connect('thsltrans_benchmark', host='mongomock://localhost')
+    with open(path, encoding='utf-8') as f:
+        word_pairs = json.load(f)['data']
+    Eng2Sign.objects.delete()
+    for wp in word_pairs:
+        word_pair_to_eng2sign(wp).save()
+    if use_snapshot:
+        load_dictionary_snapshot()
+
+
+class StageTimer:
+    """Accumulates the time spent in each stage of the current call"""
+
+    def __init__(self):
+        self.current: Dict[str, float] = defaultdict(float)
+
+    def _timed(self, stage: str, func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.current[stage] += time.perf_counter() - start
+        return wrapper
+
+    def _timed_generator(self, stage: str, func):
+        def wrapper(*args, **kwargs):
+            iterator = iter(func(*args, **kwargs))
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.current[stage] += time.perf_counter() - start
+                yield item
+        return wrapper
+
+    @contextmanager
+    def installed(self) -> Iterator['StageTimer']:
+        """Wrap the stage functions of `rb_system.translation` while the context is active"""
+        originals = {name: getattr(translation, name) for name in STAGES.values()}
+        try:
+            for stage, name in STAGES.items():
+                wrap = self._timed_generator if stage == 'parse' else self._timed
+                setattr(translation, name, wrap(stage, originals[name]))
+            yield self
+        finally:
+            for name, func in originals.items():
+                setattr(translation, name, func)
+
+    def take(self) -> Dict[str, float]:
+        stages, self.current = dict(self.current), defaultdict(float)
+        return stages
+
+
+def run_corpus(corpus: List[dict], repeat: int) -> dict:
+    """Translate each entry of the corpus `repeat` times, one call per entry"""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    translations = {}
+    sentence_count = 0
+    total_time = 0.0
+    timer = StageTimer()
+    with timer.installed():
+        for _ in range(repeat):
+            for entry in corpus:
+                text_data = TextData([entry['text']])
+                start = time.perf_counter()
+                try:
+                    result = translation.translate_english_to_sign_gloss(text_data)
+                except Exception as e:
+                    # a failing entry is a result too, the baseline catches a change of it
+                    result = f'error: {e!r}'
+                elapsed = time.perf_counter() - start
+
+                stages = timer.take()
+                translations[entry['text']] = result
+                if isinstance(result, str):
+                    continue
+                total_time += elapsed
+                sentence_count += sum(len(paragraph) for paragraph in text_data.processed_data)
+                latencies['total'].append(elapsed * 1000)
+                for stage in STAGES:
+                    latencies[stage].append(stages.get(stage, 0.0) * 1000)
+
+    return {
+        'repeat': repeat,
+        'sentences': sentence_count,
+        'sentences_per_second': sentence_count / total_time if total_time > 0 else 0.0,
+        'stages': {stage: latency_summary(values) for stage, values in latencies.items()},
+        'translations': translations,
+    }
+
+
+def _print_report(result: dict, corpus: List[dict]):
+    print(f'{len(corpus)} entries x {result["repeat"]} run(s), {result["sentences"]} sentences')
+    print(f'| {"stage":<10} | {"p50 ms":>8} | {"p90 ms":>8} | {"p99 ms":>8} | {"mean ms":>8} |')
+    for stage in [*STAGES, 'total']:
+        if stage in result['stages']:
+            s = result['stages'][stage]
+            print(f'| {stage:<10} | {s["p50"]:>8.2f} | {s["p90"]:>8.2f} | {s["p99"]:>8.2f} | {s["mean"]:>8.2f} |')
+    print(f'{result["sentences_per_second"]:.1f} sentences/s')
+    for entry in corpus:
+        translated = result['translations'][entry['text']]
+        if isinstance(translated, str):
+            print(f'[{entry["rule"]}] {entry["text"]!r} failed: {translated}')
+
+
+def main(corpus_path: str, dictionary_path: str, baseline_path: str, timings_path: str, repeat: int,
+         tolerance: float, use_snapshot: bool, update_baseline: bool, update_timings: bool) -> int:
+    with open(corpus_path, encoding='utf-8') as f:
+        corpus = json.load(f)
+    _seed_dictionary(dictionary_path, use_snapshot)
+    # every call must go through all the stages, the translation cache would skip them
+    settings.translation_cache_size = 0
+
+    # warm up the model and the dictionary so that the measurements don't pay for lazy initialization
+    run_corpus(corpus, repeat=1)
+    result = run_corpus(corpus, repeat)
+    _print_report(result, corpus)
+
+    timings = {key: value for key, value in result.items() if key != 'translations'}
+    if update_baseline:
+        save_baseline(baseline_path, {'translations': result['translations']})
+        print(f'Saved the translations to {baseline_path}')
+    if update_baseline or update_timings:
+        save_baseline(timings_path, timings)
+        print(f'Saved the timings to {timings_path}')
+        return 0
+
+    baseline = load_baseline(baseline_path)
+    if baseline is None:
+        print(f'No baseline at {baseline_path}, run with --update-baseline to create it')
+        return 1
+    machine_timings = load_baseline(timings_path)
+    if machine_timings is None:
+        print(f'No timings at {timings_path}, only the translations are compared, '
+              f'run with --update-timings to save those of this machine')
+    else:
+        baseline = {**machine_timings, **baseline}
+    regressions = compare_with_baseline(result, baseline, tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if len(regressions) == 0:
+        print(f'No regression compared with {baseline_path} (tolerance {tolerance:.0%})')
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--dictionary', default=DEFAULT_DICTIONARY, help='the words, as the body of POST /api/dict/words')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='the expected translations')
+    parser.add_argument('--timings', default=DEFAULT_TIMINGS, help='the latencies and the throughput of this machine')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='the allowed slowdown compared with the baseline, 0.2 = 20%%')
+    parser.add_argument('--snapshot', action='store_true', help='read the dictionary from an in-memory snapshot')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='save the translations and the timings as the new baselines')
+    parser.add_argument('--update-timings', action='store_true', help='save the timings of this machine only')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    sys.exit(main(args.corpus, args.dictionary, args.baseline, args.timings, args.repeat, args.tolerance,
+                  args.snapshot, args.update_baseline, args.update_timings))
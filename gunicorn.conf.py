@@ -0,0 +1,72 @@
+"""
+Gunicorn settings, see https://docs.gunicorn.org/en/stable/settings.html
+
+With `GUNICORN_PRELOAD=true` the app is loaded once in the master process: the spaCy model, the dictionary snapshot
+and the warm-up are done before the workers are forked, so their memory pages are shared (copy-on-write).
+`gc.freeze()` moves the loaded objects out of the garbage collector, which would otherwise touch,
+and so copy, their pages in every worker. Each worker then reconnects to the database and starts its own threads.
+
+The workers write their Prometheus metrics to the files of `PROMETHEUS_MULTIPROC_DIR`, which `GET /metrics` adds up
+(see `rb_system/metrics.py`). Unless it is set, a new folder is created for each run and removed when the server stops.
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+
+def _bool(value: str) -> bool:
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+preload_app = _bool(os.environ.get('GUNICORN_PRELOAD', 'false'))
+if preload_app:
+    # tell `create_app()` to leave the threads and the connections to the workers
+    os.environ['PRELOAD_APP'] = 'true'
+
+# set before the app imports `prometheus_client`, the folder must not contain the files of a previous run
+_own_metrics_dir = 'PROMETHEUS_MULTIPROC_DIR' not in os.environ
+if _own_metrics_dir:
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='thsltrans-metrics-')
+
+
+def when_ready(server):
+    if preload_app:
+        from wsgi import app
+        from api.lifecycle import init_background_services
+        with app.app_context():
+            init_background_services(app)
+        gc.collect()
+        gc.freeze()
+        server.log.info(f'Froze {gc.get_freeze_count()} objects of the preloaded app')
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        # the objects created by the master since the last fork e.g. when a worker is replaced
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from wsgi import app
+        from api.lifecycle import init_worker
+        init_worker(app)
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        from wsgi import app
+        from api.lifecycle import init_background_services
+        with app.app_context():
+            init_background_services(app)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if _own_metrics_dir:
+        shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
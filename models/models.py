@@ -3,8 +3,10 @@ from enum import Enum
 from mongoengine import *
 from spacy.tokens import Token
 from typing import List, Union, Optional
+from rb_system.compact_tokens import CompactToken
 
-TSentence = List[Token]
+# the processed sentences are made of compact tokens, the rules also take spaCy tokens
+TSentence = List[Union[Token, CompactToken]]
 TParagraph = List[TSentence]
 
 
@@ -27,7 +29,23 @@ class Eng2Sign(Document):
     sign_glosses = ListField(EmbeddedDocumentField(SignGloss))
 
     meta = {
-        'collection': 'eng2signs'
+        'collection': 'eng2signs',
+        'indexes': [
+            {'fields': ['english'], 'unique': True},
+        ],
+        # existing duplicates would make the index creation fail,
+        # run `flask migrate-dictionary` to merge them and build the indexes
+        'auto_create_index': False,
+    }
+
+
+class DictionaryRevision(Document):
+    """A counter that every write to the dictionary moves forward, see `rb_system.dictionary`"""
+    name = StringField(primary_key=True)
+    revision = IntField(default=0)
+
+    meta = {
+        'collection': 'dictionary_revisions',
     }
 
 
@@ -58,16 +76,20 @@ class TextData:
     def prepare_response_data(self) -> List[dict]:
         data = []
         for i in range(len(self.thsl_translation)):
-            paragraph = []
-            for sentence in self.thsl_translation[i]:
-                paragraph.append(",".join(sentence))
-            data.append({
-                'p_number': i + 1,
-                'original': self.original[i],
-                'thsl_translation': paragraph
-            })
+            data.append(self.prepare_paragraph_data(i + 1, self.original[i], self.thsl_translation[i]))
         return data
 
+    @staticmethod
+    def prepare_paragraph_data(p_number: int, original: str, thsl_paragraph: List[List[str]]) -> dict:
+        paragraph = []
+        for sentence in thsl_paragraph:
+            paragraph.append(",".join(sentence))
+        return {
+            'p_number': p_number,
+            'original': original,
+            'thsl_translation': paragraph
+        }
+
 
 class ThSLClassifier:
 
@@ -1,8 +1,10 @@
-from typing import List, Union
+from typing import List, Union, Optional
 from models.models import *
 from spacy.tokens import Token, Span
 from rb_system.nlp_tools import *
 from rb_system.types import DependencyLabel, POSLabel, EntityLabel
+from rb_system.rule_registry import RuleRegistry
+from rb_system.metrics import record_rule
 
 """
 This code contains rules of basic simple sentence structure (the obligatory part of ThSL sentence).
@@ -16,6 +18,12 @@ Symbols from the ThSL research
 TempToken = Union[Token, None]
 TempSpan = Union[Span, None]
 
+# the rules of `rb_system.translation.rearrange_basic_sentence()`, the features are those of `SentenceFeatures`
+basic_rules = RuleRegistry(
+    features=('single_word', 'phrase', 'locative', 'stative', 'transitive', 'intransitive', 'ditransitive'),
+    observer=record_rule
+)
+
 PRONOUNS = {
     'we': ['us', 'ourselves', 'our'],
     'they': ['them', 'themselves', 'their'],
@@ -27,16 +35,19 @@ PRONOUNS = {
 }
 
 
-def br0_single_word(sentence: TSentence) -> List[str]:
+@basic_rules.register('br0 w', when={'single_word': True}, order=0)
+def br0_single_word(sentence: TSentence, features: Optional[SentenceFeatures] = None) -> List[str]:
     return [tk.lemma_ for tk in sentence]
 
 
-def br0_phrase(sentence: TSentence) -> List[str]:
+@basic_rules.register('br0 p', when={'phrase': True}, order=10)
+def br0_phrase(sentence: TSentence, features: Optional[SentenceFeatures] = None) -> List[str]:
     phrase = [' '.join(tk.lemma_ for tk in sentence)]
     return phrase
 
 
-def br1_transitive_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase]]:
+@basic_rules.register('br1', when={'transitive': True}, order=40)
+def br1_transitive_sentence(sentence: TSentence, features: Optional[SentenceFeatures] = None) -> List[Union[str, ThSLPhrase]]:
     """
     Rearrange the input text according to the grammar rule #1 (p.80)
     of a basic sentence.
@@ -52,13 +63,15 @@ def br1_transitive_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase]]
         ST = (+)O (+|-)S (+)[S - V - O]
     """
     # ending_marker = 'nodding'
-    subject: TempToken = None
+    if features is None:
+        features = SentenceFeatures(sentence)
+    subject: TempToken = features.subject
     direct_object: TempToken = None
     verb: TempToken = None
     for idx, tk in enumerate(sentence):
         tk: Token
         if tk.dep_ == DependencyLabel.NOMINAL_SUBJECT.value:
-            subject = tk
+            continue
         elif tk.dep_ == DependencyLabel.DIRECT_OBJECT.value:
             direct_object = tk
         elif tk.tag_ == POSLabel.P_VERB_PRESENT_PARTICIPLE.value:
@@ -74,13 +87,13 @@ def br1_transitive_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase]]
 
     thsl_subject = ThSLNounPhrase(noun=subject)
     thsl_dobj = ThSLNounPhrase(noun=direct_object)
-    noun_phrases = retrieve_noun_phrases(sentence)
+    noun_phrases = features.noun_phrases
     for np in noun_phrases:
         np: Span
-        if subject.text in str(np):
+        if is_token_in_span(subject, np):
             adj_lst = noun_phrase_to_adjectives(np)
             thsl_subject.add_adjectives(adj_lst)
-        elif direct_object.text in str(np):
+        elif is_token_in_span(direct_object, np):
             adj_lst = noun_phrase_to_adjectives(np)
             thsl_dobj.add_adjectives(adj_lst)
 
@@ -105,19 +118,22 @@ def br1_transitive_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase]]
     return thsl_sentence
 
 
-def br2_intransitive_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase]]:
+@basic_rules.register('br2', when={'intransitive': True}, order=50)
+def br2_intransitive_sentence(sentence: TSentence, features: Optional[SentenceFeatures] = None) -> List[Union[str, ThSLPhrase]]:
     """
     Rearrange the input text according to the grammar rule #2 (p.81)
     of a basic sentence.
 
     SInT = (+)S (+)[S - V]
     """
+    if features is None:
+        features = SentenceFeatures(sentence)
     subject: TempToken = None
     root: TempToken = None
-    for idx, tk in enumerate(sentence):
+    for idx, tk in features.roots:
         tk: Token
         try:
-            if idx > 0 and tk.dep_ == DependencyLabel.ROOT.value:
+            if idx > 0:
                 subject = tk.nbor(-1)
                 root = tk
         except IndexError:
@@ -126,10 +142,10 @@ def br2_intransitive_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase
     assert root is not None, '[br2] Sentence must contain verb'
 
     thsl_subject = ThSLNounPhrase(noun=subject)
-    noun_phrases = retrieve_noun_phrases(sentence)
+    noun_phrases = features.noun_phrases
     for np in noun_phrases:
         np: Span
-        if subject.text in str(np):
+        if is_token_in_span(subject, np):
             adj_lst = noun_phrase_to_adjectives(np)
             thsl_subject.add_adjectives(adj_lst)
 
@@ -139,7 +155,8 @@ def br2_intransitive_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase
 
 
 # TODO: use ThSLNounPhrase
-def br3_ditransitive_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase]]:
+@basic_rules.register('br3', when={'ditransitive': True}, order=60)
+def br3_ditransitive_sentence(sentence: TSentence, features: Optional[SentenceFeatures] = None) -> List[Union[str, ThSLPhrase]]:
     """
     Rearrange the input text according to the grammar rule #3 (p.81)
     of a basic sentence.
@@ -155,24 +172,13 @@ def br3_ditransitive_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase
     # dative that follows ROOT -> indirect object
     # the second dobj -> real direct object
     # if the subject is a name of sth. -> should state subject twice
-    subject: TempToken = None
-    direct_object: TempToken = None
-    indirect_object: TempToken = None
-    root: TempToken = None
-    quantity: TempToken = None
-
-    for tk in sentence:
-        tk: Token
-        if tk.dep_ == DependencyLabel.NOMINAL_SUBJECT.value:
-            subject = tk
-        elif tk.dep_ == DependencyLabel.ROOT.value:
-            root = tk
-        elif tk.dep_ == DependencyLabel.DIRECT_OBJECT.value:
-            direct_object = tk
-        elif tk.dep_ == DependencyLabel.DATIVE.value:
-            indirect_object = tk
-        elif tk.ent_type_ == EntityLabel.CARDINAL.value:
-            quantity = tk
+    if features is None:
+        features = SentenceFeatures(sentence)
+    subject: TempToken = features.subject
+    direct_object: TempToken = features.direct_objects[-1] if len(features.direct_objects) > 0 else None
+    indirect_object: TempToken = features.dative
+    root: TempToken = features.root
+    quantity: TempToken = features.quantity
 
     assert subject is not None, '[b3] Sentence must contain subject'
     assert root is not None, '[b3] Sentence must contain verb'
@@ -193,7 +199,8 @@ def br3_ditransitive_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase
     return thsl_sentence
 
 
-def br4_locative_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase]]:
+@basic_rules.register('br4', when={'locative': True}, order=20)
+def br4_locative_sentence(sentence: TSentence, features: Optional[SentenceFeatures] = None) -> List[Union[str, ThSLPhrase]]:
     """
     Rearrange the input text according to the grammar rule #4 (p.83)
     of a basic sentence.
@@ -203,23 +210,24 @@ def br4_locative_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase]]:
     "I work at Kasesart University.",
             "Mother is at home.",
     """
+    if features is None:
+        features = SentenceFeatures(sentence)
     set_scene = False
     special_prep = ['in', 'on', 'under']
-    subject: TempToken = None
-    root: TempToken = None
+    subject: TempToken = features.subject
+    root: TempToken = features.root
     prep: TempToken = None
 
-    prep_phrases = retrieve_preposition_phrases(sentence)
-    prep_phrases_of_place = filter_preposition_of_place(prep_phrases)
+    prep_phrases_of_place = features.places
     assert len(prep_phrases_of_place) < 2, f'[b4] Expected to find 1 perp phrase but found {len(prep_phrases_of_place)}'
     location = prep_phrases_of_place[0][1]
 
     for tk in sentence:
         tk: Token
         if tk.dep_ == DependencyLabel.ROOT.value:
-            root = tk
+            continue
         elif tk.dep_ == DependencyLabel.NOMINAL_SUBJECT.value:
-            subject = tk
+            continue
         elif tk.lemma_ in special_prep:
             set_scene = True
             prep = tk
@@ -230,10 +238,10 @@ def br4_locative_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase]]:
     thsl_verb = ThSLVerbPhrase(verb=root, subj_of_verb=subject, iobj_of_verb=location)
     thsl_location = ThSLNounPhrase(noun=location)
     thsl_subject = ThSLNounPhrase(noun=subject)
-    noun_phrases = retrieve_noun_phrases(sentence)
+    noun_phrases = features.noun_phrases
     for np in noun_phrases:
         np: Span
-        if subject.text in str(np):
+        if is_token_in_span(subject, np):
             adj_lst = noun_phrase_to_adjectives(np)
             thsl_subject.add_adjectives(adj_lst)
 
@@ -252,27 +260,24 @@ def br4_locative_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase]]:
     return thsl_sentence
 
 
-def br13_stative_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase]]:
+@basic_rules.register('br13', when={'stative': True}, order=30)
+def br13_stative_sentence(sentence: TSentence, features: Optional[SentenceFeatures] = None) -> List[Union[str, ThSLPhrase]]:
     """
     pg. 93-94
     """
-    subject: TempToken = None
-    adj_complement: TempToken = None
-    for tk in sentence:
-        tk: Token
-        if tk.dep_ == DependencyLabel.NOMINAL_SUBJECT.value:
-            subject = tk
-        elif tk.dep_ == DependencyLabel.ADJECTIVAL_COMPLEMENT.value:
-            adj_complement = tk
+    if features is None:
+        features = SentenceFeatures(sentence)
+    subject: TempToken = features.subject
+    adj_complement: TempToken = features.adjectival_complement
 
     assert subject is not None, '[br13] Sentence must contain subject'
     assert adj_complement is not None, '[br13] Sentence must contain adjectival complement'
 
     thsl_subject = ThSLNounPhrase(noun=subject)
-    noun_phrases = retrieve_noun_phrases(sentence)
+    noun_phrases = features.noun_phrases
     for np in noun_phrases:
         np: Span
-        if subject.text in str(np):
+        if is_token_in_span(subject, np):
             adj_lst = noun_phrase_to_adjectives(np)
             thsl_subject.add_adjectives(adj_lst)
 
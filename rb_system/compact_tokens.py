@@ -0,0 +1,185 @@
+from bisect import bisect_right
+from operator import getitem
+from spacy.tokens import Doc
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+import sys
+
+"""
+Compact copies of the parsed paragraphs, with only the token attributes that the rules read.
+A spaCy `Doc` keeps its token arrays, tensors and the extension data alive as long as one of its tokens is referenced,
+so the processed paragraphs are converted right after parsing and the docs are freed before the rules run.
+The attributes have the same names as those of spaCy (`lemma_`, `dep_`, `nbor()`, `ancestors`, `sent`, ...),
+so the rules work with both, and the records are pickled as plain tuples (see `CompactDoc.__reduce__()`).
+"""
+
+# text, lemma_, pos_, tag_, dep_, ent_type_, head index, is_punct
+TokenFields = Tuple[str, str, str, str, str, str, int, bool]
+
+
+class CompactToken:
+    __slots__ = ('doc', 'i', 'text', 'lemma_', 'pos_', 'tag_', 'dep_', 'ent_type_', 'head_i', 'is_punct')
+
+    def __init__(self, doc: 'CompactDoc', i: int, fields: TokenFields):
+        self.doc = doc
+        self.i = i
+        self.text, self.lemma_, self.pos_, self.tag_, self.dep_, self.ent_type_, self.head_i, self.is_punct = fields
+
+    @property
+    def head(self) -> 'CompactToken':
+        return self.doc.tokens[self.head_i]
+
+    @property
+    def ancestors(self) -> Iterator['CompactToken']:
+        """The heads of the token up to the root of its sentence"""
+        token = self
+        while token.head_i != token.i:
+            token = token.head
+            yield token
+
+    @property
+    def sent(self) -> 'CompactSpan':
+        return self.doc.sent_of(self.i)
+
+    def nbor(self, i: int = 1) -> 'CompactToken':
+        """The token at the offset `i` in the doc, raises an IndexError outside of the doc like `Token.nbor()`"""
+        idx = self.i + i
+        if idx < 0 or idx >= len(self.doc.tokens):
+            raise IndexError(f'Token index {idx} out of bounds ({len(self.doc.tokens)})')
+        return self.doc.tokens[idx]
+
+    def fields(self) -> TokenFields:
+        return self.text, self.lemma_, self.pos_, self.tag_, self.dep_, self.ent_type_, self.head_i, self.is_punct
+
+    def __reduce__(self):
+        # the doc is pickled once and the token is looked up in it, the same token is the same object after unpickling
+        return getitem, (self.doc, self.i)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return self.text
+
+
+class CompactSpan:
+    __slots__ = ('doc', 'start', 'end')
+
+    def __init__(self, doc: 'CompactDoc', start: int, end: int):
+        self.doc = doc
+        self.start = start
+        self.end = end
+
+    @property
+    def text(self) -> str:
+        if self.start >= self.end:
+            return ''
+        last = self.doc.tokens[self.end - 1]
+        return self.doc.text[self.doc.char_offsets[self.start]:self.doc.char_offsets[self.end - 1] + len(last.text)]
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __iter__(self) -> Iterator[CompactToken]:
+        return iter(self.doc.tokens[self.start:self.end])
+
+    def __getitem__(self, i: int) -> CompactToken:
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError(f'Token index {i} out of bounds ({len(self)})')
+        return self.doc.tokens[self.start + i]
+
+    def __reduce__(self):
+        return CompactSpan, (self.doc, self.start, self.end)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return self.text
+
+
+class CompactDoc:
+    """
+    :ivar text: the text of the paragraph
+    :ivar tokens: the tokens, including the punctuations
+    :ivar char_offsets: the character offset of each token in `text`
+    :ivar sent_starts: the index of the first token of each sentence
+    :ivar noun_chunks: the (start, end) of the noun chunk of each token, None if it isn't in a noun chunk
+    """
+    __slots__ = ('text', 'tokens', 'char_offsets', 'sent_starts', 'noun_chunks')
+
+    def __init__(
+            self,
+            text: str,
+            token_fields: Sequence[TokenFields],
+            char_offsets: Sequence[int],
+            sent_starts: Sequence[int],
+            noun_chunks: Sequence[Optional[Tuple[int, int]]]
+    ):
+        self.text = text
+        self.tokens: Tuple[CompactToken, ...] = tuple(
+            CompactToken(self, i, fields) for i, fields in enumerate(token_fields)
+        )
+        self.char_offsets = tuple(char_offsets)
+        self.sent_starts = tuple(sent_starts)
+        self.noun_chunks = tuple(noun_chunks)
+
+    @classmethod
+    def from_doc(cls, doc: Doc) -> 'CompactDoc':
+        """Copy the parsed (and retokenized) doc, the labels are interned since they repeat in every paragraph"""
+        token_fields = [
+            (
+                token.text, token.lemma_,
+                sys.intern(token.pos_), sys.intern(token.tag_), sys.intern(token.dep_), sys.intern(token.ent_type_),
+                token.head.i, token.is_punct
+            )
+            for token in doc
+        ]
+        noun_chunks: List[Optional[Tuple[int, int]]] = [None] * len(doc)
+        for chunk in doc.noun_chunks:
+            for i in range(chunk.start, chunk.end):
+                noun_chunks[i] = (chunk.start, chunk.end)
+        return cls(
+            doc.text,
+            token_fields,
+            [token.idx for token in doc],
+            [sent.start for sent in doc.sents],
+            noun_chunks
+        )
+
+    @property
+    def sents(self) -> List[CompactSpan]:
+        ends = self.sent_starts[1:] + (len(self.tokens),)
+        return [CompactSpan(self, start, end) for start, end in zip(self.sent_starts, ends)]
+
+    def sent_of(self, i: int) -> CompactSpan:
+        """The sentence of the token at the index `i`"""
+        idx = bisect_right(self.sent_starts, i) - 1
+        end = self.sent_starts[idx + 1] if idx + 1 < len(self.sent_starts) else len(self.tokens)
+        return CompactSpan(self, self.sent_starts[idx], end)
+
+    def noun_chunk_of(self, token: CompactToken) -> Optional[Tuple[int, int]]:
+        return self.noun_chunks[token.i]
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[CompactToken, CompactSpan]:
+        if isinstance(i, slice):
+            start, end, _ = i.indices(len(self.tokens))
+            return CompactSpan(self, start, max(start, end))
+        return self.tokens[i]
+
+    def __iter__(self) -> Iterator[CompactToken]:
+        return iter(self.tokens)
+
+    def __reduce__(self):
+        return CompactDoc, (
+            self.text,
+            [token.fields() for token in self.tokens],
+            self.char_offsets,
+            self.sent_starts,
+            self.noun_chunks
+        )
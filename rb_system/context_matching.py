@@ -0,0 +1,116 @@
+from typing import Dict, Hashable, Iterable, List, Set
+
+"""
+Counting the matched contexts between a sign gloss and the words related to a verb or a preposition.
+
+A gloss matches a related context once for every non-empty combination of its contexts
+that is also a related context. The related contexts are either every non-empty subset of
+the contexts of a related word (the powerset) or an exact set such as {'multiple subjects'}.
+Instead of enumerating the powersets, the contexts are encoded as bits and the combinations are
+counted from the size of the intersections: a set of k contexts has 2^k - 1 non-empty subsets.
+"""
+
+
+class RelatedContexts:
+
+    def __init__(self):
+        self._bits: Dict[Hashable, int] = {}
+        # masks whose every non-empty subset is a related context
+        self._families: Set[int] = set()
+        # masks that are related contexts on their own
+        self._exact: Set[int] = set()
+
+    def __repr__(self):
+        contexts = list(self._bits.keys())
+        return f'RelatedContexts(contexts={contexts},families={len(self._families)},exact={len(self._exact)})'
+
+    def _to_mask(self, contexts: Iterable[Hashable]) -> int:
+        mask = 0
+        for context in contexts:
+            bit = self._bits.get(context)
+            if bit is None:
+                bit = 1 << len(self._bits)
+                self._bits[context] = bit
+            mask |= bit
+        return mask
+
+    def add_all_subsets(self, contexts: Iterable[Hashable]) -> 'RelatedContexts':
+        """Every non-empty subset of the given contexts is a related context"""
+        mask = self._to_mask(contexts)
+        if mask:
+            self._families.add(mask)
+        return self
+
+    def add_exact(self, contexts: Iterable[Hashable]) -> 'RelatedContexts':
+        """The given set of contexts (only as a whole) is a related context"""
+        mask = self._to_mask(contexts)
+        if mask:
+            self._exact.add(mask)
+        return self
+
+    def count_matches(self, gloss_contexts: List[Hashable]) -> int:
+        """
+        Returns the number of the non-empty combinations of the gloss contexts that are related contexts.
+        A context that is repeated in the gloss makes more combinations, the same as `itertools.combinations()`.
+        """
+        # the number of times each known context appears in the gloss, by bit
+        multiplicity: Dict[int, int] = {}
+        for context in gloss_contexts:
+            bit = self._bits.get(context)
+            if bit is not None:
+                multiplicity[bit] = multiplicity.get(bit, 0) + 1
+        if len(multiplicity) == 0:
+            return 0
+
+        gloss_mask = 0
+        for bit in multiplicity:
+            gloss_mask |= bit
+
+        def subsets_weight(mask: int) -> int:
+            """The number of the non-empty combinations of the gloss contexts within the mask"""
+            size = 0
+            for bit, count in multiplicity.items():
+                if mask & bit:
+                    size += count
+            return (1 << size) - 1
+
+        families = _maximal_masks({family & gloss_mask for family in self._families} - {0})
+        count = _count_union_of_subsets(families, subsets_weight)
+
+        for mask in self._exact:
+            if mask & ~gloss_mask:
+                continue
+            if any(mask & ~family == 0 for family in families):
+                # already counted as a subset of a family
+                continue
+            exact_weight = 1
+            for bit, times in multiplicity.items():
+                if mask & bit:
+                    exact_weight *= (1 << times) - 1
+            count += exact_weight
+        return count
+
+
+def _maximal_masks(masks: Set[int]) -> List[int]:
+    """Drop the masks that are a subset of another mask"""
+    return [mask for mask in masks if not any(mask != other and mask & ~other == 0 for other in masks)]
+
+
+def _count_union_of_subsets(families: List[int], subsets_weight) -> int:
+    """
+    Count the combinations that are subsets of at least one of the families by inclusion–exclusion.
+    The terms with the same intersection are merged, so the number of terms is bounded by the number
+    of distinct intersections rather than by the number of subsets of the families.
+    """
+    # intersection mask -> inclusion-exclusion coefficient
+    coefficients: Dict[int, int] = {}
+    for family in families:
+        updated = dict(coefficients)
+        for mask, coefficient in coefficients.items():
+            intersection = mask & family
+            if intersection:
+                updated[intersection] = updated.get(intersection, 0) - coefficient
+        updated[family] = updated.get(family, 0) + 1
+        coefficients = {mask: coefficient for mask, coefficient in updated.items() if coefficient != 0}
+
+    return sum(coefficient * subsets_weight(mask) for mask, coefficient in coefficients.items())
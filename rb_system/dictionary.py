@@ -0,0 +1,245 @@
+from models.models import Eng2Sign, SignGloss, DictionaryRevision
+from typing import Dict, Hashable, Iterable, Optional, Sequence, Set, Union
+from rb_system.settings import settings
+from rb_system.dictionary_snapshot import SnapshotHolder, SnapshotReloader, WordRecord
+from rb_system.metrics import PREFETCH_SECONDS, DICTIONARY_WORDS
+from utils.cache import LRUCache
+
+import logging
+import threading
+import time
+
+"""
+Access to the English-to-SignGloss dictionary (the `eng2signs` collection) for the translation.
+The words are cached in memory, including the words that are not in the dictionary.
+Every write moves the dictionary revision forward, the workers that see a new revision drop their cached words.
+By default the revision is read for every translation, so no stale gloss is served after a write. Both options
+below trade that for fewer queries and may serve stale glosses after a write in another worker: a revision read
+can be reused for `settings.dictionary_revision_ttl` seconds, and with the snapshot the whole dictionary is kept
+in memory and the translation doesn't query the database at all until the reloader sees the new revision.
+"""
+
+_REVISION_NAME = 'eng2signs'
+
+DictionaryWord = Union[Eng2Sign, WordRecord]
+
+# English word -> its dictionary entry, None if the word isn't in the dictionary
+WordMap = Dict[str, Optional[DictionaryWord]]
+
+_word_cache: Optional[LRUCache] = None
+_snapshot_holder = SnapshotHolder()
+_snapshot_reloader: Optional[SnapshotReloader] = None
+# the last dictionary revision seen by this worker and when it was read (monotonic time)
+_known_revision: Optional[int] = None
+_revision_checked_at: Optional[float] = None
+_revision_lock = threading.Lock()
+
+
+def get_word_cache() -> LRUCache:
+    global _word_cache
+    if _word_cache is None:
+        _word_cache = LRUCache(settings.dictionary_cache_size, settings.dictionary_cache_ttl)
+    return _word_cache
+
+
+def start_dictionary_snapshot():
+    """Load the dictionary snapshot, then keep reloading it in the background"""
+    load_dictionary_snapshot()
+    start_snapshot_reloader()
+
+
+def load_dictionary_snapshot():
+    _snapshot_holder.reload()
+
+
+def start_snapshot_reloader():
+    """Start the background reloads, a forked process must start its own (the threads aren't forked)"""
+    global _snapshot_reloader
+    if _snapshot_reloader is None:
+        _snapshot_reloader = SnapshotReloader(
+            _snapshot_holder,
+            settings.dictionary_snapshot_interval or None,
+            poll=check_dictionary_revision,
+            poll_interval=max(settings.dictionary_revision_ttl or 0, 1.0)
+        )
+        _snapshot_reloader.start()
+
+
+def request_snapshot_reload() -> bool:
+    """Reload the dictionary snapshot in the background, returns False if the snapshot isn't enabled"""
+    if _snapshot_reloader is None:
+        return False
+    _snapshot_reloader.request_reload()
+    return True
+
+
+def lookup_word(english: str, word_map: Optional[WordMap] = None) -> Optional[DictionaryWord]:
+    """
+    Returns the dictionary entry of the given English word or None if it isn't in the dictionary.
+
+    :param word_map: the words loaded by `prefetch_words()`, the word is queried only if it isn't in the map
+    """
+    if word_map is not None and english in word_map:
+        return word_map[english]
+
+    snapshot = _snapshot_holder.snapshot
+    if snapshot is not None:
+        return snapshot.get(english)
+
+    cache = get_word_cache()
+    found, word = cache.lookup(english)
+    if found:
+        return word
+
+    word = _query_word(english)
+    cache.set(english, word)
+    return word
+
+
+def _query_word(english: str) -> Optional[Eng2Sign]:
+    results = list(Eng2Sign.objects(english=english).limit(2))
+    if len(results) == 0:
+        return None
+    if len(results) > 1:
+        logging.warning(f'Duplicated `english` key in the dictionary: {english}')
+    return results[0]
+
+
+def prefetch_words(words: Iterable[str]) -> WordMap:
+    """
+    Load all the given words with a single `english__in` query, the cached words aren't queried again.
+    The returned map contains every given word, None for the words that aren't in the dictionary.
+    """
+    with PREFETCH_SECONDS.time():
+        word_map = _load_words(set(words))
+    found = sum(word is not None for word in word_map.values())
+    DICTIONARY_WORDS.labels('found').inc(found)
+    DICTIONARY_WORDS.labels('missing').inc(len(word_map) - found)
+    return word_map
+
+
+def _load_words(words: Set[str]) -> WordMap:
+    snapshot = _snapshot_holder.snapshot
+    if snapshot is not None:
+        return {english: snapshot.get(english) for english in words}
+
+    cache = get_word_cache()
+    word_map: WordMap = {}
+    missing = []
+    for english in words:
+        found, word = cache.lookup(english)
+        if found:
+            word_map[english] = word
+        else:
+            missing.append(english)
+
+    if len(missing) == 0:
+        return word_map
+
+    for word in Eng2Sign.objects(english__in=missing):
+        if word.english in word_map:
+            logging.warning(f'Duplicated `english` key in the dictionary: {word.english}')
+            continue
+        word_map[word.english] = word
+
+    for english in missing:
+        word = word_map.setdefault(english, None)
+        cache.set(english, word)
+
+    logging.debug('Prefetched %d word(s) from the dictionary, %d cached', len(missing), len(word_map) - len(missing))
+    return word_map
+
+
+def select_glosses(word: DictionaryWord, lang: Optional[str] = None, pos: Optional[str] = None) -> Sequence[SignGloss]:
+    """The sign glosses of the given language and POS (any if None), in the dictionary order"""
+    if isinstance(word, WordRecord):
+        return word.glosses(lang, pos)
+    return [
+        gloss for gloss in word.sign_glosses
+        if (lang is None or gloss.lang == lang) and (pos is None or gloss.pos == pos)
+    ]
+
+
+def invalidate_words(words: Iterable[str]):
+    """
+    Drop the cached entries of the given English words and move the dictionary revision forward,
+    must be called after the words are modified
+    """
+    words = set(words)
+    if len(words) == 0:
+        return
+    bump_dictionary_revision()
+    _expire_known_revision()
+    cache = get_word_cache()
+    for word in words:
+        cache.invalidate(word)
+    _snapshot_holder.apply_changes(words)
+
+
+def dictionary_revision() -> int:
+    revision = DictionaryRevision.objects(name=_REVISION_NAME).as_pymongo().first()
+    return revision['revision'] if revision is not None else 0
+
+
+def bump_dictionary_revision() -> int:
+    revision = DictionaryRevision.objects(name=_REVISION_NAME).modify(upsert=True, new=True, inc__revision=1)
+    return revision.revision
+
+
+def dictionary_version() -> Hashable:
+    """
+    Returns a value that changes whenever the words that this worker reads change,
+    the results computed from the dictionary can be cached with it.
+    With the snapshot, it is the generation of the snapshot and the database isn't queried,
+    otherwise it is the dictionary revision, which is read again after `settings.dictionary_revision_ttl` seconds.
+    """
+    snapshot = _snapshot_holder.snapshot
+    if snapshot is not None:
+        return 'snapshot', snapshot.generation
+
+    with _revision_lock:
+        ttl = settings.dictionary_revision_ttl
+        if _revision_checked_at is not None and ttl and time.monotonic() - _revision_checked_at < ttl:
+            return _known_revision
+    return check_dictionary_revision()
+
+
+def check_dictionary_revision() -> int:
+    """
+    Read the dictionary revision, the cached words are dropped and the snapshot is reloaded
+    when another worker has modified the dictionary
+    """
+    global _known_revision, _revision_checked_at
+    revision = dictionary_revision()
+    with _revision_lock:
+        changed = _known_revision is not None and revision != _known_revision
+        if changed:
+            logging.info(f'The dictionary revision has moved from {_known_revision} to {revision}')
+        _known_revision = revision
+        _revision_checked_at = time.monotonic()
+    if changed:
+        get_word_cache().clear()
+        request_snapshot_reload()
+    return revision
+
+
+def _expire_known_revision():
+    """The writes of this worker are seen by its next translation"""
+    global _revision_checked_at
+    with _revision_lock:
+        _revision_checked_at = None
+
+
+def dictionary_cache_stats() -> dict:
+    return {
+        'revision': _known_revision,
+        **get_word_cache().stats(),
+    }
+
+
+def dictionary_snapshot_stats() -> dict:
+    return {
+        'enabled': settings.dictionary_snapshot,
+        'interval': settings.dictionary_snapshot_interval or None,
+        **_snapshot_holder.stats(),
+    }
@@ -0,0 +1,298 @@
+from models.models import Eng2Sign
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from datetime import datetime, timezone
+
+import itertools
+import logging
+import sys
+import threading
+import time
+
+"""
+An immutable in-memory copy of the whole English-to-SignGloss dictionary (the `eng2signs` collection).
+The records duck-type `Eng2Sign` and `SignGloss`, so the translation functions can read them directly.
+"""
+
+# (lang, pos), None matches any language or POS
+GlossKey = Tuple[Optional[str], Optional[str]]
+
+# every snapshot, including the ones made by a delta, has a new generation
+_generations = itertools.count(1)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class GlossRecord:
+    __slots__ = ('gloss', 'lang', 'contexts', 'priority', 'pos')
+
+    def __init__(self, gloss: Optional[str], lang: Optional[str], contexts: Tuple,
+                 priority: Optional[float], pos: Optional[str]):
+        self.gloss = gloss
+        self.lang = lang
+        self.contexts = contexts
+        self.priority = priority
+        self.pos = pos
+
+    @classmethod
+    def from_son(cls, son: dict) -> 'GlossRecord':
+        return cls(
+            son.get('gloss'),
+            _intern(son.get('lang')),
+            tuple(_intern(ctx) for ctx in son.get('contexts') or ()),
+            son.get('priority'),
+            _intern(son.get('pos')),
+        )
+
+    def _fields(self):
+        return self.gloss, self.lang, self.contexts, self.priority, self.pos
+
+    def __eq__(self, other):
+        if type(other) != type(self):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    def __hash__(self):
+        return hash(self._fields())
+
+    def __repr__(self):
+        return f'SignGloss(gloss={self.gloss})'
+
+
+class WordRecord:
+    __slots__ = ('english', 'en_pos', 'contexts', 'sign_glosses', '_glosses_by_key')
+
+    def __init__(self, english: str, en_pos: Optional[str], contexts: Tuple, sign_glosses: Tuple[GlossRecord, ...]):
+        self.english = english
+        self.en_pos = en_pos
+        self.contexts = contexts
+        self.sign_glosses = sign_glosses
+
+        # pre-split glosses, in the dictionary order
+        glosses_by_key: Dict[GlossKey, List[GlossRecord]] = {}
+        for gloss in sign_glosses:
+            for key in ((gloss.lang, gloss.pos), (gloss.lang, None), (None, gloss.pos)):
+                glosses_by_key.setdefault(key, []).append(gloss)
+        self._glosses_by_key: Dict[GlossKey, Tuple[GlossRecord, ...]] = {
+            key: tuple(glosses) for key, glosses in glosses_by_key.items()
+        }
+
+    @classmethod
+    def from_son(cls, son: dict) -> 'WordRecord':
+        return cls(
+            son['english'],
+            _intern(son.get('en_pos')),
+            tuple(_intern(ctx) for ctx in son.get('contexts') or ()),
+            tuple(GlossRecord.from_son(gloss) for gloss in son.get('sign_glosses') or ()),
+        )
+
+    def glosses(self, lang: Optional[str] = None, pos: Optional[str] = None) -> Tuple[GlossRecord, ...]:
+        """The sign glosses of the given language and POS, in the dictionary order"""
+        if lang is None and pos is None:
+            return self.sign_glosses
+        return self._glosses_by_key.get((lang, pos), ())
+
+    def __repr__(self):
+        return f'Eng2Sign(english={self.english})'
+
+
+def load_word_records(words: Optional[Iterable[str]] = None) -> Dict[str, WordRecord]:
+    """Query the given words, or the whole dictionary, as records, the first entry of a duplicated word is kept"""
+    query = Eng2Sign.objects if words is None else Eng2Sign.objects(english__in=list(words))
+    records: Dict[str, WordRecord] = {}
+    for son in query.as_pymongo().no_cache():
+        record = WordRecord.from_son(son)
+        if record.english in records:
+            logging.warning(f'Duplicated `english` key in the dictionary: {record.english}')
+            continue
+        records[record.english] = record
+    return records
+
+
+def _approximate_size(obj, seen: Set[int]) -> int:
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (GlossRecord, WordRecord)):
+        size += sum(_approximate_size(getattr(obj, attr), seen) for attr in obj.__slots__)
+    elif isinstance(obj, dict):
+        size += sum(_approximate_size(k, seen) + _approximate_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (tuple, list)):
+        size += sum(_approximate_size(item, seen) for item in obj)
+    return size
+
+
+class DictionarySnapshot:
+    """
+    The dictionary words keyed by `english`, never modified after it is built.
+    The changes are applied by `with_words()`, which returns a new snapshot.
+    """
+
+    def __init__(self, words: Dict[str, WordRecord], build_time: float):
+        self._words: Mapping[str, WordRecord] = MappingProxyType(words)
+        self.generation = next(_generations)
+        self.build_time = build_time
+        self.built_at = datetime.now(timezone.utc)
+        self.size_bytes = _approximate_size(words, set())
+
+    @classmethod
+    def build(cls) -> 'DictionarySnapshot':
+        start = time.perf_counter()
+        words = load_word_records()
+        return cls(words, time.perf_counter() - start)
+
+    def __len__(self):
+        return len(self._words)
+
+    def __contains__(self, english: str):
+        return english in self._words
+
+    def get(self, english: str) -> Optional[WordRecord]:
+        return self._words.get(english)
+
+    def with_words(self, changed: Iterable[str], records: Dict[str, WordRecord]) -> 'DictionarySnapshot':
+        """
+        A new snapshot with the changed words replaced by the given records,
+        a changed word that has no record is removed.
+        """
+        start = time.perf_counter()
+        words = dict(self._words)
+        for english in changed:
+            record = records.get(english)
+            if record is None:
+                words.pop(english, None)
+            else:
+                words[english] = record
+        return DictionarySnapshot(words, time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        return {
+            'generation': self.generation,
+            'words': len(self._words),
+            'glosses': sum(len(word.sign_glosses) for word in self._words.values()),
+            'build_time': self.build_time,
+            'built_at': self.built_at.isoformat(),
+            'size_bytes': self.size_bytes,
+        }
+
+
+class SnapshotHolder:
+    """
+    Holds the current snapshot and swaps it atomically on a full reload or a delta.
+    The words changed while a full reload is running are applied again on top of the reloaded snapshot.
+    """
+
+    def __init__(self):
+        self.snapshot: Optional[DictionarySnapshot] = None
+        self.reloads = 0
+        self.deltas = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._delta_lock = threading.Lock()
+        # the words changed since the running reload started, None if no reload is running
+        self._pending: Optional[Set[str]] = None
+
+    def reload(self) -> DictionarySnapshot:
+        with self._reload_lock:
+            with self._lock:
+                self._pending = set()
+            try:
+                snapshot = DictionarySnapshot.build()
+                while True:
+                    with self._lock:
+                        pending = self._pending
+                        if not pending:
+                            self.snapshot = snapshot
+                            self.reloads += 1
+                            break
+                        self._pending = set()
+                    snapshot = snapshot.with_words(pending, load_word_records(pending))
+            finally:
+                with self._lock:
+                    self._pending = None
+
+        logging.info(
+            f'Loaded the dictionary snapshot, {len(snapshot)} word(s) in {snapshot.build_time:.3f}s '
+            f'(~{snapshot.size_bytes / 1024 / 1024:.1f} MiB)'
+        )
+        return snapshot
+
+    def apply_changes(self, words: Iterable[str]):
+        """Reload the given words from the database, must be called after the words are modified"""
+        words = set(words)
+        if self.snapshot is None or len(words) == 0:
+            return
+        with self._delta_lock:
+            records = load_word_records(words)
+            with self._lock:
+                self.snapshot = self.snapshot.with_words(words, records)
+                self.deltas += 1
+                if self._pending is not None:
+                    self._pending.update(words)
+
+    def stats(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            'loaded': snapshot is not None,
+            'reloads': self.reloads,
+            'deltas': self.deltas,
+            'last_error': self.last_error,
+            **(snapshot.stats() if snapshot is not None else {}),
+        }
+
+
+class SnapshotReloader(threading.Thread):
+    """
+    Reloads the snapshot every `interval` seconds, or as soon as a reload is requested.
+    `poll` is called every `poll_interval` seconds in between, e.g. to request a reload when the dictionary revision
+    has moved, so the translation doesn't have to query it.
+    """
+
+    def __init__(
+            self,
+            holder: SnapshotHolder,
+            interval: Optional[float] = None,
+            poll: Optional[Callable[[], object]] = None,
+            poll_interval: Optional[float] = None
+    ):
+        super().__init__(name='dictionary-snapshot-reloader', daemon=True)
+        self.holder = holder
+        self.interval = interval
+        self.poll = poll
+        self.poll_interval = poll_interval if poll is not None else None
+        self._wake = threading.Event()
+
+    def request_reload(self):
+        self._wake.set()
+
+    def _timeout(self, last_reload: float) -> Optional[float]:
+        timeouts = [self.poll_interval]
+        if self.interval is not None:
+            timeouts.append(max(0.0, last_reload + self.interval - time.monotonic()))
+        timeouts = [timeout for timeout in timeouts if timeout is not None]
+        return min(timeouts) if len(timeouts) > 0 else None
+
+    def run(self):
+        last_reload = time.monotonic()
+        while True:
+            requested = self._wake.wait(self._timeout(last_reload))
+            if not requested and (self.interval is None or time.monotonic() - last_reload < self.interval):
+                if self.poll is not None:
+                    try:
+                        self.poll()
+                    except Exception:
+                        logging.exception('Failed to check the dictionary revision')
+                continue
+
+            self._wake.clear()
+            try:
+                self.holder.reload()
+                self.holder.last_error = None
+            except Exception as e:
+                logging.exception('Failed to reload the dictionary snapshot, the current snapshot is kept')
+                self.holder.last_error = repr(e)
+            last_reload = time.monotonic()
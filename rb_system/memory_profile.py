@@ -0,0 +1,135 @@
+from models.models import TextData
+from rb_system.nlp_tools import get_nlp, perform_nlp_process
+from rb_system.translation import rearrange_sentence, collect_dictionary_words, map_english_to_sign_gloss
+from rb_system.dictionary import prefetch_words
+from rb_system.warmup import wait_until_ready
+from typing import Callable, Dict, List, Tuple
+
+import os
+import threading
+import tracemalloc
+
+"""
+Memory profile of a translation: the stages of `translate_english_to_sign_gloss()` run one after the other
+with a `tracemalloc` snapshot around each of them, without the translation cache.
+For each stage, the report has the bytes that the stage has allocated and that are still alive after it
+(e.g. the compact tokens kept by `TextData.processed_data`, the ThSL phrases or the dictionary documents),
+the peak and the top allocation sites. tracemalloc slows the process down, profile a single translation only.
+The model is loaded and the process warmed up before tracing starts, so the loading isn't counted in the stages.
+"""
+
+STAGES = ('parse', 'rules', 'dictionary', 'map')
+
+_profile_lock = threading.Lock()
+# the allocations of tracemalloc itself and of the imports aren't the translation's
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def _package(filename: str) -> str:
+    """The top level package of a source file e.g. 'spacy', 'mongoengine' or 'rb_system'"""
+    parts = filename.replace('\\', '/').split('/')
+    for marker in ('site-packages', 'dist-packages'):
+        if marker in parts:
+            idx = parts.index(marker)
+            return parts[idx + 1].split('.')[0] if idx + 1 < len(parts) else marker
+    if len(parts) > 1:
+        return parts[-2]
+    return os.path.splitext(parts[-1])[0]
+
+
+def _stage_report(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, peak: int, top: int) -> dict:
+    diffs = after.filter_traces(_IGNORED).compare_to(before.filter_traces(_IGNORED), 'lineno')
+    by_package: Dict[str, int] = {}
+    for diff in diffs:
+        package = _package(diff.traceback[0].filename)
+        by_package[package] = by_package.get(package, 0) + diff.size_diff
+    return {
+        'retained_bytes': sum(diff.size_diff for diff in diffs),
+        'retained_blocks': sum(diff.count_diff for diff in diffs),
+        'peak_bytes': peak,
+        'by_package': dict(sorted(by_package.items(), key=lambda item: -item[1])),
+        'top_sites': [
+            {
+                'site': f'{diff.traceback[0].filename}:{diff.traceback[0].lineno}',
+                'size_bytes': diff.size_diff,
+                'blocks': diff.count_diff,
+            }
+            for diff in diffs[:top]
+        ],
+    }
+
+
+def profile_translation(text_data: TextData, top: int = 10) -> dict:
+    """
+    Translate the text, `thsl_translation` is set as by `translate_english_to_sign_gloss()`,
+    and return the memory report of each stage. The profiles run one at a time, the allocations of the other threads
+    during a profile are counted too. Waits for the warm-up of the process, see `rb_system.warmup`.
+    """
+    get_nlp()
+    wait_until_ready()
+    with _profile_lock:
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        try:
+            report: Dict[str, dict] = {}
+            # the objects of each stage are kept in `state` until the end, like in a real translation
+            state: Dict[str, object] = {}
+
+            def run_stage(name: str, stage: Callable[[], object]):
+                before = tracemalloc.take_snapshot()
+                start_size, _ = tracemalloc.get_traced_memory()
+                if hasattr(tracemalloc, 'reset_peak'):
+                    tracemalloc.reset_peak()
+                state[name] = stage()
+                _, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+                report[name] = _stage_report(before, after, max(0, peak - start_size), top)
+
+            text_data.processed_data = []
+            run_stage('parse', lambda: perform_nlp_process(text_data))
+            run_stage('rules', lambda: [
+                [rearrange_sentence(sentence) for sentence in paragraph] for paragraph in text_data.processed_data
+            ])
+            rearranged: List[List[list]] = state['rules']
+            run_stage('dictionary', lambda: prefetch_words(collect_dictionary_words(
+                thsl_words for paragraph in rearranged for thsl_words in paragraph
+            )))
+            run_stage('map', lambda: [
+                [map_english_to_sign_gloss(thsl_words, state['dictionary']) for thsl_words in paragraph]
+                for paragraph in rearranged
+            ])
+            text_data.thsl_translation = state['map']
+
+            current, peak = tracemalloc.get_traced_memory()
+            return {
+                'stages': report,
+                'traced_bytes': current,
+                'traced_peak_bytes': peak,
+            }
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+
+def format_report(report: dict) -> str:
+    """A plain text view of `profile_translation()`"""
+    lines: List[str] = []
+    for name in STAGES:
+        stage = report['stages'][name]
+        lines.append(f'[{name}] retained {_kib(stage["retained_bytes"])} KiB in {stage["retained_blocks"]} blocks, '
+                     f'peak {_kib(stage["peak_bytes"])} KiB')
+        packages: List[Tuple[str, int]] = list(stage['by_package'].items())[:5]
+        lines.append('    by package: ' + ', '.join(f'{package} {_kib(size)} KiB' for package, size in packages))
+        for site in stage['top_sites']:
+            lines.append(f'    {_kib(site["size_bytes"]):>10} KiB {site["blocks"]:>7} blocks  {site["site"]}')
+    return '\n'.join(lines)
+
+
+def _kib(size: int) -> str:
+    return f'{size / 1024:.1f}'
@@ -0,0 +1,102 @@
+from prometheus_client import CollectorRegistry, Counter, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+import os
+import time
+
+"""
+Prometheus metrics of the translation pipeline and its database commands (see `api/query_monitor.py`).
+Under gunicorn (see `gunicorn.conf.py`) every process writes its metrics to the files of `PROMETHEUS_MULTIPROC_DIR`,
+and `metrics_text()` adds up the files of all the processes, so any worker can answer the scrape.
+"""
+
+# the rules and the mapping take micro- to milliseconds, the parsing milliseconds to seconds
+_FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+_SLOW_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PARSE_SECONDS = Histogram(
+    'thsl_parse_seconds',
+    'Time to parse a paragraph with spaCy and split it into sentences, a batch is counted in its first paragraph',
+    buckets=_SLOW_BUCKETS
+)
+REARRANGE_SECONDS = Histogram(
+    'thsl_rearrange_seconds',
+    'Time to classify a sentence and rearrange it into ThSL order',
+    buckets=_FAST_BUCKETS
+)
+RULE_SECONDS = Histogram(
+    'thsl_rule_seconds',
+    'Time of the rule that rearranged a sentence, a relative clause also counts the rule of the clause',
+    ['rule'],
+    buckets=_FAST_BUCKETS
+)
+RULE_FAILURES = Counter(
+    'thsl_rule_failures_total',
+    'Sentences that a rule has failed to rearrange',
+    ['rule']
+)
+PREFETCH_SECONDS = Histogram(
+    'thsl_dictionary_prefetch_seconds',
+    'Time to load the dictionary words of a request',
+    buckets=_SLOW_BUCKETS
+)
+DICTIONARY_WORDS = Counter(
+    'thsl_dictionary_words_total',
+    'Dictionary words looked up by the requests',
+    ['result']
+)
+MAP_SECONDS = Histogram(
+    'thsl_map_seconds',
+    'Time to map the words of a rearranged sentence to sign glosses',
+    buckets=_FAST_BUCKETS
+)
+
+DB_COMMAND_SECONDS = Histogram(
+    'thsl_db_command_seconds',
+    'Time of the MongoDB commands',
+    ['command'],
+    buckets=_SLOW_BUCKETS
+)
+DB_REQUEST_QUERIES = Histogram(
+    'thsl_db_request_commands',
+    'MongoDB commands run by a request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+DB_REQUEST_SECONDS = Histogram(
+    'thsl_db_request_seconds',
+    'Total time of the MongoDB commands of a request',
+    ['endpoint'],
+    buckets=_SLOW_BUCKETS
+)
+
+
+def record_rule(rule: str, seconds: float, failed: bool):
+    RULE_SECONDS.labels(rule).observe(seconds)
+    if failed:
+        RULE_FAILURES.labels(rule).inc()
+
+
+@contextmanager
+def observe_rule(rule: str) -> Iterator[None]:
+    """Measure the rule that runs in the context, an exception counts as a failure of the rule"""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        record_rule(rule, time.perf_counter() - start, failed)
+
+
+def metrics_text() -> Tuple[bytes, str]:
+    """The metrics of all the processes in the Prometheus text format, and its content type"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,11 +1,19 @@
 from spacy import Language
 from spacy.tokens import Token, Doc, Span
 from models.models import TextData, TParagraph
-from typing import List, Tuple
+from typing import List, Tuple, Iterable, Iterator, Optional
 from rb_system.types import EntityLabel, POSLabel, DependencyLabel
+from rb_system.settings import settings
+from rb_system.parsing_pool import should_use_processes, parse_in_processes
+from rb_system.metrics import PARSE_SECONDS
+from rb_system.compact_tokens import CompactDoc
+from rb_system.parse_cache import parse_with_cache
+from functools import cached_property
 
 import spacy
 import logging
+import threading
+import time
 
 
 """
@@ -13,28 +21,368 @@ python -m doctest -v rb_system/nlp_tools.py
 token.tag_ --> ptb tag set, see: https://www.ling.upenn.edu/courses/Fall_2003/ling001/penn_treebank_pos.html
 token.pos_ --> Universal POS tags, see: https://universaldependencies.org/u/pos/
 """
-# TODO: consider using in-memory cache when matching doc with sign gloss
 
-nlp: Language = spacy.load('en_core_web_sm')
+_nlp: Optional[Language] = None
+_nlp_lock = threading.Lock()
+
+
+def get_nlp() -> Language:
+    """
+    Returns the spaCy model, it is loaded on the first call (see `settings.nlp_model`).
+    The components in `settings.nlp_exclude` aren't loaded at all.
+    """
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                start = time.perf_counter()
+                model = spacy.load(settings.nlp_model, exclude=settings.nlp_exclude)
+                logging.info(
+                    f'Loaded {settings.nlp_model} in {time.perf_counter() - start:.2f}s, '
+                    f'components: {model.pipe_names}'
+                )
+                _nlp = model
+    return _nlp
+
+
+def is_nlp_loaded() -> bool:
+    return _nlp is not None
+
+
+class _LazyLanguage:
+    """Loads the model on first use, for the code that uses `nlp` directly e.g. the doctests"""
+
+    def __call__(self, *args, **kwargs) -> Doc:
+        return get_nlp()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(get_nlp(), name)
+
+
+nlp: Language = _LazyLanguage()
+
+# (start, end) of the noun chunk in the doc that contains the token, see `annotate_noun_chunks()`
+Token.set_extension('noun_chunk', default=None, force=True)
+Doc.set_extension('noun_chunks_annotated', default=False, force=True)
+
+# labels as plain strings for comparing with the token attributes in `SentenceFeatures`
+_NSUBJ = DependencyLabel.NOMINAL_SUBJECT.value
+_ROOT = DependencyLabel.ROOT.value
+_DOBJ = DependencyLabel.DIRECT_OBJECT.value
+_DATIVE = DependencyLabel.DATIVE.value
+_ACOMP = DependencyLabel.ADJECTIVAL_COMPLEMENT.value
+_PREP = DependencyLabel.PREPOSITIONAL_MODIFIER.value
+_POBJ = DependencyLabel.OBJECT_OF_PREPOSITION.value
+_PREP_TAG = POSLabel.P_PERP_OR_SUB_CON.value
+_GERUND_TAG = POSLabel.P_VERB_PRESENT_PARTICIPLE.value
+_WH_DETERMINER_TAG = POSLabel.P_WH_DETERMINER.value
+_WH_QUESTION_TAGS = {POSLabel.P_WH_ADVERB.value, POSLabel.P_WH_PRONOUN.value}
+_WH_TAGS = {
+    POSLabel.P_WH_DETERMINER.value, POSLabel.P_WH_PRONOUN.value,
+    POSLabel.P_POSSESSIVE_WH_PRONOUN.value, POSLabel.P_WH_ADVERB.value
+}
+_VERB = POSLabel.U_VERB.value
+_AUX = POSLabel.U_AUXILIARY.value
+_CONJUNCTIONS = {POSLabel.U_COORDINATING_CONJUNCTION.value, POSLabel.U_SUBORDINATING_CONJUNCTION.value}
+_CARDINAL = EntityLabel.CARDINAL.value
+_TIME_ENTITIES = {EntityLabel.DATE.value, EntityLabel.TIME.value}
+_PRONOUN = POSLabel.U_PRONOUN.value
 
 
 # TODO: need to reconsider word segmentation (still have problem with words like 'next to', 'work from home'
 # https://spacy.io/usage/linguistic-features#retokenization
-def perform_nlp_process(text_data: TextData):
+def perform_nlp_process(
+        text_data: TextData,
+        batch_size: Optional[int] = None,
+        max_batch_chars: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None
+):
     """
     Perform necessary NLP such as part-of-speech tagging and dependency parsing.
+    All paragraphs are parsed together, see `parse_paragraphs()` for the batching options.
     """
+    text_data.processed_data.extend(
+        process_paragraphs(text_data.original, batch_size, max_batch_chars, max_batch_tokens)
+    )
+
+
+def process_paragraphs(
+        paragraphs: Iterable[str],
+        batch_size: Optional[int] = None,
+        max_batch_chars: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None
+) -> Iterator[TParagraph]:
+    """
+    Yield the processed sentences of each paragraph as soon as its batch is parsed,
+    see `parse_paragraphs()` for the batching options. The paragraphs in the parse cache aren't parsed again
+    (see `rb_system.parse_cache`).
+    The sentences are made of `CompactToken`, the doc of the paragraph isn't referenced after it is processed.
+    """
+    # the time until each paragraph is ready, without the time that the caller spends between the paragraphs
+    start = time.perf_counter()
     # Split paragraph into a list of sentences
-    for paragraph in text_data.original:
-        p_doc: Doc = nlp(paragraph)
-        sentences = list(p_doc.sents)
+    docs = parse_with_cache(
+        paragraphs,
+        get_nlp(),
+        lambda missing: parse_paragraphs(missing, batch_size, max_batch_chars, max_batch_tokens)
+    )
+    for p_doc in docs:
+        merge_entities(p_doc)
+        compact_doc = CompactDoc.from_doc(p_doc)
+        del p_doc
         processed_paragraph: TParagraph = []
-        for sentence in sentences:
+        for sentence in compact_doc.sents:
             sentence_token = remove_punctuations(sentence)
-            sentence_token = _merge_token_by_entity(sentence_token)
-            logging.debug(f'{sentence_token=}')
+            logging.debug('sentence_token=%s', sentence_token)
             processed_paragraph.append(sentence_token)
-        text_data.processed_data.append(processed_paragraph)
+        PARSE_SECONDS.observe(time.perf_counter() - start)
+        yield processed_paragraph
+        start = time.perf_counter()
+
+
+def parse_paragraphs(
+        paragraphs: Iterable[str],
+        batch_size: Optional[int] = None,
+        max_batch_chars: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+        use_processes: bool = True
+) -> Iterator[Doc]:
+    """
+    Parse the paragraphs with `nlp.pipe()` and yield their docs in the same order.
+    The arguments that are not given fall back to `rb_system.settings`.
+
+    :param batch_size: the maximum number of paragraphs per batch, 1 parses the paragraphs one by one
+    :param max_batch_chars: close a batch before its paragraphs exceed this number of characters
+    :param max_batch_tokens: close a batch before its paragraphs exceed this number of tokens
+    :param use_processes: parse a large list of paragraphs in the parsing processes, see `rb_system.parsing_pool`
+    """
+    if batch_size is None:
+        batch_size = settings.nlp_batch_size
+    if max_batch_chars is None:
+        max_batch_chars = settings.nlp_max_batch_chars
+    if max_batch_tokens is None:
+        max_batch_tokens = settings.nlp_max_batch_tokens
+
+    if use_processes and should_use_processes(paragraphs):
+        yield from parse_in_processes(paragraphs, get_nlp().vocab, batch_size, max_batch_chars, max_batch_tokens)
+        return
+
+    model = get_nlp()
+    if batch_size <= 1:
+        for paragraph in paragraphs:
+            yield model(paragraph)
+        return
+
+    if max_batch_chars is None and max_batch_tokens is None:
+        yield from model.pipe(paragraphs, batch_size=batch_size)
+        return
+
+    # the tokenized docs are needed to know the number of tokens before parsing
+    docs = (model.make_doc(paragraph) for paragraph in paragraphs)
+    for batch in _split_into_batches(docs, batch_size, max_batch_chars, max_batch_tokens):
+        yield from _pipe_tokenized_docs(batch)
+
+
+def _split_into_batches(
+        docs: Iterable[Doc],
+        batch_size: int,
+        max_chars: Optional[int],
+        max_tokens: Optional[int]
+) -> Iterator[List[Doc]]:
+    """
+    Group the docs into batches that respect all the given bounds.
+    A doc that exceeds a bound on its own is put in a batch of its own.
+    """
+    batch: List[Doc] = []
+    batch_chars = 0
+    batch_tokens = 0
+    for doc in docs:
+        exceeded = len(batch) >= batch_size
+        if max_chars is not None and batch_chars + len(doc.text) > max_chars:
+            exceeded = True
+        if max_tokens is not None and batch_tokens + len(doc) > max_tokens:
+            exceeded = True
+
+        if exceeded and len(batch) > 0:
+            yield batch
+            batch = []
+            batch_chars = 0
+            batch_tokens = 0
+
+        batch.append(doc)
+        batch_chars += len(doc.text)
+        batch_tokens += len(doc)
+
+    if len(batch) > 0:
+        yield batch
+
+
+def _pipe_tokenized_docs(docs: List[Doc]) -> Iterator[Doc]:
+    """
+    Run the pipeline components over the already tokenized docs as one batch,
+    the same way `nlp.pipe()` does after tokenization.
+    """
+    processed: Iterable[Doc] = docs
+    for _, component in get_nlp().pipeline:
+        if hasattr(component, 'pipe'):
+            processed = component.pipe(processed, batch_size=len(docs))
+        else:
+            processed = (component(doc) for doc in processed)
+    return iter(processed)
+
+
+class SentenceFeatures:
+    """
+    The features of a sentence that the sentence type predicates and the rules need,
+    collected in a single pass over the tokens. The features of the basic rules (`is_single_word`, ..., `is_stative`)
+    are plain attributes computed from this pass, so the dispatch reads its feature signature without further work.
+
+    :ivar subject: the (last) nominal subject
+    :ivar direct_objects: all direct objects
+    :ivar dative: the (last) dative, i.e. the indirect object
+    :ivar roots: all ROOT tokens with their indexes in the sentence
+    :ivar prep_phrases: the preposition phrases as in `retrieve_preposition_phrases()`
+    :ivar places: the preposition phrases of place as in `filter_preposition_of_place()`
+    :ivar gerunds: the present participles that are neither ROOT nor a direct object
+    :ivar verbs: the tokens that are tagged as VERB
+    :ivar auxiliaries: the tokens that are tagged as AUX
+    :ivar wh_words: the tokens that have a WH-tag (WDT, WP, WP$, WRB)
+    :ivar conjunctions: the coordinating and subordinating conjunctions
+    :ivar adjectival_complement: the (last) adjectival complement
+    :ivar quantity: the (last) cardinal number that isn't a subject, ROOT or an object
+    """
+
+    def __init__(self, sentence: List[Token]):
+        self.sentence = sentence
+        self.subject: Optional[Token] = None
+        self.direct_objects: List[Token] = []
+        self.dative: Optional[Token] = None
+        self.roots: List[Tuple[int, Token]] = []
+        self.prep_phrases: List[Tuple[Token, Token, int, int]] = []
+        self.places: List[Tuple[Token, Token, int, int]] = []
+        self.gerunds: List[Token] = []
+        self.verbs: List[Token] = []
+        self.auxiliaries: List[Token] = []
+        self.wh_words: List[Token] = []
+        self.conjunctions: List[Token] = []
+        self.adjectival_complement: Optional[Token] = None
+        self.quantity: Optional[Token] = None
+
+        current_prep = None
+        current_prep_idx = 0
+        for idx, token in enumerate(sentence):
+            dep = token.dep_
+            tag = token.tag_
+            pos = token.pos_
+
+            if dep == _NSUBJ:
+                self.subject = token
+            elif dep == _ROOT:
+                self.roots.append((idx, token))
+            elif dep == _DOBJ:
+                self.direct_objects.append(token)
+            elif dep == _DATIVE:
+                self.dative = token
+            elif token.ent_type_ == _CARDINAL:
+                self.quantity = token
+
+            if dep == _ACOMP:
+                self.adjectival_complement = token
+
+            # see `retrieve_preposition_phrases()`
+            if dep == _PREP or tag == _PREP_TAG:
+                current_prep = token
+                current_prep_idx = idx
+            elif dep == _POBJ:
+                prep_phrase = (current_prep, token, current_prep_idx, idx)
+                self.prep_phrases.append(prep_phrase)
+                # see `filter_preposition_of_place()`
+                if token.ent_type_ not in _TIME_ENTITIES and pos != _PRONOUN:
+                    self.places.append(prep_phrase)
+
+            if tag == _GERUND_TAG and dep != _ROOT and dep != _DOBJ:
+                self.gerunds.append(token)
+            if tag in _WH_TAGS:
+                self.wh_words.append(token)
+
+            if pos == _VERB:
+                self.verbs.append(token)
+            elif pos == _AUX:
+                self.auxiliaries.append(token)
+            elif pos in _CONJUNCTIONS:
+                self.conjunctions.append(token)
+
+        self.is_single_word: bool = is_single_word(sentence)
+        self.is_phrase: bool = self._is_phrase()
+        self.is_ditransitive: bool = self._is_ditransitive()
+        self.is_transitive: bool = self._is_transitive()
+        self.is_intransitive: bool = not self.is_single_word and not self.is_transitive and not self.is_ditransitive
+        self.is_locative: bool = not self.is_single_word and len(self.places) > 0
+        self.is_stative: bool = len(self.auxiliaries) > 0
+
+    @property
+    def root(self) -> Optional[Token]:
+        """The last ROOT token"""
+        return self.roots[-1][1] if len(self.roots) > 0 else None
+
+    @cached_property
+    def noun_phrases(self) -> List[Span]:
+        return retrieve_noun_phrases(self.sentence)
+
+    def _is_phrase(self) -> bool:
+        if self.is_single_word:
+            return False
+
+        has_verb = len(self.verbs) > 0 or len(self.auxiliaries) > 0
+        if self.subject is not None:
+            # if it has both S and V, it'll be considered as an intransitive sentence
+            # even though it isn't grammatically correct
+            return not has_verb
+        else:
+            return not (self.dative is not None and has_verb)
+
+    @property
+    def is_sentence(self) -> bool:
+        return not (self.is_single_word or self.is_phrase)
+
+    def _is_ditransitive(self) -> bool:
+        # My mother taught me how to cook. (still failed)
+        if len(self.sentence) < 3:
+            return False
+
+        for _, root in self.roots:
+            # John bought me a phone.
+            try:
+                next_token: Token = root.nbor()
+            except IndexError:
+                # no token after the ROOT token -> clearly no obj
+                return False
+            if next_token.dep_ == _DATIVE:
+                return True
+        has_direct_object = len(self.direct_objects) > 0
+        return has_direct_object and self.dative is not None or len(self.direct_objects) > 1
+
+    def _is_transitive(self) -> bool:
+        if self.is_single_word or self.is_ditransitive:
+            return False
+        if len(self.direct_objects) > 0:
+            return True
+        if len(self.gerunds) > 0:
+            # check if verb is followed by gerund
+            return any(a.dep_ == _ROOT for a in self.gerunds[-1].ancestors)
+        return False
+
+    @property
+    def is_wh_question(self) -> bool:
+        if not self.is_sentence:
+            return False
+        return self.sentence[0].tag_ in _WH_QUESTION_TAGS
+
+    @property
+    def is_complex(self) -> bool:
+        if len(self.conjunctions) > 0:
+            return True
+        return any(wh.tag_ == _WH_DETERMINER_TAG for wh in self.wh_words)
 
 
 def is_single_word(sentence: List[Token]) -> bool:
@@ -73,28 +421,7 @@ def is_phrase(sentence: List[Token]) -> bool:
     >>> is_phrase(nlp('a baby')[:])
     False
     """
-    if is_single_word(sentence):
-        return False
-
-    has_subj = False
-    has_verb = False
-    has_indirect_obj = False
-    for token in sentence:
-        token: Token
-        if token.pos_ == POSLabel.U_VERB.value or token.pos_ == POSLabel.U_AUXILIARY.value:
-            has_verb = True
-        if token.dep_ == DependencyLabel.NOMINAL_SUBJECT.value:
-            has_subj = True
-        elif token.dep_ == DependencyLabel.DATIVE.value:
-            has_indirect_obj = True
-
-    # print(has_subj, has_verb, has_indirect_obj)
-    if has_subj:
-        # if it has both S and V, it'll be considered as an intransitive sentence
-        # even though it isn't grammatically correct
-        return not has_verb
-    else:
-        return not (has_indirect_obj and has_verb)
+    return SentenceFeatures(sentence).is_phrase
 
 
 def _is_sentence(sentence: List[Token]) -> bool:
@@ -116,29 +443,7 @@ def is_transitive_sentence(sentence: List[Token]) -> bool:
     >>> is_transitive_sentence(nlp('He is sleeping.')[:])
     False
     """
-    if is_single_word(sentence):
-        return False
-    elif is_ditransitive_sentence(sentence):
-        return False
-
-    has_direct_object = False
-    gerund_ancestors: List[Token] = []
-    token: Token
-    for token in sentence:
-        if token.dep_ == DependencyLabel.DIRECT_OBJECT.value:
-            has_direct_object = True
-        elif (token.tag_ == POSLabel.P_VERB_PRESENT_PARTICIPLE.value) and (token.dep_ != DependencyLabel.ROOT.value):
-            gerund_ancestors = list(token.ancestors)
-
-    if has_direct_object:
-        return True
-    elif len(gerund_ancestors) > 0:
-        # check if verb is followed by gerund
-        a: Token
-        for a in gerund_ancestors:
-            if a.dep_ == DependencyLabel.ROOT.value:
-                return True
-    return False
+    return SentenceFeatures(sentence).is_transitive
 
 
 def is_ditransitive_sentence(sentence: List[Token]) -> bool:
@@ -156,31 +461,7 @@ def is_ditransitive_sentence(sentence: List[Token]) -> bool:
     >>> is_ditransitive_sentence(nlp('She eats')[:])
     False
     """
-    # My mother taught me how to cook. (still failed)
-    has_direct_object = False
-    has_dative = False
-    dobj_count = 0
-
-    if len(sentence) < 3:
-        return False
-
-    for token in sentence:
-        dep_relation = token.dep_
-        if dep_relation == DependencyLabel.ROOT.value:
-            # John bought me a phone.
-            try:
-                next_token: Token = token.nbor()
-            except IndexError:
-                # no token after the ROOT token -> clearly no obj
-                return False
-            if next_token.dep_ == DependencyLabel.DATIVE.value:
-                return True
-        elif dep_relation == DependencyLabel.DATIVE.value:
-            has_dative = True
-        elif dep_relation == DependencyLabel.DIRECT_OBJECT.value:
-            has_direct_object = True
-            dobj_count += 1
-    return has_direct_object and has_dative or dobj_count > 1
+    return SentenceFeatures(sentence).is_ditransitive
 
 
 def is_intransitive_sentence(sentence: List[Token]) -> bool:
@@ -197,9 +478,7 @@ def is_intransitive_sentence(sentence: List[Token]) -> bool:
     >>> is_intransitive_sentence(nlp('The chickens walk.')[:])
     True
     """
-    if is_single_word(sentence):
-        return False
-    return not is_transitive_sentence(sentence) and not is_ditransitive_sentence(sentence)
+    return SentenceFeatures(sentence).is_intransitive
 
 
 def is_locative_sentence(sentence: List[Token]):
@@ -225,55 +504,25 @@ def is_locative_sentence(sentence: List[Token]):
     >>> is_locative_sentence(nlp('She gave some chocolates to him.')[:])
     False
     """
-    if is_single_word(sentence):
-        return False
-
-    prep_phrases = retrieve_preposition_phrases(sentence)
-    prep_phrases_of_place = filter_preposition_of_place(prep_phrases)
-    # print("prep phrase: ", prep_phrases)
-    # print("prep of place", prep_phrases_of_place)
-    return len(prep_phrases_of_place) > 0
+    return SentenceFeatures(sentence).is_locative
 
 
 def is_wh_question(sentence: List[Token]) -> bool:
-    if not _is_sentence(sentence):
-        return False
+    return SentenceFeatures(sentence).is_wh_question
 
-    first_token = sentence[0]
-    if first_token.tag_ == POSLabel.P_WH_ADVERB.value:
-        return True
-    elif first_token.tag_ == POSLabel.P_WH_PRONOUN.value:
-        return True
 
-    return False
-
-
-def _has_stative_verb(sentence: List[Token]) -> bool:
+def is_stative_sentence(sentence: List[Token]) -> bool:
     """
     True if the sentence has v.to be e.g. The shirt is blue
     """
-    for token in sentence:
-        if token.pos_ == POSLabel.U_AUXILIARY.value:
-            return True
-    return False
-
-
-def is_stative_sentence(sentence: List[Token]) -> bool:
-    return _has_stative_verb(sentence)
+    return SentenceFeatures(sentence).is_stative
 
 
 def is_complex_sentence(sentence: List[Token]):
     """
     True of the sentence has conjunction e.g. and, that, because
     """
-    for token in sentence:
-        if token.tag_ == POSLabel.P_WH_DETERMINER.value:
-            return True
-        elif token.pos_ == POSLabel.U_COORDINATING_CONJUNCTION.value:
-            return True
-        elif token.pos_ == POSLabel.U_SUBORDINATING_CONJUNCTION.value:
-            return True
-    return False
+    return SentenceFeatures(sentence).is_complex
 
 
 def retrieve_preposition_phrases(sentence: List[Token]) -> List[Tuple[Token, Token, int, int]]:
@@ -302,18 +551,12 @@ def filter_preposition_of_place(prep_phrases: List[Tuple[Token, Token, int, int]
     if len(prep_phrases) < 1:
         return []
 
-    entity_types = [EntityLabel.DATE, EntityLabel.TIME]
     result_prep_phrases: List[Tuple[Token, Token, int, int]] = []
     for prep_p in prep_phrases:
-        try:
-            entity_label = EntityLabel(prep_p[1].ent_type_)
-            if entity_label in entity_types:
-                continue
-        except ValueError:
-            # continue      # detect only what Spacy model can
-            pass
-
-        if prep_p[1].pos_ == POSLabel.U_PRONOUN.value:
+        # detect only what Spacy model can
+        if prep_p[1].ent_type_ in _TIME_ENTITIES:
+            continue
+        if prep_p[1].pos_ == _PRONOUN:
             continue
         result_prep_phrases.append(prep_p)
 
@@ -356,28 +599,75 @@ def retrieve_entities(sentence: List[Token], entity_types: List[EntityLabel]) ->
     return entities
 
 
-def retrieve_noun_phrases(sentence: List[Token]) -> List[str]:
-    s_doc = nlp(" ".join([t.text for t in sentence]))
-    return [np for np in s_doc.noun_chunks]
+def annotate_noun_chunks(doc: Doc) -> Doc:
+    """
+    Store the noun chunk of each token (as `token._.noun_chunk`) so that the rules can read
+    the noun phrases of any part of the doc without parsing it again.
+    It must be called after the doc is retokenized.
+    """
+    for chunk in doc.noun_chunks:
+        for token in chunk:
+            token._.noun_chunk = (chunk.start, chunk.end)
+    doc._.noun_chunks_annotated = True
+    return doc
+
+
+def retrieve_noun_phrases(sentence: List[Token]) -> List[Span]:
+    """
+    Returns the noun phrases that the tokens of the given sentence belong to, in order.
+
+    >>> retrieve_noun_phrases(nlp('The young mouse eats a big apple.')[:])
+    [The young mouse, a big apple]
+    """
+    if len(sentence) == 0:
+        return []
+
+    doc: Doc = sentence[0].doc
+    if isinstance(doc, CompactDoc):
+        noun_chunk_of = doc.noun_chunk_of
+    else:
+        if not doc._.noun_chunks_annotated:
+            annotate_noun_chunks(doc)
+        noun_chunk_of = _noun_chunk_of
+
+    noun_phrases: List[Span] = []
+    last_chunk = None
+    for token in sentence:
+        chunk = noun_chunk_of(token)
+        if chunk is not None and chunk != last_chunk:
+            noun_phrases.append(doc[chunk[0]:chunk[1]])
+            last_chunk = chunk
+    return noun_phrases
+
+
+def _noun_chunk_of(token: Token) -> Optional[Tuple[int, int]]:
+    return token._.noun_chunk
+
 
+def is_token_in_span(token: Token, span: Span) -> bool:
+    """
+    True if the token is a part of the span, compared by the token index rather than the text
+    so that repeated words are told apart.
+    """
+    return token.doc is span.doc and span.start <= token.i < span.end
 
-def _merge_token_by_entity(sentence: List[Token]) -> List[Token]:
+
+def _find_entity_groups(sentence: List[Token]) -> List[List[int]]:
     """
+    Returns the groups of indexes (in the given sentence) of the consecutive tokens that have the same entity type.
+
     - I work at Kasetsart University and Apple Inc.
 
     I work at Kasetsart and Apple Inc.
     [(Kasetsart, 'ORG'), (and, 'ORG'), (Apple, 'ORG'), (Inc., 'ORG')]
-    [(3, 4, 4, 5, 5, 6)]
-
-    Entities
-    Kasetsart and Apple Inc. | ORG | 10 | 34
+    [[3, 4, 5, 6]]
     """
     entity_indexes = []
     entity_indexes_groups = []
     for i in range(len(sentence)):
         if i + 1 == len(sentence):
             if len(entity_indexes) > 1:
-                entity_indexes_groups.append(set(entity_indexes))
+                entity_indexes_groups.append(sorted(set(entity_indexes)))
             break
 
         token: Token = sentence[i]
@@ -389,28 +679,37 @@ def _merge_token_by_entity(sentence: List[Token]) -> List[Token]:
                 entity_indexes.append(i + 1)
         else:
             if len(entity_indexes) > 1:
-                entity_indexes_groups.append(set(entity_indexes))
+                entity_indexes_groups.append(sorted(set(entity_indexes)))
                 entity_indexes = []
 
-    # print(entities)
-    # print(entity_indexes_groups)
+    return entity_indexes_groups
 
-    sentence_doc = nlp(' '.join([token.text for token in sentence]))
 
-    # print("Before: ", [t.text for t in sentence_doc])
-    with sentence_doc.retokenize() as retokenizer:
-        for indexes in entity_indexes_groups:
-            start = min(indexes)
-            end = max(indexes) + 1
-            retokenizer.merge(
-                sentence_doc[start:end],
-                attrs={
-                    "LEMMA": " ".join([sentence[i].lemma_ for i in indexes]),
-                }
-            )
+def merge_entities(doc: Doc) -> Doc:
+    """
+    Merge the tokens of each entity into one token, in place, sentence by sentence.
+    The lemma of the merged token is the lemmas of its tokens joined by a space.
+
+    Punctuations are ignored when grouping the tokens, the same as `perform_nlp_process()` does.
+
+    Entities
+    Kasetsart and Apple Inc. | ORG | 10 | 34
+    """
+    merges: List[Tuple[Span, str]] = []
+    for sentence in doc.sents:
+        sentence_token = remove_punctuations(sentence)
+        for indexes in _find_entity_groups(sentence_token):
+            first, last = sentence_token[indexes[0]], sentence_token[indexes[-1]]
+            lemma = " ".join([sentence_token[i].lemma_ for i in indexes])
+            merges.append((doc[first.i:last.i + 1], lemma))
+
+    if len(merges) == 0:
+        return doc
 
-    new_sentence = [token for token in sentence_doc]
-    return new_sentence
+    with doc.retokenize() as retokenizer:
+        for span, lemma in merges:
+            retokenizer.merge(span, attrs={"LEMMA": lemma})
+    return doc
 
 
 def filter_relative_clause(sentence: List[Token]) -> Tuple[List[Token], int, int]:
@@ -502,7 +801,7 @@ if __name__ == '__main__':
         text = input('text (hit enter to quit): ')
         if text == '':
             break
-        doc: Doc = nlp(text)
+        doc: Doc = merge_entities(nlp(text))
         words = [token.lemma_ for token in doc]
 
         # Sentence detection
@@ -513,7 +812,7 @@ if __name__ == '__main__':
             print(f'\n{s}')
             print(f'| {"token.lemma_":^10} | {"token.pos_":^7} | {"token.tag_":^5} | {"token.dep_":^10} |')
             print('-------------------------------------------------------')
-            new_s = _merge_token_by_entity(s)
+            new_s = remove_punctuations(s)
             token: Token
             for token in new_s:
                 if not token.is_punct:
@@ -0,0 +1,195 @@
+from spacy import Language
+from spacy.tokens import Doc, DocBin
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+from rb_system.settings import settings
+
+import hashlib
+import logging
+import spacy
+import os
+import sqlite3
+import threading
+import time
+
+"""
+Cache of the parsed paragraphs on disk, so a text that is translated again (e.g. a lesson that is opened again)
+isn't parsed again, even after a restart or by another worker. The docs are stored as `DocBin` bytes in SQLite,
+keyed by the hash of the paragraph and the model version, the least recently used paragraphs are removed once
+the cache is larger than `settings.parse_cache_size` megabytes.
+The gunicorn workers share the same file: SQLite in WAL mode lets them read while one of them writes,
+and each process (and thread) opens its own connection. A failing cache is logged and treated as a miss.
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parses (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS parses_used ON parses (used);
+CREATE TABLE IF NOT EXISTS parses_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL);
+INSERT OR IGNORE INTO parses_size (id, total) VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS parses_inserted AFTER INSERT ON parses BEGIN
+    UPDATE parses_size SET total = total + NEW.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS parses_deleted AFTER DELETE ON parses BEGIN
+    UPDATE parses_size SET total = total - OLD.size WHERE id = 0;
+END;
+"""
+
+# the eviction keeps the most recent paragraphs up to this part of the maximum size, so it doesn't run on every store
+_EVICTION_TARGET = 0.9
+# the maximum number of parameters of a SQLite statement is 999 in the older versions
+_LOOKUP_CHUNK = 500
+
+
+def model_version(nlp: Language) -> str:
+    """The model, its components and the spaCy version, a different parser gives different docs"""
+    meta = nlp.meta
+    return f'{meta["lang"]}_{meta["name"]}-{meta["version"]}:{",".join(nlp.pipe_names)}:spacy-{spacy.__version__}'
+
+
+def paragraph_key(paragraph: str, version: str) -> str:
+    return hashlib.sha256(f'{version}\n{paragraph}'.encode('utf-8')).hexdigest()
+
+
+class ParseCache:
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """The connection of this thread, a connection isn't used after a fork"""
+        conn: Optional[sqlite3.Connection] = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def lookup(self, keys: Sequence[str]) -> Dict[str, bytes]:
+        """The `DocBin` bytes of the cached keys, the keys that aren't cached are left out"""
+        found: Dict[str, bytes] = {}
+        try:
+            conn = self._connect()
+            unique_keys = list(dict.fromkeys(keys))
+            for i in range(0, len(unique_keys), _LOOKUP_CHUNK):
+                chunk = unique_keys[i:i + _LOOKUP_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(f'SELECT key, data FROM parses WHERE key IN ({placeholders})', chunk)
+                found.update(rows)
+            if len(found) > 0:
+                found_keys = list(found)
+                for i in range(0, len(found_keys), _LOOKUP_CHUNK):
+                    chunk = found_keys[i:i + _LOOKUP_CHUNK]
+                    placeholders = ','.join('?' * len(chunk))
+                    conn.execute(f'UPDATE parses SET used = ? WHERE key IN ({placeholders})', [time.time(), *chunk])
+        except sqlite3.Error:
+            logging.exception(f'Failed to read the parse cache {self.path}')
+            found = {}
+
+        with self._lock:
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def store(self, key: str, doc: Doc):
+        data = DocBin(docs=[doc]).to_bytes()
+        try:
+            conn = self._connect()
+            conn.execute(
+                'INSERT INTO parses (key, data, size, used) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET used = excluded.used',
+                (key, data, len(data), time.time())
+            )
+            total, = conn.execute('SELECT total FROM parses_size WHERE id = 0').fetchone()
+            if total > self.max_bytes:
+                self._evict(conn)
+        except sqlite3.Error:
+            logging.exception(f'Failed to write the parse cache {self.path}')
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Remove the least recently used paragraphs, those that come after the target size in the recent order"""
+        conn.execute(
+            'DELETE FROM parses WHERE key IN ('
+            '   SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY used DESC, key) AS kept FROM parses)'
+            '   WHERE kept > ?'
+            ')',
+            (int(self.max_bytes * _EVICTION_TARGET),)
+        )
+
+    def stats(self) -> dict:
+        try:
+            conn = self._connect()
+            entries, = conn.execute('SELECT COUNT(*) FROM parses').fetchone()
+            size, = conn.execute('SELECT total FROM parses_size WHERE id = 0').fetchone()
+        except sqlite3.Error:
+            logging.exception(f'Failed to read the parse cache {self.path}')
+            entries, size = None, None
+        return {
+            'path': self.path,
+            'entries': entries,
+            'size_bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+_parse_cache: Optional[ParseCache] = None
+_parse_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> Optional[ParseCache]:
+    """The parse cache of `settings.parse_cache_path`, None if it is disabled"""
+    global _parse_cache
+    if settings.parse_cache_path is None or settings.parse_cache_size <= 0:
+        return None
+    with _parse_cache_lock:
+        if _parse_cache is None or _parse_cache.path != settings.parse_cache_path:
+            _parse_cache = ParseCache(settings.parse_cache_path, settings.parse_cache_size * 1024 * 1024)
+        return _parse_cache
+
+
+def parse_cache_stats() -> Optional[dict]:
+    cache = get_parse_cache()
+    return cache.stats() if cache is not None else None
+
+
+def parse_with_cache(
+        paragraphs: Iterable[str],
+        nlp: Language,
+        parse: Callable[[List[str]], Iterator[Doc]]
+) -> Iterator[Doc]:
+    """
+    Yield the doc of each paragraph in order, `parse` is called once with the paragraphs that aren't cached
+    and their docs are stored as soon as they are parsed, before the caller modifies them.
+    """
+    cache = get_parse_cache()
+    if cache is None:
+        yield from parse(paragraphs)
+        return
+
+    paragraphs = list(paragraphs)
+    version = model_version(nlp)
+    keys = [paragraph_key(paragraph, version) for paragraph in paragraphs]
+    cached = cache.lookup(keys)
+    parsed = parse([paragraph for paragraph, key in zip(paragraphs, keys) if key not in cached])
+    for key in keys:
+        if key in cached:
+            # a doc of its own for each occurrence, the caller retokenizes the docs in place
+            yield next(DocBin().from_bytes(cached[key]).get_docs(nlp.vocab))
+        else:
+            doc = next(parsed)
+            cache.store(key, doc)
+            yield doc
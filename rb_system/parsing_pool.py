@@ -0,0 +1,94 @@
+from concurrent.futures import ProcessPoolExecutor
+from spacy.tokens import Doc, DocBin
+from spacy.vocab import Vocab
+from typing import Iterator, List, Optional, Sequence
+from rb_system.settings import settings
+
+import atexit
+import logging
+import math
+import multiprocessing
+import threading
+
+"""
+Parse large requests in worker processes, so the parsing isn't limited to one core by the GIL.
+Each worker process loads the spaCy model once, parses a chunk of paragraphs and sends back the docs
+serialized as a `DocBin`, the rest of the processing (entity merging, rules, dictionary) stays in the caller.
+"""
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker(model: str, exclude: List[str]):
+    # load the model once per worker process, with the same options as the server process
+    from rb_system.nlp_tools import get_nlp
+    settings.nlp_model = model
+    settings.nlp_exclude = exclude
+    get_nlp()
+
+
+def _parse_chunk(
+        paragraphs: List[str],
+        batch_size: int,
+        max_batch_chars: Optional[int],
+        max_batch_tokens: Optional[int]
+) -> bytes:
+    from rb_system.nlp_tools import parse_paragraphs
+    docs = parse_paragraphs(paragraphs, batch_size, max_batch_chars, max_batch_tokens, use_processes=False)
+    return DocBin(docs=docs).to_bytes()
+
+
+def get_parsing_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, so the processes don't inherit the threads and the database connections of the server
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.nlp_processes,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(settings.nlp_model, settings.nlp_exclude)
+            )
+            atexit.register(shutdown_parsing_pool)
+        return _pool
+
+
+def shutdown_parsing_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def should_use_processes(paragraphs) -> bool:
+    """The processes are used for a list of at least `settings.nlp_process_threshold` paragraphs"""
+    return settings.nlp_processes > 1 and isinstance(paragraphs, Sequence) \
+        and len(paragraphs) >= settings.nlp_process_threshold
+
+
+def parse_in_processes(
+        paragraphs: Sequence[str],
+        vocab: Vocab,
+        batch_size: int,
+        max_batch_chars: Optional[int],
+        max_batch_tokens: Optional[int]
+) -> Iterator[Doc]:
+    """
+    Split the paragraphs into one chunk per process (at most `batch_size` paragraphs each),
+    and yield the parsed docs in the same order as the paragraphs.
+    """
+    chunk_size = max(1, min(batch_size, math.ceil(len(paragraphs) / settings.nlp_processes)))
+    chunks = [list(paragraphs[i:i + chunk_size]) for i in range(0, len(paragraphs), chunk_size)]
+    logging.info(f'Parsing {len(paragraphs)} paragraph(s) in {len(chunks)} chunk(s) with the parsing processes')
+
+    results = get_parsing_pool().map(
+        _parse_chunk,
+        chunks,
+        [batch_size] * len(chunks),
+        [max_batch_chars] * len(chunks),
+        [max_batch_tokens] * len(chunks)
+    )
+    for data in results:
+        yield from DocBin().from_bytes(data).get_docs(vocab)
@@ -0,0 +1,119 @@
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import itertools
+import threading
+import time
+
+"""
+Registry of the sentence rules with a table-driven dispatch.
+Each rule declares the values of the sentence features that it needs (e.g. `{'locative': True}`) and its order,
+the registry precomputes the rule of every combination of the feature values, so a sentence is dispatched
+with one lookup of its feature signature: adding a rule doesn't add a check when it uses the known features.
+"""
+
+Signature = Tuple[bool, ...]
+# rule name, time in seconds, whether the rule has raised an exception
+RuleObserver = Callable[[str, float, bool], None]
+
+NOT_SUPPORTED = 'not supported'
+
+
+class Rule:
+    __slots__ = ('name', 'func', 'when', 'order', 'count', 'failures', 'total_time')
+
+    def __init__(self, name: str, func: Callable, when: Dict[str, bool], order: int):
+        self.name = name
+        self.func = func
+        self.when = when
+        self.order = order
+        self.count = 0
+        self.failures = 0
+        self.total_time = 0.0
+
+    def matches(self, values: Dict[str, bool]) -> bool:
+        return all(values[feature] == expected for feature, expected in self.when.items())
+
+    def stats(self) -> dict:
+        return {
+            'rule': self.name,
+            'when': self.when,
+            'order': self.order,
+            'count': self.count,
+            'failures': self.failures,
+            'total_time': self.total_time,
+            'mean_time': self.total_time / self.count if self.count > 0 else None,
+        }
+
+
+class RuleRegistry:
+    """
+    :param features: the names of the features, the value of `name` is the attribute `is_<name>` of the features
+        object that is given to `dispatch()` (see `rb_system.nlp_tools.SentenceFeatures`)
+    :param observer: called after each rule, e.g. to record metrics
+    """
+
+    def __init__(self, features: Sequence[str], observer: Optional[RuleObserver] = None):
+        self.features = tuple(features)
+        self.observer = observer
+        self._signature_of = attrgetter(*[f'is_{feature}' for feature in self.features])
+        self._rules: List[Rule] = []
+        self._table: Dict[Signature, Optional[Rule]] = {}
+        self._not_supported = Rule(NOT_SUPPORTED, lambda sentence, features: [NOT_SUPPORTED], {}, -1)
+        self._lock = threading.Lock()
+
+    def register(self, name: str, when: Dict[str, bool], order: int) -> Callable[[Callable], Callable]:
+        """
+        Decorator of a rule `func(sentence, features)`, the rule of the lowest order among the rules whose
+        `when` matches the features of a sentence is applied to it.
+        """
+        unknown = set(when) - set(self.features)
+        assert len(unknown) == 0, f'[{name}] unknown feature(s) {unknown}, expected some of {self.features}'
+
+        def decorator(func: Callable) -> Callable:
+            self._rules.append(Rule(name, func, dict(when), order))
+            self._rules.sort(key=lambda rule: rule.order)
+            self._build_table()
+            return func
+        return decorator
+
+    def _build_table(self):
+        table: Dict[Signature, Optional[Rule]] = {}
+        for signature in itertools.product((False, True), repeat=len(self.features)):
+            values = dict(zip(self.features, signature))
+            table[signature] = next((rule for rule in self._rules if rule.matches(values)), None)
+        self._table = table
+
+    def signature(self, features: Any) -> Signature:
+        values = self._signature_of(features)
+        # attrgetter of a single attribute doesn't return a tuple
+        return tuple(values) if len(self.features) > 1 else (values,)
+
+    def dispatch(self, features: Any) -> Rule:
+        """The rule of the features, or the 'not supported' rule"""
+        rule = self._table[self.signature(features)]
+        return rule if rule is not None else self._not_supported
+
+    def apply(self, sentence: Any, features: Any) -> Tuple[str, Any]:
+        """Apply the rule of the sentence, returns the name of the rule and its result"""
+        rule = self.dispatch(features)
+        start = time.perf_counter()
+        failed = False
+        try:
+            return rule.name, rule.func(sentence, features)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                rule.count += 1
+                rule.total_time += elapsed
+                rule.failures += failed
+            if self.observer is not None:
+                self.observer(rule.name, elapsed, failed)
+
+    def stats(self) -> List[dict]:
+        """The invocation counts and times of the rules of this process, in their order"""
+        with self._lock:
+            return [rule.stats() for rule in [*self._rules, self._not_supported]]
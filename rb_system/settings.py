@@ -0,0 +1,70 @@
+from typing import List, Optional
+
+"""
+Tunable settings of the rule-based system.
+The values below are the defaults, the API overrides them from the app config (see `api/config.py`).
+"""
+
+
+class Settings:
+
+    def __init__(self):
+        # the app is loaded in the gunicorn master and shared by the forked workers (see `gunicorn.conf.py`)
+        self.preload_app: bool = False
+
+        # the spaCy model (see `rb_system.nlp_tools.get_nlp()`), the rules don't use the excluded components
+        self.nlp_model: str = 'en_core_web_sm'
+        self.nlp_exclude: List[str] = ['senter']
+        # run `rb_system.warmup.warm_up()` when the API starts
+        self.nlp_warmup: bool = True
+
+        # parsing (see `rb_system.nlp_tools.parse_paragraphs()`)
+        self.nlp_batch_size: int = 64
+        self.nlp_max_batch_chars: Optional[int] = None
+        self.nlp_max_batch_tokens: Optional[int] = None
+        # the number of parsing processes for large requests, 0 or 1 parses in the server process only
+        self.nlp_processes: int = 0
+        # the minimum number of paragraphs parsed by the processes
+        self.nlp_process_threshold: int = 32
+        # smaller batches give the streamed translations their first result sooner
+        self.nlp_stream_batch_size: int = 8
+
+        # dictionary lookups (see `rb_system.dictionary`)
+        self.dictionary_cache_size: int = 4096
+        self.dictionary_cache_ttl: Optional[float] = 300
+        # seconds a read of the dictionary revision is reused, 0 reads it for every translation.
+        # Above 0, the other workers may serve stale glosses for as long after a dictionary write.
+        # The snapshot reloader checks the revision as often (at most once a second)
+        self.dictionary_revision_ttl: Optional[float] = 0
+
+        # translated sentences (see `rb_system.translation_cache`)
+        self.translation_cache_size: int = 10000
+
+        # parsed paragraphs cached on disk (see `rb_system.parse_cache`), the API puts the file in its instance folder
+        self.parse_cache_path: Optional[str] = None
+        # the maximum size of the parse cache in megabytes, 0 disables it
+        self.parse_cache_size: int = 256
+
+        # translation jobs (see `api.jobs`), the lease and the retention are in seconds
+        self.translation_job_workers: int = 1
+        self.translation_job_lease: float = 300
+        self.translation_job_retention: float = 7 * 24 * 60 * 60
+
+        # dictionary imports (see `api.services.bulk_upsert_words()`)
+        self.dictionary_bulk_chunk_size: int = 1000
+
+        # in-memory dictionary snapshot (see `rb_system.dictionary_snapshot`)
+        self.dictionary_snapshot: bool = False
+        self.dictionary_snapshot_interval: Optional[float] = 600
+
+        # a request that runs more database commands is logged with its commands (see `api.query_monitor`)
+        self.db_query_budget: Optional[int] = 20
+
+        # allow `?profile=memory` on the translation requests (see `rb_system.memory_profile`), it slows them down
+        self.memory_profiling: bool = False
+
+        # the number of the last translation decisions kept by each worker, 0 disables tracing (see `rb_system.trace`)
+        self.trace_size: int = 0
+
+
+settings = Settings()
@@ -0,0 +1,84 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Iterator, List, Optional
+from rb_system.settings import settings
+
+import threading
+import time
+
+"""
+Trace of the translation decisions: the rule that rearranged each sentence, the candidate glosses of the words
+and their context match scores. The events are kept in a ring buffer of the last `settings.trace_size` events
+(see `GET /api/trans/trace`). When the size is 0, tracing is disabled and costs a settings lookup per call,
+the callers check `is_tracing()` before they build the fields of an event.
+"""
+
+_sentence: ContextVar[Optional[str]] = ContextVar('trace_sentence', default=None)
+
+
+class TraceBuffer:
+
+    def __init__(self, maxlen: int):
+        self._events: Deque[dict] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.maxlen = maxlen
+
+    def append(self, event: dict):
+        with self._lock:
+            self._events.append(event)
+
+    def events(self, limit: Optional[int] = None) -> List[dict]:
+        """The last `limit` events, the oldest first"""
+        with self._lock:
+            events = list(self._events)
+        return events if limit is None else events[-limit:]
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+
+_buffer: Optional[TraceBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def is_tracing() -> bool:
+    return settings.trace_size > 0
+
+
+def get_trace_buffer() -> TraceBuffer:
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None or _buffer.maxlen != settings.trace_size:
+            _buffer = TraceBuffer(max(settings.trace_size, 1))
+        return _buffer
+
+
+def trace(event: str, **fields: Any):
+    """Record an event with the sentence that is being translated, the fields must be plain values"""
+    if not is_tracing():
+        return
+    get_trace_buffer().append({'time': time.time(), 'sentence': _sentence.get(), 'event': event, **fields})
+
+
+@contextmanager
+def trace_sentence(sentence: str) -> Iterator[None]:
+    """
+    The events in the context belong to the sentence, the text of the sentence before it is rearranged
+    (see `rb_system.translation.sentence_texts()`), so the rule and the mapping events have the same key.
+    """
+    if not is_tracing():
+        yield
+        return
+    token = _sentence.set(sentence)
+    try:
+        yield
+    finally:
+        _sentence.reset(token)
+
+
+def trace_events(limit: Optional[int] = None) -> List[dict]:
+    if _buffer is None:
+        return []
+    return _buffer.events(limit)
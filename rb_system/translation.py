@@ -1,10 +1,16 @@
 from rb_system.basic_sentence_rules import *
 from rb_system.nlp_tools import *
+from rb_system.dictionary import lookup_word, prefetch_words, select_glosses, dictionary_version, WordMap
+from rb_system.translation_cache import get_translation_cache, normalize_text, split_cached_paragraphs
 from models.models import *
-from typing import List, Optional, Union, Tuple
-from utils.iterator import powerset
+from typing import List, Optional, Union, Tuple, Set, Iterable, Iterator, Dict, Hashable
+from rb_system.context_matching import RelatedContexts
+from rb_system.settings import settings
+from rb_system.metrics import REARRANGE_SECONDS, MAP_SECONDS, observe_rule
+from rb_system.trace import is_tracing, trace, trace_sentence
 
 import logging
+import time
 
 """
 The translation functions that work on a sentence level only
@@ -12,40 +18,221 @@ The translation functions that work on a sentence level only
 
 
 def translate_english_to_sign_gloss(text_data: TextData) -> List[List[List[str]]]:
-    perform_nlp_process(text_data)
-    results = []
-    for idx, paragraph in enumerate(text_data.processed_data):
-        logging.info(f'Translating paragraph {idx + 1}...')
-        thsl_sentences = []
-        for sentence in paragraph:
-            sentence = apply_rules(sentence)
-            thsl_sentences.append(sentence)
-        results.append(thsl_sentences)
+    """
+    Translate all the paragraphs of the text, the dictionary words are prefetched at once.
+    The sentences in the translation cache aren't translated again and the paragraphs whose sentences are all cached
+    aren't parsed, their `processed_data` is empty.
+    """
+    version = dictionary_version()
+    results, missing = split_cached_paragraphs(text_data.original, version)
+    text_data.processed_data = [[] for _ in text_data.original]
+    # the sentence texts of each paragraph, taken before the rules modify the sentences
+    paragraph_sentences: Dict[int, List[str]] = {}
+
+    # (paragraph index, sentence index, rearranged sentence) of the sentences that aren't cached
+    rearranged_sentences: List[Tuple[int, int, List[Union[str, ThSLPhrase]]]] = []
+    for idx, paragraph in zip(missing, process_paragraphs([text_data.original[i] for i in missing])):
+        logging.debug('Translating paragraph %d...', idx + 1)
+        text_data.processed_data[idx] = paragraph
+        paragraph_sentences[idx] = sentence_texts(paragraph)
+        results[idx] = lookup_cached_sentences(paragraph_sentences[idx], version)
+        for sentence_idx, sentence in enumerate(paragraph):
+            if results[idx][sentence_idx] is None:
+                with trace_sentence(paragraph_sentences[idx][sentence_idx]):
+                    rearranged_sentences.append((idx, sentence_idx, rearrange_sentence(sentence)))
+
+    # load every word that the sentences need from the dictionary at once
+    word_map = prefetch_words(collect_dictionary_words(thsl_words for _, _, thsl_words in rearranged_sentences))
+    for idx, sentence_idx, thsl_words in rearranged_sentences:
+        with trace_sentence(paragraph_sentences[idx][sentence_idx]):
+            results[idx][sentence_idx] = map_english_to_sign_gloss(thsl_words, word_map)
+
+    for idx in missing:
+        store_translated_paragraph(text_data.original[idx], paragraph_sentences[idx], results[idx], version)
 
     text_data.thsl_translation = results
-    logging.info(f'Finished translating {len(text_data.processed_data)} paragraph(s)')
+    logging.info('Finished translating %d paragraph(s), %d not cached', len(text_data.original), len(missing))
     return results
 
 
-def apply_rules(sentence: TSentence) -> List[str]:
-    """Return a list of ThSL glosses"""
-    # handle complex sentence here
-    if is_complex_sentence(sentence):
-        relative_clause_data = filter_relative_clause(sentence)
-        if len(relative_clause_data[0]) > 0:
-            thsl_words = apply_rule_to_sentence_with_relative_clause(sentence, relative_clause_data)
-        else:
-            logging.info(f'Not supported complex sentence: {sentence}')
-            thsl_words = rearrange_basic_sentence(sentence)
-    elif is_wh_question(sentence):
-        thsl_words = apply_rule_to_wh_question(sentence)
-    else:
-        thsl_words = rearrange_basic_sentence(sentence)
+def translate_documents(documents: List[TextData]) -> List[Optional[List[List[List[str]]]]]:
+    """
+    Translate many documents together, `thsl_translation` of each document is set.
+    The identical paragraphs are parsed once, the identical sentences are translated once
+    and the dictionary words of all the documents are prefetched at once.
+    A document that contains a sentence that can't be translated has None as its result.
+    """
+    version = dictionary_version()
+    # paragraph text -> index of the unique paragraph
+    paragraph_ids: Dict[str, int] = {}
+    for document in documents:
+        for paragraph in document.original:
+            paragraph_ids.setdefault(paragraph, len(paragraph_ids))
+    unique_paragraphs = list(paragraph_ids)
+    cached_paragraphs, missing = split_cached_paragraphs(unique_paragraphs, version)
+
+    # the sign glosses of each sentence of the unique paragraphs, None until the sentence is translated
+    paragraph_glosses: List[Optional[List[Optional[List[str]]]]] = cached_paragraphs
+    # the sentence texts of each paragraph that is parsed, taken before the rules modify the sentences
+    paragraph_sentences: Dict[int, List[str]] = {}
+    # normalized sentence text -> its text, its rearranged words and where the sentence appears
+    sentences: Dict[str, Tuple[str, Optional[List[Union[str, ThSLPhrase]]], List[Tuple[int, int]]]] = {}
+    for idx, paragraph in zip(missing, process_paragraphs([unique_paragraphs[i] for i in missing])):
+        paragraph_sentences[idx] = sentence_texts(paragraph)
+        paragraph_glosses[idx] = lookup_cached_sentences(paragraph_sentences[idx], version)
+        for sentence_idx, sentence in enumerate(paragraph):
+            if paragraph_glosses[idx][sentence_idx] is not None:
+                continue
+            text = paragraph_sentences[idx][sentence_idx]
+            key = normalize_text(text)
+            if key not in sentences:
+                with trace_sentence(text):
+                    sentences[key] = (text, _try_to_translate(rearrange_sentence, sentence), [])
+            sentences[key][2].append((idx, sentence_idx))
+
+    word_map = prefetch_words(collect_dictionary_words(
+        thsl_words for _, thsl_words, _ in sentences.values() if thsl_words is not None
+    ))
+    for text, thsl_words, positions in sentences.values():
+        glosses = None
+        if thsl_words is not None:
+            with trace_sentence(text):
+                glosses = _try_to_translate(map_english_to_sign_gloss, thsl_words, word_map)
+        for idx, sentence_idx in positions:
+            paragraph_glosses[idx][sentence_idx] = glosses
+
+    for idx, sentence_keys in paragraph_sentences.items():
+        if all(glosses is not None for glosses in paragraph_glosses[idx]):
+            store_translated_paragraph(unique_paragraphs[idx], sentence_keys, paragraph_glosses[idx], version)
+    logging.info(
+        'Translated %d document(s), %d unique paragraph(s) of which %d not cached, and %d unique sentence(s)',
+        len(documents), len(unique_paragraphs), len(missing), len(sentences)
+    )
+
+    results = []
+    for document in documents:
+        glosses = [paragraph_glosses[paragraph_ids[paragraph]] for paragraph in document.original]
+        if any(g is None for paragraph in glosses for g in paragraph):
+            results.append(None)
+            continue
+        # the sentences are shared by the documents, copy them so they can be modified separately
+        document.thsl_translation = [[list(g) for g in paragraph] for paragraph in glosses]
+        results.append(document.thsl_translation)
+    return results
+
+
+def _try_to_translate(translate, words, *args):
+    try:
+        return translate(words, *args)
+    except Exception:
+        logging.exception('Failed to translate the sentence: %s', words)
+        return None
 
-    sign_glosses = map_english_to_sign_gloss(thsl_words)
+
+def translate_paragraphs(paragraphs: List[str], batch_size: Optional[int] = None) -> Iterator[List[List[str]]]:
+    """
+    Yield the sign glosses of each paragraph as soon as it is translated,
+    the docs of a paragraph are released once its result is consumed.
+
+    :param batch_size: the number of paragraphs parsed together, default to `settings.nlp_stream_batch_size`
+    """
+    if batch_size is None:
+        batch_size = settings.nlp_stream_batch_size
+    version = dictionary_version()
+    cached_paragraphs, missing = split_cached_paragraphs(paragraphs, version)
+    processed_paragraphs = process_paragraphs((paragraphs[i] for i in missing), batch_size)
+    for idx, cached_glosses in enumerate(cached_paragraphs):
+        if cached_glosses is not None:
+            yield cached_glosses
+            continue
+
+        logging.debug('Translating paragraph %d...', idx + 1)
+        paragraph = next(processed_paragraphs)
+        sentences = sentence_texts(paragraph)
+        results = lookup_cached_sentences(sentences, version)
+        rearranged_sentences: Dict[int, List[Union[str, ThSLPhrase]]] = {}
+        for sentence_idx, sentence in enumerate(paragraph):
+            if results[sentence_idx] is None:
+                with trace_sentence(sentences[sentence_idx]):
+                    rearranged_sentences[sentence_idx] = rearrange_sentence(sentence)
+        word_map = prefetch_words(collect_dictionary_words(rearranged_sentences.values()))
+        for sentence_idx, thsl_words in rearranged_sentences.items():
+            with trace_sentence(sentences[sentence_idx]):
+                results[sentence_idx] = map_english_to_sign_gloss(thsl_words, word_map)
+        store_translated_paragraph(paragraphs[idx], sentences, results, version)
+        yield results
+
+
+def sentence_text(sentence: TSentence) -> str:
+    """The original text of the processed sentence, including the punctuations that have been removed"""
+    if len(sentence) == 0:
+        return ''
+    return sentence[0].sent.text
+
+
+def sentence_texts(paragraph: TParagraph) -> List[str]:
+    """
+    The texts of the sentences of the processed paragraph, which key the translation cache.
+    They must be taken before the rules run, some rules remove tokens from the sentence.
+    """
+    return [sentence_text(sentence) for sentence in paragraph]
+
+
+def lookup_cached_sentences(sentences: List[str], version: Hashable) -> List[Optional[List[str]]]:
+    """The cached sign glosses of each sentence text, None if the sentence isn't cached"""
+    cache = get_translation_cache()
+    return [cache.lookup_sentence(sentence, version) for sentence in sentences]
+
+
+def store_translated_paragraph(text: str, sentences: List[str], glosses: List[List[str]], version: Hashable):
+    cache = get_translation_cache()
+    for sentence, sentence_glosses in zip(sentences, glosses):
+        cache.store_sentence(sentence, version, sentence_glosses)
+    cache.store_paragraph(text, sentences)
+
+
+def apply_rules(sentence: TSentence, word_map: Optional[WordMap] = None) -> List[str]:
+    """Return a list of ThSL glosses, the translation cache is used if the sentence has been translated"""
+    cache = get_translation_cache()
+    version = dictionary_version()
+    text = sentence_text(sentence)
+    sign_glosses = cache.lookup_sentence(text, version)
+    if sign_glosses is None:
+        with trace_sentence(text):
+            thsl_words = rearrange_sentence(sentence)
+            sign_glosses = map_english_to_sign_gloss(thsl_words, word_map)
+        cache.store_sentence(text, version, sign_glosses)
     return sign_glosses
 
 
+def rearrange_sentence(sentence: TSentence) -> List[Union[str, ThSLPhrase]]:
+    """
+    Rearrange the sentence into ThSL order, the words aren't mapped to sign glosses yet.
+    The caller sets the sentence of the trace events, see `trace_sentence()`.
+    """
+    with REARRANGE_SECONDS.time():
+        features = SentenceFeatures(sentence)
+        # handle complex sentence here
+        if features.is_complex:
+            relative_clause_data = filter_relative_clause(sentence)
+            if len(relative_clause_data[0]) > 0:
+                with observe_rule('relative clause'):
+                    thsl_words = apply_rule_to_sentence_with_relative_clause(sentence, relative_clause_data)
+                if is_tracing():
+                    trace('rule', rule='relative clause', words=[repr(word) for word in thsl_words])
+            else:
+                logging.info('Not supported complex sentence: %s', sentence)
+                thsl_words = rearrange_basic_sentence(sentence, features)
+        elif features.is_wh_question:
+            with observe_rule('wh-question'):
+                thsl_words = apply_rule_to_wh_question(sentence)
+            if is_tracing():
+                trace('rule', rule='wh-question', words=[repr(word) for word in thsl_words])
+        else:
+            thsl_words = rearrange_basic_sentence(sentence, features)
+    return thsl_words
+
+
 def apply_rule_to_sentence_with_relative_clause(sentence: List[Token], relcl_data: Tuple[List[Token], int, int]) -> List[Union[str, ThSLPhrase]]:
     # translate relative clause
     relcl, relcl_start_idx, relcl_end_idx = relcl_data
@@ -81,71 +268,89 @@ def apply_rule_to_sentence_with_relative_clause(sentence: List[Token], relcl_dat
 
 
 def apply_rule_to_wh_question(sentence: List[Token]) -> List[Union[str, ThSLPhrase]]:
-    wh: Token = sentence.pop(0)
-    sentence.pop(0)     # pop v.to do or v.to be
-    thsl_root_sentence = rearrange_basic_sentence(sentence)
+    # the words after the wh-word and the v.to do or v.to be, the given sentence isn't modified
+    wh: Token = sentence[0]
+    thsl_root_sentence = rearrange_basic_sentence(sentence[2:])
     thsl_sentence = thsl_root_sentence + [wh.lemma_]
     return thsl_sentence
 
 
-def rearrange_basic_sentence(sentence: List[Token]) -> List[Union[str, ThSLPhrase]]:
-    if is_single_word(sentence):
-        result = br0_single_word(sentence)
-        rule_name = '[br0 w]'
-    elif is_phrase(sentence):
-        result = br0_phrase(sentence)
-        rule_name = '[br0 p]'
-    elif is_locative_sentence(sentence):
-        result = br4_locative_sentence(sentence)
-        rule_name = '[br4]'
-    elif is_stative_sentence(sentence):
-        result = br13_stative_sentence(sentence)
-        rule_name = '[br13]'
-    elif is_transitive_sentence(sentence):
-        result = br1_transitive_sentence(sentence)
-        rule_name = '[br1]'
-    elif is_intransitive_sentence(sentence):
-        result = br2_intransitive_sentence(sentence)
-        rule_name = '[br2]'
-    elif is_ditransitive_sentence(sentence):
-        result = br3_ditransitive_sentence(sentence)
-        rule_name = '[br3]'
-    else:
-        result = ['not supported']
-        rule_name = '[not supported]'
+def rearrange_basic_sentence(sentence: List[Token], features: Optional[SentenceFeatures] = None) -> List[Union[str, ThSLPhrase]]:
+    """
+    :param features: the features of the given sentence if they are already extracted
+    """
+    if features is None:
+        features = SentenceFeatures(sentence)
 
-    logging.debug(f'{rule_name} {result=}')
+    rule_name, result = basic_rules.apply(sentence, features)
+    if is_tracing():
+        trace('rule', rule=rule_name, words=[repr(word) for word in result])
     return result
 
 
-def map_english_to_sign_gloss(words: List[Union[str, ThSLPhrase]]) -> List[str]:
+def collect_dictionary_words(sentences: Iterable[List[Union[str, ThSLPhrase]]]) -> Set[str]:
+    """
+    Returns all the English words that `map_english_to_sign_gloss()` looks up for the given rearranged sentences.
+    """
+    words: Set[str] = set()
+    for sentence in sentences:
+        for word in sentence:
+            if isinstance(word, ThSLClassifier):
+                words.add(word.root_word.lemma_)
+            elif isinstance(word, ThSLPrepositionPhrase):
+                words.add(word.preposition.lemma_)
+                words.add(word.preposition_subj_cl.root_word.lemma_)
+                words.add(word.preposition_obj_cl.root_word.lemma_)
+            elif isinstance(word, ThSLVerbPhrase):
+                words.add(word.verb.lemma_)
+                for ctx_val in word.contexts.values():
+                    if not isinstance(ctx_val, str):
+                        words.add(ctx_val.lemma_)
+            elif isinstance(word, ThSLNounPhrase):
+                words.add(word.noun.lemma_)
+                words.update(adj.lemma_ for adj in word.adj_list)
+            else:
+                words.add(word)
+    return words
+
+
+def map_english_to_sign_gloss(words: List[Union[str, ThSLPhrase]], word_map: Optional[WordMap] = None) -> List[str]:
     """
     Convert a list of english words to a list of sign glosses.
     Map english words to the ThSL database.
+
+    :param word_map: the dictionary words loaded by `prefetch_words()`
     """
-    logging.info(f'Starting mapping: {words}')
+    thsl_glosses = _map_words(words, word_map)
+    logging.debug('Mapped %s to %s', words, thsl_glosses)
+    return thsl_glosses
+
+
+def _map_words(words: List[Union[str, ThSLPhrase]], word_map: Optional[WordMap]) -> List[str]:
+    start = time.perf_counter()
     thsl_glosses: List[str] = []
     for word in words:
         if isinstance(word, ThSLClassifier):
-            gloss = retrieve_thsl_classifier_gloss(word)
+            gloss = retrieve_thsl_classifier_gloss(word, word_map)
             if not gloss:
                 thsl_glosses.append(f"No gloss of '{word.root_word.lemma_}' is found in the dictionary")
             else:
                 thsl_glosses.append(gloss.gloss)
         elif isinstance(word, ThSLPrepositionPhrase):
-            gloss = retrieve_sign_gloss_for_prep_with_context(word)
+            gloss = retrieve_sign_gloss_for_prep_with_context(word, word_map)
             thsl_glosses.append(gloss)
         elif isinstance(word, ThSLVerbPhrase):
-            gloss = retrieve_sign_gloss_for_verb_with_context(word)
+            gloss = retrieve_sign_gloss_for_verb_with_context(word, word_map)
             thsl_glosses.append(gloss)
         elif isinstance(word, ThSLNounPhrase):
-            glosses = retrieve_sign_gloss_for_noun_phrase(word)
+            glosses = retrieve_sign_gloss_for_noun_phrase(word, word_map)
             thsl_glosses = thsl_glosses + glosses
         else:
-            gloss = retrieve_sign_gloss_for_noun(word)
+            gloss = retrieve_sign_gloss_for_noun(word, word_map)
             thsl_glosses.append(gloss)
-    logging.info(f'Finished mapping: {words}')
-    logging.debug(f'[result] {thsl_glosses=}')
+    MAP_SECONDS.observe(time.perf_counter() - start)
+    if is_tracing():
+        trace('map', glosses=list(thsl_glosses))
     return thsl_glosses
 
 
@@ -153,21 +358,17 @@ def _get_glosses_from_words(words: List[Eng2Sign]) -> List[str]:
     glosses = []
     for word in words:
         gloss: SignGloss
-        for gloss in word.sign_glosses:
-            if gloss.lang == 'en':
-                logging.info(f'Found word {word.english} in the dictionary')
-                glosses.append(gloss.gloss)
+        for gloss in select_glosses(word, lang='en'):
+            logging.debug('Found word %s in the dictionary', word.english)
+            glosses.append(gloss.gloss)
     return glosses
 
 
-def _retrieve_word(word: str) -> Optional[Eng2Sign]:
-    results = Eng2Sign.objects(english=word)
-    if len(results) == 0:
-        logging.info(f"Word '{word}' is not found in the dictionary")
-        return None
-
-    logging.info(f"Found {len(results)} results that matches '{word}'")
-    return results[0]
+def _retrieve_word(word: str, word_map: Optional[WordMap] = None) -> Optional[Eng2Sign]:
+    result = lookup_word(word, word_map)
+    if result is None:
+        logging.debug("Word '%s' is not found in the dictionary", word)
+    return result
 
 
 def _retrieve_word_from_context(word: str, related_word: str) -> Optional[Eng2Sign]:
@@ -175,41 +376,27 @@ def _retrieve_word_from_context(word: str, related_word: str) -> Optional[Eng2Si
     related_words = Eng2Sign.objects(english=related_word)
 
     if len(candidate_words) == 0:
-        logging.info(f"Word '{word}' is not found in the dictionary")
+        logging.debug("Word '%s' is not found in the dictionary", word)
         return
 
     for rw in related_words:
         rw: Eng2Sign
         for candidate in candidate_words:
             candidate: Eng2Sign
-            print("candidate context: ", candidate.contexts)
+            logging.debug('candidate context: %s', candidate.contexts)
             for context in rw.contexts:
                 if context in candidate.contexts:
                     return candidate
     return
 
 
-def _get_context_combinations(contexts) -> List[set]:
-    contexts_set = set(contexts)
-    combinations = [set(combination) for combination in list(powerset(contexts_set, no_empty=True))]
-    return combinations
-
-
-def _count_possible_matches(target_word: Eng2Sign, related_ctx_combinations: List[set]) -> List[Tuple[SignGloss, int]]:
+def _count_possible_matches(target_word: Eng2Sign, related_contexts: RelatedContexts) -> List[Tuple[SignGloss, int]]:
     possible_matches: List[Tuple[SignGloss, int]] = []
     gloss: SignGloss
     for gloss in target_word.sign_glosses:
-        gloss_ctx_combinations = [set(combination) for combination in list(powerset(gloss.contexts, no_empty=True))]
-        # print(f"gloss '{gloss.gloss}' com --> ", gloss_ctx_combinations)
-
-        match_count = 0
-        # try matching related_context with gloss_ctx_combinations as much as possible
-        for g_ctx in gloss_ctx_combinations:
-            if g_ctx in related_ctx_combinations:
-                match_count += 1
+        # the number of the combinations of the gloss' contexts that match the related contexts
+        match_count = related_contexts.count_matches(gloss.contexts)
         possible_matches.append((gloss, match_count))
-
-    logging.debug(f'{possible_matches=}')
     return possible_matches
 
 
@@ -223,14 +410,12 @@ def _filter_highest_matched_results(possible_matches: List[Tuple[SignGloss, int]
                 results = [match]
             elif match[1] == max_match_count:
                 results.append(match)
-    logging.debug(f'highest match {[r[0].gloss for r in results]}')
     return results
 
 
-def retrieve_sign_gloss_for_noun(word) -> str:
-    result = _retrieve_word(word)
+def retrieve_sign_gloss_for_noun(word, word_map: Optional[WordMap] = None) -> str:
+    result = _retrieve_word(word, word_map)
     if not result:
-        logging.info(f"Word '{word}' is not found in the dictionary")
         return f"word '{word}' is not found in the dictionary"
 
     unwanted_pos = ["verb", "classifier", "preposition"]
@@ -238,30 +423,27 @@ def retrieve_sign_gloss_for_noun(word) -> str:
         if gloss.pos in unwanted_pos:
             continue
         elif gloss.lang == "en":
-            logging.info(f"Found gloss for a word '{result.english}' in the dictionary")
             return gloss.gloss
-    logging.info(f"No gloss of '{word}' is found in the dictionary")
+    logging.debug("No gloss of '%s' is found in the dictionary", word)
     return f"no gloss of '{word}' is found in the dictionary"
 
 
-def retrieve_sign_gloss_for_noun_phrase(noun_phrase: ThSLNounPhrase) -> List[str]:
+def retrieve_sign_gloss_for_noun_phrase(noun_phrase: ThSLNounPhrase, word_map: Optional[WordMap] = None) -> List[str]:
     """
     a young mouse
     a young and beautiful girl
     """
     noun = noun_phrase.noun
-    candidate_words = Eng2Sign.objects(english=noun.lemma_)
-    assert len(candidate_words) <= 1, f'[n_with_ctx] duplicated `english` key: {noun.lemma_}'
+    noun_word = lookup_word(noun.lemma_, word_map)
 
-    if len(candidate_words) == 0:
-        message = f"Noun '{noun.lemma_}' is not found in the dictionary"
-        logging.info(message)
-        return [message]
+    if noun_word is None:
+        logging.debug("Noun '%s' is not found in the dictionary", noun.lemma_)
+        return [f"Noun '{noun.lemma_}' is not found in the dictionary"]
 
     result: List[SignGloss] = []
 
     # select sign gloss that has the matched POS
-    noun_glosses = candidate_words[0].sign_glosses
+    noun_glosses = noun_word.sign_glosses
     for ng in noun_glosses:
         ng: SignGloss
         if ng.lang != 'en':
@@ -277,22 +459,19 @@ def retrieve_sign_gloss_for_noun_phrase(noun_phrase: ThSLNounPhrase) -> List[str
     noun_adj_lst = noun_phrase.adj_list
     unmatched_adj = []
     for adj in noun_adj_lst:
-        adj_words = Eng2Sign.objects(english=adj.lemma_)
-        assert len(adj_words) <= 1, f'[n_with_ctx] duplicated `english` key: {adj.lemma_}'
-        if len(adj_words) == 0:
+        adj_word = lookup_word(adj.lemma_, word_map)
+        if adj_word is None:
             unmatched_adj.append(adj)
             continue
-        for adj_g in adj_words[0].sign_glosses:
-            adj_g: SignGloss
-            if adj_g.pos == 'adjective' and adj_g.lang == 'en':
-                result.append(adj_g)
-                break
+        adj_glosses = select_glosses(adj_word, lang='en', pos='adjective')
+        if len(adj_glosses) > 0:
+            result.append(adj_glosses[0])
 
     result_glosses = [g.gloss for g in result]
     return result_glosses + [f'not found {u.lemma_}' for u in unmatched_adj]
 
 
-def retrieve_sign_gloss_for_verb_with_context(verb_phrase: ThSLVerbPhrase) -> str:
+def retrieve_sign_gloss_for_verb_with_context(verb_phrase: ThSLVerbPhrase, word_map: Optional[WordMap] = None) -> str:
     """
     he-walk -> person-walk
 
@@ -300,16 +479,13 @@ def retrieve_sign_gloss_for_verb_with_context(verb_phrase: ThSLVerbPhrase) -> st
     """
     # assume that `english` key is unique
     verb = verb_phrase.verb
-    candidate_words = Eng2Sign.objects(english=verb.lemma_)
-    assert len(candidate_words) <= 1, f'[v_with_ctx] duplicated `english` key: {verb.lemma_}'
+    verb_word = lookup_word(verb.lemma_, word_map)
 
-    if len(candidate_words) == 0:
-        message = f"Verb '{verb.lemma_}' is not found in the dictionary"
-        logging.info(message)
-        return message
+    if verb_word is None:
+        logging.debug("Verb '%s' is not found in the dictionary", verb.lemma_)
+        return f"Verb '{verb.lemma_}' is not found in the dictionary"
 
     verb_contexts = verb_phrase.contexts
-    # print("attr --> ", verb_contexts)
     additional_ctx: List[set] = []
 
     unwanted_pos = ['verb', 'classifier', 'preposition']
@@ -325,7 +501,7 @@ def retrieve_sign_gloss_for_verb_with_context(verb_phrase: ThSLVerbPhrase) -> st
             elif ctx_key == 'direct_obj' or ctx_key == 'indirect_obj':
                 additional_ctx.append({'multiple objects'})
 
-        result_ctx = _retrieve_word(ctx_val.lemma_)
+        result_ctx = _retrieve_word(ctx_val.lemma_, word_map)
         if result_ctx is None:
             continue
 
@@ -344,30 +520,32 @@ def retrieve_sign_gloss_for_verb_with_context(verb_phrase: ThSLVerbPhrase) -> st
     # if no context -> use default (highest priority)
     if len(context_glosses) == 0:
         gloss: SignGloss
-        for gloss in candidate_words[0].sign_glosses:
+        for gloss in verb_word.sign_glosses:
             try:
                 if gloss.priority >= 1 and gloss.lang == 'en':
+                    _trace_choice('verb', verb.lemma_, gloss.gloss, reason='no context, priority')
                     return gloss.gloss
             # no priority field -> return whatever
             except TypeError:
                 if gloss.lang == 'en':
+                    _trace_choice('verb', verb.lemma_, gloss.gloss, reason='no context, no priority')
                     return gloss.gloss
 
     # append all gloss' ctx of all words related to verb (sub, iobj, dobj, etc.)
-    ctx_combinations: List[set] = []
+    related_contexts = RelatedContexts()
     for word_idx, ctx_gloss in context_glosses:
         ctx_gloss: SignGloss
         all_contexts = ctx_gloss.contexts + related_words[word_idx].contexts
-        combinations = _get_context_combinations(all_contexts)
-        ctx_combinations = ctx_combinations + combinations
+        related_contexts.add_all_subsets(all_contexts)
 
     # concat with additional contexts
-    ctx_combinations = ctx_combinations + additional_ctx
-    logging.debug(f'{ctx_combinations=}')
+    for ctx in additional_ctx:
+        related_contexts.add_exact(ctx)
+    logging.debug('related_contexts=%s', related_contexts)
 
-    possible_matches = _count_possible_matches(candidate_words[0], ctx_combinations)
+    possible_matches = _count_possible_matches(verb_word, related_contexts)
     assert len(possible_matches) > 0, \
-        f'[v_with_ctx] no possible match, please check whether {candidate_words} has glosses or not'
+        f'[v_with_ctx] no possible match, please check whether {verb_word.english} has glosses or not'
 
     # get the results that have the highest matched context
     results = _filter_highest_matched_results(possible_matches)
@@ -382,42 +560,50 @@ def retrieve_sign_gloss_for_verb_with_context(verb_phrase: ThSLVerbPhrase) -> st
             if not result.priority:
                 continue
             elif result.priority > max_priority:
-                print(result.gloss, result.priority)
                 max_priority = result.priority
                 final_result = result
         if final_result is None:
-            logging.info(f'[v_with_ctx] No final result for {results}, choose the first result')
+            logging.info('[v_with_ctx] No final result for %s, choose the first result', results)
             final_result = results[0][0]
     else:
         final_result = results[0][0]
 
     assert final_result is not None, f'[v_with_ctx] unexpectedly no final result for {results}'
+    if is_tracing():
+        trace(
+            'verb',
+            word=verb.lemma_,
+            chosen=final_result.gloss,
+            candidates=[(gloss.gloss, match_count, gloss.priority) for gloss, match_count in possible_matches],
+            extra_contexts=[sorted(ctx) for ctx in additional_ctx]
+        )
     return final_result.gloss
 
 
-def retrieve_thsl_classifier_gloss(classifier: ThSLClassifier) -> Optional[SignGloss]:
-    print("search for CL:", classifier.root_word.lemma_)
-    search_results = Eng2Sign.objects(english=classifier.root_word.lemma_)
-    if len(search_results) == 0:
-        logging.info(f"No gloss of '{classifier.root_word.lemma_}' is found in the dictionary")
-        return None
+def _trace_choice(event: str, word: str, chosen: Optional[str], **fields):
+    if is_tracing():
+        trace(event, word=word, chosen=chosen, **fields)
 
-    assert len(search_results) > 0, f'[r_cl] no `english` key that matches for {classifier.root_word}'
 
-    word: Eng2Sign = search_results[0]
-    root_gloss: Optional[SignGloss] = None
-    gloss: SignGloss
-    for gloss in word.sign_glosses:
-        if gloss.pos == "classifier":
-            return gloss
-        elif gloss.pos == "noun":
-            root_gloss = gloss
+def retrieve_thsl_classifier_gloss(classifier: ThSLClassifier, word_map: Optional[WordMap] = None) -> Optional[SignGloss]:
+    word: Optional[Eng2Sign] = lookup_word(classifier.root_word.lemma_, word_map)
+    if word is None:
+        _trace_choice('classifier', classifier.root_word.lemma_, None, reason='not in the dictionary')
+        return None
+
+    classifier_glosses = select_glosses(word, pos='classifier')
+    if len(classifier_glosses) > 0:
+        _trace_choice('classifier', classifier.root_word.lemma_, classifier_glosses[0].gloss)
+        return classifier_glosses[0]
 
     # if no CL in the database, return its root word
-    return root_gloss
+    noun_glosses = select_glosses(word, pos='noun')
+    result = noun_glosses[-1] if len(noun_glosses) > 0 else None
+    _trace_choice('classifier', classifier.root_word.lemma_, result.gloss if result else None, reason='no classifier')
+    return result
 
 
-def retrieve_sign_gloss_for_prep_with_context(prep_phrase: ThSLPrepositionPhrase) -> str:
+def retrieve_sign_gloss_for_prep_with_context(prep_phrase: ThSLPrepositionPhrase, word_map: Optional[WordMap] = None) -> str:
     """
     'subjCL-on-locCL'
     {
@@ -461,35 +647,28 @@ def retrieve_sign_gloss_for_prep_with_context(prep_phrase: ThSLPrepositionPhrase
         ],
     }
     """
-    prep_subj = retrieve_thsl_classifier_gloss(prep_phrase.preposition_subj_cl)
-    prep_obj = retrieve_thsl_classifier_gloss(prep_phrase.preposition_obj_cl)
+    prep_subj = retrieve_thsl_classifier_gloss(prep_phrase.preposition_subj_cl, word_map)
+    prep_obj = retrieve_thsl_classifier_gloss(prep_phrase.preposition_obj_cl, word_map)
 
-    search_results = Eng2Sign.objects(english=prep_phrase.preposition.lemma_)
-    if len(search_results) == 0:
-        logging.info(f"No gloss of '{prep_phrase.preposition.lemma_}' is found in the dictionary")
+    prep: Optional[Eng2Sign] = lookup_word(prep_phrase.preposition.lemma_, word_map)
+    if prep is None:
+        logging.debug("No gloss of '%s' is found in the dictionary", prep_phrase.preposition.lemma_)
         return f"no gloss of '{prep_phrase.preposition.lemma_}' is found in the dictionary"
 
     # context must exist
     if not prep_subj or not prep_obj:
-        logging.info(f"No gloss of '{prep_phrase}' is found in the dictionary")
+        logging.debug("No gloss of '%r' is found in the dictionary", prep_phrase)
         return f"no gloss of '{prep_phrase}' is found in the dictionary"
 
-    prep: Eng2Sign = search_results[0]
-    prep_subj_ctx_com = _get_context_combinations(prep_subj.contexts)
-    prep_obj_ctx_com = _get_context_combinations(prep_obj.contexts)
-    logging.debug(f'{prep_subj_ctx_com=}')
-    logging.debug(f'{prep_obj_ctx_com=}')
+    prep_subj_ctx = RelatedContexts().add_all_subsets(prep_subj.contexts)
+    prep_obj_ctx = RelatedContexts().add_all_subsets(prep_obj.contexts)
 
-    possible_matches_subj = _count_possible_matches(prep, prep_subj_ctx_com)
-    possible_matches_obj = _count_possible_matches(prep, prep_obj_ctx_com)
-    logging.debug(f'{possible_matches_subj=}')
-    logging.debug(f'{possible_matches_obj=}')
+    possible_matches_subj = _count_possible_matches(prep, prep_subj_ctx)
+    possible_matches_obj = _count_possible_matches(prep, prep_obj_ctx)
 
     # then find gloss that matches both subj's and obj's contexts
     highest_matched_subj = _filter_highest_matched_results(possible_matches_subj)
     highest_matched_obj = _filter_highest_matched_results(possible_matches_obj)
-    logging.debug(f'{highest_matched_subj=}')
-    logging.debug(f'{highest_matched_obj=}')
 
     # assume that highest matched of subj and obj always overlaps each other
     final_result: Optional[SignGloss] = None
@@ -497,4 +676,12 @@ def retrieve_sign_gloss_for_prep_with_context(prep_phrase: ThSLPrepositionPhrase
         if h_match in highest_matched_obj:
             final_result = h_match[0]
 
+    if is_tracing():
+        trace(
+            'preposition',
+            word=prep_phrase.preposition.lemma_,
+            chosen=final_result.gloss if final_result is not None else None,
+            subject_candidates=[(gloss.gloss, match_count) for gloss, match_count in possible_matches_subj],
+            object_candidates=[(gloss.gloss, match_count) for gloss, match_count in possible_matches_obj]
+        )
     return final_result.gloss
@@ -0,0 +1,93 @@
+from typing import Hashable, List, Optional, Sequence, Tuple
+from rb_system.settings import settings
+from utils.cache import LRUCache
+
+import re
+
+"""
+Cache of the translated sentences, keyed by the normalized sentence text and the dictionary version
+(see `rb_system.dictionary.dictionary_version()`), so a modified dictionary never serves the old glosses.
+The sentences of a paragraph are remembered too, a paragraph whose sentences are all cached isn't parsed again.
+"""
+
+_WHITESPACES = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """Collapse the whitespaces, the case and the punctuations are kept because they change the parsing"""
+    return _WHITESPACES.sub(' ', text).strip()
+
+
+class TranslationCache:
+
+    def __init__(self, maxsize: int):
+        # (sentence, dictionary version) -> sign glosses of the sentence
+        self.sentences = LRUCache(maxsize)
+        # paragraph -> its sentences
+        self.paragraphs = LRUCache(maxsize)
+
+    def lookup_sentence(self, sentence: str, version: Hashable) -> Optional[List[str]]:
+        found, glosses = self.sentences.lookup((normalize_text(sentence), version))
+        return list(glosses) if found else None
+
+    def store_sentence(self, sentence: str, version: Hashable, glosses: Sequence[str]):
+        key = normalize_text(sentence)
+        # an empty text would be shared by all the sentences whose text is lost
+        if key == '':
+            return
+        self.sentences.set((key, version), tuple(glosses))
+
+    def lookup_paragraph(self, paragraph: str, version: Hashable) -> Optional[List[List[str]]]:
+        """Returns the sign glosses of every sentence of the paragraph, None if any of them isn't cached"""
+        found, sentences = self.paragraphs.lookup(normalize_text(paragraph))
+        if not found:
+            return None
+        results = []
+        for sentence in sentences:
+            glosses = self.lookup_sentence(sentence, version)
+            if glosses is None:
+                return None
+            results.append(glosses)
+        return results
+
+    def store_paragraph(self, paragraph: str, sentences: Sequence[str]):
+        if any(normalize_text(sentence) == '' for sentence in sentences):
+            return
+        self.paragraphs.set(normalize_text(paragraph), tuple(sentences))
+
+    def clear(self):
+        self.sentences.clear()
+        self.paragraphs.clear()
+
+    def stats(self) -> dict:
+        return {
+            'sentences': self.sentences.stats(),
+            'paragraphs': self.paragraphs.stats(),
+        }
+
+
+_translation_cache: Optional[TranslationCache] = None
+
+
+def get_translation_cache() -> TranslationCache:
+    global _translation_cache
+    if _translation_cache is None:
+        _translation_cache = TranslationCache(settings.translation_cache_size)
+    return _translation_cache
+
+
+def translation_cache_stats() -> dict:
+    return get_translation_cache().stats()
+
+
+def split_cached_paragraphs(
+        paragraphs: Sequence[str],
+        version: Hashable
+) -> Tuple[List[Optional[List[List[str]]]], List[int]]:
+    """
+    Returns the cached sign glosses of each paragraph (None if it isn't cached)
+    and the indexes of the paragraphs that must be translated.
+    """
+    cache = get_translation_cache()
+    results = [cache.lookup_paragraph(paragraph, version) for paragraph in paragraphs]
+    return results, [idx for idx, result in enumerate(results) if result is None]
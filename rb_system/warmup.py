@@ -0,0 +1,97 @@
+from mongoengine.connection import get_db
+from models.models import TextData
+from rb_system.nlp_tools import get_nlp
+from rb_system.translation import translate_documents
+from typing import List, Optional
+
+import logging
+import threading
+import time
+
+"""
+Warm up a server process before it receives any traffic: load the spaCy model, connect to the database
+and translate a small corpus that goes through every rule, so the first request doesn't pay for the lazy loading.
+"""
+
+# at least one sentence for each rule and sentence type of `rb_system.translation.rearrange_sentence()`
+WARMUP_CORPUS: List[str] = [
+    'Hello.',
+    'once upon a time',
+    'She eats an apple.',
+    'My mother gives him 4 apples.',
+    'The chickens walk.',
+    'He works at Kasetsart University.',
+    'The shirt is blue.',
+    'The young mouse eats a big apple.',
+    'The apple is on the table.',
+    'She buys 3 apples on Monday.',
+    'I like drawing.',
+    'Where do you live?',
+    'Who eats the apple?',
+    'The cat that attacks us is scary.',
+]
+
+_ready = threading.Event()
+_status = {
+    'warmup_time': None,
+    'attempts': 0,
+    'last_error': None,
+}
+
+
+def warm_up(corpus: Optional[List[str]] = None):
+    """Load the model, check the database connection and translate the corpus, then mark this process ready"""
+    if corpus is None:
+        corpus = WARMUP_CORPUS
+    start = time.perf_counter()
+    get_nlp()
+    get_db().command('ping')
+    # one document per paragraph, a sentence that can't be translated only fails its own document
+    results = translate_documents([TextData([paragraph]) for paragraph in corpus])
+    failed = sum(result is None for result in results)
+    if failed > 0:
+        logging.warning(f'{failed} paragraph(s) of the warm-up corpus can not be translated')
+
+    _status['warmup_time'] = time.perf_counter() - start
+    _ready.set()
+    logging.info(f"Warmed up in {_status['warmup_time']:.2f}s")
+
+
+def start_warm_up(retry_interval: float = 5) -> threading.Thread:
+    """Warm up in a background thread, retrying until it succeeds e.g. when the database isn't reachable yet"""
+
+    def run():
+        while not _ready.is_set():
+            _status['attempts'] += 1
+            try:
+                warm_up()
+                _status['last_error'] = None
+            except Exception as e:
+                logging.exception(f'Failed to warm up, retrying in {retry_interval}s')
+                _status['last_error'] = repr(e)
+                time.sleep(retry_interval)
+
+    thread = threading.Thread(target=run, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def mark_ready():
+    """Skip the warm-up, the process is ready right away"""
+    _ready.set()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def wait_until_ready(timeout: Optional[float] = None) -> bool:
+    """Wait for the warm-up of this process, returns False if it isn't ready after `timeout` seconds"""
+    return _ready.wait(timeout)
+
+
+def warmup_status() -> dict:
+    return {
+        'ready': is_ready(),
+        **_status,
+    }
@@ -0,0 +1,66 @@
+import unittest
+
+from benchmarks.baseline import compare_with_baseline, latency_summary, percentile
+
+
+def _result(translations: dict, total_ms: float, sentences_per_second: float) -> dict:
+    return {
+        'sentences_per_second': sentences_per_second,
+        'stages': {'total': {'p50': total_ms, 'p90': total_ms, 'p99': total_ms, 'mean': total_ms}},
+        'translations': translations,
+    }
+
+
+class TestPercentile(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 90), 90)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3.0], 99), 3.0)
+
+    def test_summary(self):
+        summary = latency_summary([4.0, 1.0, 2.0, 3.0])
+        self.assertEqual(summary['p50'], 2.0)
+        self.assertEqual(summary['p99'], 4.0)
+        self.assertEqual(summary['mean'], 2.5)
+
+
+class TestCompareWithBaseline(unittest.TestCase):
+
+    def setUp(self):
+        self.baseline = _result({'The chickens walk.': [['CHICKEN', 'bird-WALK']]}, 10.0, 100.0)
+
+    def test_within_tolerance(self):
+        result = _result({'The chickens walk.': [['CHICKEN', 'bird-WALK']]}, 11.5, 85.0)
+        self.assertEqual(compare_with_baseline(result, self.baseline, tolerance=0.2), [])
+
+    def test_slower_than_tolerance(self):
+        result = _result({'The chickens walk.': [['CHICKEN', 'bird-WALK']]}, 12.5, 70.0)
+        regressions = compare_with_baseline(result, self.baseline, tolerance=0.2)
+        # p50 and p90 of the total latency and the throughput
+        self.assertEqual(len(regressions), 3)
+
+    def test_changed_translation(self):
+        result = _result({'The chickens walk.': [['CHICKEN', 'person-WALK']]}, 10.0, 100.0)
+        regressions = compare_with_baseline(result, self.baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('The chickens walk.', regressions[0])
+
+    def test_translations_only(self):
+        baseline = {'translations': self.baseline['translations']}
+        result = _result({'The chickens walk.': [['CHICKEN', 'bird-WALK']]}, 100.0, 1.0)
+        self.assertEqual(compare_with_baseline(result, baseline, tolerance=0.2), [])
+        result = _result({'The chickens walk.': [['CHICKEN', 'person-WALK']]}, 10.0, 100.0)
+        self.assertEqual(len(compare_with_baseline(result, baseline, tolerance=0.2)), 1)
+
+    def test_fast_stages_are_not_compared(self):
+        self.baseline['stages']['prefetch'] = {'p50': 0.01, 'p90': 0.02, 'p99': 0.02, 'mean': 0.01}
+        result = _result({'The chickens walk.': [['CHICKEN', 'bird-WALK']]}, 10.0, 100.0)
+        result['stages']['prefetch'] = {'p50': 0.05, 'p90': 0.08, 'p99': 0.09, 'mean': 0.05}
+        self.assertEqual(compare_with_baseline(result, self.baseline, tolerance=0.2), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import pickle
+import unittest
+
+import spacy
+from spacy.tokens import Doc
+from rb_system.compact_tokens import CompactDoc
+
+
+def _doc() -> Doc:
+    return Doc(
+        spacy.blank('en').vocab,
+        words=['The', 'young', 'mouse', 'eats', 'an', 'apple', '.', 'It', 'sleeps', '.'],
+        spaces=[True, True, True, True, True, False, True, True, False, False],
+        lemmas=['the', 'young', 'mouse', 'eat', 'an', 'apple', '.', 'it', 'sleep', '.'],
+        pos=['DET', 'ADJ', 'NOUN', 'VERB', 'DET', 'NOUN', 'PUNCT', 'PRON', 'VERB', 'PUNCT'],
+        tags=['DT', 'JJ', 'NN', 'VBZ', 'DT', 'NN', '.', 'PRP', 'VBZ', '.'],
+        deps=['det', 'amod', 'nsubj', 'ROOT', 'det', 'dobj', 'punct', 'nsubj', 'ROOT', 'punct'],
+        heads=[2, 2, 3, 3, 5, 3, 3, 8, 8, 8],
+    )
+
+
+class TestCompactDoc(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = CompactDoc.from_doc(_doc())
+
+    def test_token_fields(self):
+        mouse = self.doc[2]
+        self.assertEqual((mouse.text, mouse.lemma_, mouse.pos_, mouse.tag_, mouse.dep_), ('mouse', 'mouse', 'NOUN', 'NN', 'nsubj'))
+        self.assertEqual(mouse.head.text, 'eats')
+        self.assertEqual([token.text for token in self.doc[0].ancestors], ['mouse', 'eats'])
+        self.assertTrue(self.doc[6].is_punct)
+
+    def test_nbor(self):
+        self.assertIs(self.doc[3].nbor(-1), self.doc[2])
+        self.assertIs(self.doc[6].nbor(), self.doc[7])
+        with self.assertRaises(IndexError):
+            self.doc[9].nbor()
+
+    def test_sentences(self):
+        self.assertEqual([sent.text for sent in self.doc.sents], ['The young mouse eats an apple.', 'It sleeps.'])
+        self.assertEqual(self.doc[8].sent.text, 'It sleeps.')
+        self.assertEqual(self.doc.noun_chunk_of(self.doc[1]), (0, 3))
+        self.assertIsNone(self.doc.noun_chunk_of(self.doc[3]))
+
+    def test_pickle(self):
+        sentence = [token for token in self.doc.sents[0] if not token.is_punct]
+        restored = pickle.loads(pickle.dumps(sentence))
+        self.assertEqual([token.text for token in restored], ['The', 'young', 'mouse', 'eats', 'an', 'apple'])
+        self.assertIs(restored[0].doc, restored[5].doc)
+        self.assertIs(restored[3].nbor(-1), restored[2])
+        self.assertEqual(restored[0].sent.text, 'The young mouse eats an apple.')
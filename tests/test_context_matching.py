@@ -0,0 +1,87 @@
+import random
+import time
+import unittest
+
+from typing import List
+from rb_system.context_matching import RelatedContexts
+from utils.iterator import powerset
+
+
+def _powerset_related_contexts(related_contexts: List[list], exact_contexts: List[set]) -> List[set]:
+    """The related contexts as the translation used to enumerate them"""
+    combinations = []
+    for contexts in related_contexts:
+        combinations += [set(combination) for combination in powerset(set(contexts), no_empty=True)]
+    return combinations + exact_contexts
+
+
+def _powerset_count_matches(gloss_contexts: list, related_ctx_combinations: List[set]) -> int:
+    match_count = 0
+    for g_ctx in [set(combination) for combination in powerset(gloss_contexts, no_empty=True)]:
+        if g_ctx in related_ctx_combinations:
+            match_count += 1
+    return match_count
+
+
+def _random_contexts(rng: random.Random, vocabulary: List[str], max_size: int) -> list:
+    return [rng.choice(vocabulary) for _ in range(rng.randint(0, max_size))]
+
+
+class TestRelatedContexts(unittest.TestCase):
+
+    def test_matches_the_powerset_implementation(self):
+        rng = random.Random(2021)
+        vocabulary = ['human', 'animal', 'object', 'round', 'thin', 'multiple subjects', 'multiple objects', 'bird']
+        for _ in range(3000):
+            related = [_random_contexts(rng, vocabulary, 5) for _ in range(rng.randint(0, 4))]
+            exact = [set(_random_contexts(rng, vocabulary, 2)) for _ in range(rng.randint(0, 3))]
+            exact = [e for e in exact if e]
+            gloss_contexts = _random_contexts(rng, vocabulary, 6)
+
+            related_contexts = RelatedContexts()
+            for contexts in related:
+                related_contexts.add_all_subsets(contexts)
+            for contexts in exact:
+                related_contexts.add_exact(contexts)
+
+            expected = _powerset_count_matches(gloss_contexts, _powerset_related_contexts(related, exact))
+            self.assertEqual(
+                related_contexts.count_matches(gloss_contexts), expected,
+                f'gloss={gloss_contexts}, related={related}, exact={exact}'
+            )
+
+    def test_same_best_matches_as_the_powerset_implementation(self):
+        """The highest count and the glosses that tie on it must not change"""
+        rng = random.Random(7)
+        vocabulary = ['human', 'animal', 'object', 'round', 'thin', 'fruit']
+        for _ in range(500):
+            related = [_random_contexts(rng, vocabulary, 4) for _ in range(rng.randint(1, 3))]
+            glosses = [_random_contexts(rng, vocabulary, 4) for _ in range(rng.randint(1, 5))]
+
+            related_contexts = RelatedContexts()
+            for contexts in related:
+                related_contexts.add_all_subsets(contexts)
+            combinations = _powerset_related_contexts(related, [])
+
+            counts = [related_contexts.count_matches(g) for g in glosses]
+            expected_counts = [_powerset_count_matches(g, combinations) for g in glosses]
+            best = [i for i, c in enumerate(counts) if c == max(counts)]
+            expected_best = [i for i, c in enumerate(expected_counts) if c == max(expected_counts)]
+            self.assertEqual(best, expected_best)
+
+    def test_no_related_contexts(self):
+        self.assertEqual(RelatedContexts().count_matches(['human', 'animal']), 0)
+        self.assertEqual(RelatedContexts().add_all_subsets(['human']).count_matches([]), 0)
+
+    def test_many_contexts(self):
+        contexts = [f'context {i}' for i in range(40)]
+        related_contexts = RelatedContexts().add_all_subsets(contexts[:30]).add_all_subsets(contexts[10:])
+
+        start = time.perf_counter()
+        count = related_contexts.count_matches(contexts)
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(count, (2 ** 30 - 1) + (2 ** 30 - 1) - (2 ** 20 - 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
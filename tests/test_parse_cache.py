@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import spacy
+from rb_system.parse_cache import ParseCache, parse_with_cache, paragraph_key
+from rb_system.settings import settings
+
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.nlp = spacy.blank('en')
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'parse_cache.sqlite3')
+        self.parsed = []
+
+    def tearDown(self):
+        settings.parse_cache_path = None
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def parse(self, paragraphs):
+        for paragraph in paragraphs:
+            self.parsed.append(paragraph)
+            yield self.nlp(paragraph)
+
+    def test_store_and_lookup(self):
+        cache = ParseCache(self.path, 1024 * 1024)
+        cache.store('a', self.nlp('The chickens walk.'))
+        found = cache.lookup(['a', 'b'])
+        self.assertEqual(list(found), ['a'])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.stats()['entries'], 1)
+
+    def test_eviction(self):
+        cache = ParseCache(self.path, 1024 * 1024)
+        cache.store('0', self.nlp('Paragraph 0.'))
+        entry_size = cache.stats()['size_bytes']
+        # room for 3 paragraphs, the eviction keeps 90% of it
+        cache.max_bytes = entry_size * 3
+        for i in range(1, 6):
+            cache.store(str(i), self.nlp(f'Paragraph {i}.'))
+        stats = cache.stats()
+        self.assertLessEqual(stats['size_bytes'], stats['max_bytes'])
+        self.assertEqual(list(cache.lookup(['0', '1', '2', '5'])), ['5'])
+
+    def test_parse_with_cache(self):
+        settings.parse_cache_path = self.path
+        paragraphs = ['The chickens walk.', 'They sleep.']
+        docs = list(parse_with_cache(paragraphs, self.nlp, self.parse))
+        self.assertEqual([doc.text for doc in docs], paragraphs)
+        self.assertEqual(self.parsed, paragraphs)
+
+        docs = list(parse_with_cache(['They sleep.', 'Hello.', 'The chickens walk.'], self.nlp, self.parse))
+        self.assertEqual([doc.text for doc in docs], ['They sleep.', 'Hello.', 'The chickens walk.'])
+        self.assertEqual(self.parsed, paragraphs + ['Hello.'])
+
+    def test_key_depends_on_model(self):
+        self.assertNotEqual(
+            paragraph_key('Hello.', 'en_core_web_sm-3.1.0'),
+            paragraph_key('Hello.', 'en_core_web_md-3.1.0')
+        )
@@ -0,0 +1,84 @@
+import itertools
+import unittest
+
+from types import SimpleNamespace
+from rb_system.basic_sentence_rules import basic_rules
+from rb_system.compact_tokens import CompactDoc
+from rb_system.nlp_tools import SentenceFeatures
+from rb_system.rule_registry import RuleRegistry, NOT_SUPPORTED
+from tests.test_compact_tokens import _doc
+
+
+def _features(**values) -> SimpleNamespace:
+    return SimpleNamespace(**{f'is_{name}': value for name, value in values.items()})
+
+
+class TestRuleRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.observed = []
+        self.registry = RuleRegistry(('word', 'locative', 'transitive'),
+                                     observer=lambda *args: self.observed.append(args))
+
+        @self.registry.register('transitive', when={'transitive': True}, order=20)
+        def transitive(sentence, features):
+            return ['transitive', sentence]
+
+        @self.registry.register('word', when={'word': True}, order=0)
+        def word(sentence, features):
+            return ['word', sentence]
+
+        @self.registry.register('locative', when={'locative': True}, order=10)
+        def locative(sentence, features):
+            raise ValueError(sentence)
+
+    def test_dispatch_follows_order(self):
+        for word, locative, transitive in itertools.product((False, True), repeat=3):
+            features = _features(word=word, locative=locative, transitive=transitive)
+            if word:
+                expected = 'word'
+            elif locative:
+                expected = 'locative'
+            elif transitive:
+                expected = 'transitive'
+            else:
+                expected = NOT_SUPPORTED
+            self.assertEqual(self.registry.dispatch(features).name, expected)
+
+    def test_apply(self):
+        features = _features(word=False, locative=False, transitive=True)
+        self.assertEqual(self.registry.apply('a', features), ('transitive', ['transitive', 'a']))
+        features = _features(word=False, locative=False, transitive=False)
+        self.assertEqual(self.registry.apply('b', features), (NOT_SUPPORTED, [NOT_SUPPORTED]))
+
+    def test_stats(self):
+        self.registry.apply('a', _features(word=True, locative=False, transitive=False))
+        self.registry.apply('b', _features(word=True, locative=True, transitive=False))
+        with self.assertRaises(ValueError):
+            self.registry.apply('c', _features(word=False, locative=True, transitive=True))
+
+        stats = {rule['rule']: rule for rule in self.registry.stats()}
+        self.assertEqual([rule['rule'] for rule in self.registry.stats()],
+                         ['word', 'locative', 'transitive', NOT_SUPPORTED])
+        self.assertEqual(stats['word']['count'], 2)
+        self.assertEqual(stats['locative']['count'], 1)
+        self.assertEqual(stats['locative']['failures'], 1)
+        self.assertIsNone(stats['transitive']['mean_time'])
+        self.assertEqual([(name, failed) for name, _, failed in self.observed],
+                         [('word', False), ('word', False), ('locative', True)])
+
+    def test_unknown_feature(self):
+        with self.assertRaises(AssertionError):
+            self.registry.register('stative', when={'stative': True}, order=30)
+
+
+class TestBasicRuleFeatures(unittest.TestCase):
+
+    def test_signature_is_read_from_the_single_pass(self):
+        doc = CompactDoc.from_doc(_doc())
+        sentence = [token for token in doc.sents[0] if not token.is_punct]
+        features = SentenceFeatures(sentence)
+        # computed by `SentenceFeatures.__init__()`, the signature evaluates no predicate
+        self.assertTrue(all(f'is_{feature}' in vars(features) for feature in basic_rules.features))
+        self.assertEqual(basic_rules.signature(features), (False, False, False, False, True, False, False))
+        self.assertEqual(basic_rules.dispatch(features).name, 'br1')
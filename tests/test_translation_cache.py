@@ -0,0 +1,28 @@
+import unittest
+
+from rb_system.translation_cache import TranslationCache
+
+
+class TestTranslationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TranslationCache(10)
+
+    def test_sentence(self):
+        self.cache.store_sentence('The chickens  walk.', 1, ['CHICKEN', 'bird-WALK'])
+        self.assertEqual(self.cache.lookup_sentence('The chickens walk.', 1), ['CHICKEN', 'bird-WALK'])
+        self.assertIsNone(self.cache.lookup_sentence('The chickens walk.', 2))
+
+    def test_empty_sentence_is_not_stored(self):
+        self.cache.store_sentence('', 1, ['WHO'])
+        self.assertIsNone(self.cache.lookup_sentence('', 1))
+
+        self.cache.store_paragraph('Who runs?', [''])
+        self.assertIsNone(self.cache.lookup_paragraph('Who runs?', 1))
+
+    def test_paragraph(self):
+        self.cache.store_sentence('Hello.', 1, ['HELLO'])
+        self.cache.store_sentence('They sleep.', 1, ['THEY', 'SLEEP'])
+        self.cache.store_paragraph('Hello. They sleep.', ['Hello.', 'They sleep.'])
+        self.assertEqual(self.cache.lookup_paragraph('Hello. They sleep.', 1), [['HELLO'], ['THEY', 'SLEEP']])
+        self.assertIsNone(self.cache.lookup_paragraph('Hello. They sleep.', 2))
@@ -0,0 +1,80 @@
+"""
+Memory report of a gunicorn master process and its workers (Linux only), e.g.
+    python -m utils.memory $(cat gunicorn.pid)
+
+RSS counts the shared pages in every process, PSS splits them between the processes that share them,
+so the sum of PSS is the memory that the server really uses.
+"""
+import argparse
+import os
+
+from typing import Dict, List
+
+_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty', 'Swap')
+
+
+def process_memory(pid: int) -> Dict[str, int]:
+    """The memory of the process in bytes, summed over its mappings"""
+    path = f'/proc/{pid}/smaps_rollup'
+    if not os.path.exists(path):
+        # kernels older than 4.14
+        path = f'/proc/{pid}/smaps'
+
+    totals = dict.fromkeys(_FIELDS, 0)
+    with open(path) as smaps:
+        for line in smaps:
+            name, _, value = line.partition(':')
+            if name in totals:
+                totals[name] += int(value.split()[0]) * 1024
+
+    return {
+        'rss': totals['Rss'],
+        'pss': totals['Pss'],
+        'shared': totals['Shared_Clean'] + totals['Shared_Dirty'],
+        'private': totals['Private_Clean'] + totals['Private_Dirty'],
+        'swap': totals['Swap'],
+    }
+
+
+def child_pids(pid: int) -> List[int]:
+    children = []
+    for task in os.listdir(f'/proc/{pid}/task'):
+        with open(f'/proc/{pid}/task/{task}/children') as f:
+            children += [int(child) for child in f.read().split()]
+    return sorted(children)
+
+
+def memory_report(master_pid: int) -> List[dict]:
+    report = [{'pid': master_pid, 'role': 'master', **process_memory(master_pid)}]
+    for pid in child_pids(master_pid):
+        try:
+            report.append({'pid': pid, 'role': 'worker', **process_memory(pid)})
+        except FileNotFoundError:
+            # the worker has exited in the meantime
+            continue
+    return report
+
+
+def _mib(size: int) -> str:
+    return f'{size / 1024 / 1024:.1f}'
+
+
+def main(master_pid: int):
+    report = memory_report(master_pid)
+    print(f'| {"pid":>7} | {"role":<6} | {"RSS MiB":>8} | {"PSS MiB":>8} | {"shared MiB":>10} | {"private MiB":>11} |')
+    print('-' * 68)
+    for row in report:
+        print(
+            f'| {row["pid"]:>7} | {row["role"]:<6} | {_mib(row["rss"]):>8} | {_mib(row["pss"]):>8} '
+            f'| {_mib(row["shared"]):>10} | {_mib(row["private"]):>11} |'
+        )
+    print('-' * 68)
+    print(f'total RSS {_mib(sum(row["rss"] for row in report))} MiB, '
+          f'total PSS {_mib(sum(row["pss"] for row in report))} MiB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pid', type=int, help='the pid of the gunicorn master process')
+    args = parser.parse_args()
+    main(args.pid)
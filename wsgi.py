@@ -1,4 +1,7 @@
 from app import app
+from api.lifecycle import init_background_services
 
 if __name__ == '__main__':
+    with app.app_context():
+        init_background_services(app)
     app.run()